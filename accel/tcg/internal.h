@@ -17,4 +17,6 @@ TranslationBlock *tb_gen_code(CPUState *cpu, target_ulong pc,
 
 void QEMU_NORETURN cpu_io_recompile(CPUState *cpu, uintptr_t retaddr);
 
+void perf_report_tb(const TranslationBlock *tb);
+
 #endif /* ACCEL_TCG_INTERNAL_H */
@@ -0,0 +1,53 @@
+/*
+ * Perf map of translated code
+ *
+ * perf(1) looks up samples in code it cannot find in any mapped file in
+ * /tmp/perf-<pid>.map, which lists one "START SIZE NAME" line per piece
+ * of code, in hex. Naming each translation block after the guest code it
+ * was translated from lets perf attribute JIT time to guest code.
+ *
+ * SPDX-License-Identifier: GPL-2.0-or-later
+ */
+
+#include "qemu/osdep.h"
+#include "qemu/error-report.h"
+#include "sysemu/tcg.h"
+#include "internal.h"
+
+static FILE *perfmap;
+
+static void perf_exit(void)
+{
+    if (perfmap) {
+        fclose(perfmap);
+        perfmap = NULL;
+    }
+}
+
+void perf_enable_perfmap(void)
+{
+    g_autofree char *map_file = g_strdup_printf("/tmp/perf-%d.map",
+                                                getpid());
+
+    perfmap = fopen(map_file, "w");
+    if (!perfmap) {
+        warn_report("Could not open %s: %s, proceeding without perfmap",
+                    map_file, strerror(errno));
+        return;
+    }
+    /* Linux user mode may leave with _exit(), so do not buffer lines */
+    setvbuf(perfmap, NULL, _IOLBF, 0);
+    atexit(perf_exit);
+}
+
+void perf_report_tb(const TranslationBlock *tb)
+{
+    if (!perfmap) {
+        return;
+    }
+    /* One fprintf() per line keeps lines whole with parallel translation */
+    fprintf(perfmap, "%" PRIxPTR " %zx tb 0x" TARGET_FMT_lx
+            " flags=0x%x size=%u insns=%u\n",
+            (uintptr_t)tb->tc.ptr, tb->tc.size, tb->pc, tb->flags,
+            tb->size, tb->icount);
+}
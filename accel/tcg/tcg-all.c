@@ -39,6 +39,7 @@ struct TCGState {
     bool mttcg_enabled;
     int splitwx_enabled;
     unsigned long tb_size;
+    bool perfmap;
 };
 typedef struct TCGState TCGState;
 
@@ -111,6 +112,9 @@ static int tcg_init(MachineState *ms)
 
     tcg_exec_init(s->tb_size * 1024 * 1024, s->splitwx_enabled);
     mttcg_enabled = s->mttcg_enabled;
+    if (s->perfmap) {
+        perf_enable_perfmap();
+    }
 
     /*
      * Initialize TCG regions only for softmmu.
@@ -196,6 +200,18 @@ static void tcg_set_splitwx(Object *obj, bool value, Error **errp)
     s->splitwx_enabled = value;
 }
 
+static bool tcg_get_perfmap(Object *obj, Error **errp)
+{
+    TCGState *s = TCG_STATE(obj);
+    return s->perfmap;
+}
+
+static void tcg_set_perfmap(Object *obj, bool value, Error **errp)
+{
+    TCGState *s = TCG_STATE(obj);
+    s->perfmap = value;
+}
+
 static void tcg_accel_class_init(ObjectClass *oc, void *data)
 {
     AccelClass *ac = ACCEL_CLASS(oc);
@@ -217,6 +233,11 @@ static void tcg_accel_class_init(ObjectClass *oc, void *data)
         tcg_get_splitwx, tcg_set_splitwx);
     object_class_property_set_description(oc, "split-wx",
         "Map jit pages into separate RW and RX regions");
+
+    object_class_property_add_bool(oc, "perfmap",
+        tcg_get_perfmap, tcg_set_perfmap);
+    object_class_property_set_description(oc, "perfmap",
+        "Write a perf map of translated code to /tmp/perf-<pid>.map");
 }
 
 static const TypeInfo tcg_accel_type = {
@@ -2082,6 +2082,7 @@ TranslationBlock *tb_gen_code(CPUState *cpu,
      */
     if (phys_pc == -1) {
         tb->page_addr[0] = tb->page_addr[1] = -1;
+        perf_report_tb(tb);
         return tb;
     }
 
@@ -2106,6 +2107,7 @@ TranslationBlock *tb_gen_code(CPUState *cpu,
         return existing_tb;
     }
     tcg_tb_insert(tb);
+    perf_report_tb(tb);
     return tb;
 }
 
@@ -0,0 +1,180 @@
+/*
+ * License: GNU GPL, version 2 or later.
+ *   See the COPYING file in the top-level directory.
+ *
+ * Count how often each instruction word is translated, for use as a
+ * decodetree profile (see docs/devel/decodetree.rst).
+ */
+#include <inttypes.h>
+#include <string.h>
+#include <stdio.h>
+#include <glib.h>
+
+#include <qemu-plugin.h>
+
+QEMU_PLUGIN_EXPORT int qemu_plugin_version = QEMU_PLUGIN_VERSION;
+
+static bool do_exec;
+static bool do_bswap;
+static bool do_halfwords;
+static unsigned int only_size;
+
+/* Plugins need to take care of their own locking */
+static GMutex lock;
+static GHashTable *opcodes;
+
+typedef struct {
+    uint64_t key;       /* size << 32 | opcode, the hash table key */
+    uint64_t count;
+} OpcodeCount;
+
+/* Smallest instructions first, then most counted first */
+static gint cmp_count(gconstpointer a, gconstpointer b)
+{
+    OpcodeCount *ea = (OpcodeCount *) a;
+    OpcodeCount *eb = (OpcodeCount *) b;
+    if (ea->key >> 32 != eb->key >> 32) {
+        return ea->key >> 32 < eb->key >> 32 ? -1 : 1;
+    }
+    return ea->count > eb->count ? -1 : 1;
+}
+
+static void plugin_exit(qemu_plugin_id_t id, void *p)
+{
+    g_autoptr(GString) report = g_string_new("# count opcode\n");
+    GList *counts, *it;
+    unsigned int size = 0;
+
+    g_mutex_lock(&lock);
+    counts = g_list_sort(g_hash_table_get_values(opcodes), cmp_count);
+    for (it = counts; it; it = it->next) {
+        OpcodeCount *rec = (OpcodeCount *) it->data;
+        if (rec->key >> 32 != size) {
+            size = rec->key >> 32;
+            g_string_append_printf(report, "# %u byte instructions\n", size);
+        }
+        g_string_append_printf(report, "%" PRIu64 " 0x%08" PRIx32 "\n",
+                               rec->count, (uint32_t) rec->key);
+    }
+    g_list_free(counts);
+    g_mutex_unlock(&lock);
+
+    qemu_plugin_outs(report->str);
+}
+
+static void plugin_init(void)
+{
+    opcodes = g_hash_table_new_full(g_int64_hash, g_int64_equal, NULL, g_free);
+}
+
+static uint16_t get_halfword(const void *data)
+{
+    uint16_t half;
+
+    memcpy(&half, data, sizeof(half));
+    return do_bswap ? GUINT16_SWAP_LE_BE(half) : half;
+}
+
+/*
+ * Instructions of 2 and 4 bytes are read as a halfword or word in host
+ * byte order, swapped with the bswap option. With the halfwords option,
+ * 4 byte instructions are read as two halfwords instead, the first one
+ * in the high bits, like Thumb-2 decoders expect them. Other sizes, and
+ * sizes other than the one given with the size option, are skipped.
+ */
+static bool get_opcode(struct qemu_plugin_insn *insn, uint64_t *key)
+{
+    const uint8_t *data = qemu_plugin_insn_data(insn);
+    size_t size = qemu_plugin_insn_size(insn);
+    uint32_t opcode;
+
+    if (only_size && size != only_size) {
+        return false;
+    }
+
+    switch (size) {
+    case 2:
+        opcode = get_halfword(data);
+        break;
+    case 4:
+        if (do_halfwords) {
+            opcode = (uint32_t) get_halfword(data) << 16 |
+                     get_halfword(data + 2);
+        } else {
+            memcpy(&opcode, data, sizeof(opcode));
+            if (do_bswap) {
+                opcode = GUINT32_SWAP_LE_BE(opcode);
+            }
+        }
+        break;
+    default:
+        return false;
+    }
+    *key = (uint64_t) size << 32 | opcode;
+    return true;
+}
+
+static void vcpu_tb_trans(qemu_plugin_id_t id, struct qemu_plugin_tb *tb)
+{
+    size_t n = qemu_plugin_tb_n_insns(tb);
+    size_t i;
+
+    for (i = 0; i < n; i++) {
+        struct qemu_plugin_insn *insn = qemu_plugin_tb_get_insn(tb, i);
+        OpcodeCount *cnt;
+        uint64_t key;
+
+        if (!get_opcode(insn, &key)) {
+            continue;
+        }
+
+        g_mutex_lock(&lock);
+        cnt = (OpcodeCount *) g_hash_table_lookup(opcodes, &key);
+        if (!cnt) {
+            cnt = g_new0(OpcodeCount, 1);
+            cnt->key = key;
+            g_hash_table_insert(opcodes, &cnt->key, cnt);
+        }
+        if (!do_exec) {
+            cnt->count++;
+        }
+        g_mutex_unlock(&lock);
+
+        /*
+         * Executions are counted with an inline add, which is faster
+         * but not thread safe.
+         */
+        if (do_exec) {
+            qemu_plugin_register_vcpu_insn_exec_inline(
+                insn, QEMU_PLUGIN_INLINE_ADD_U64, &cnt->count, 1);
+        }
+    }
+}
+
+QEMU_PLUGIN_EXPORT
+int qemu_plugin_install(qemu_plugin_id_t id, const qemu_info_t *info,
+                        int argc, char **argv)
+{
+    int i;
+
+    for (i = 0; i < argc; i++) {
+        if (strcmp(argv[i], "exec") == 0) {
+            do_exec = true;
+        } else if (strcmp(argv[i], "bswap") == 0) {
+            do_bswap = true;
+        } else if (strcmp(argv[i], "halfwords") == 0) {
+            do_halfwords = true;
+        } else if (g_str_has_prefix(argv[i], "size=")) {
+            only_size = g_ascii_strtoull(argv[i] + 5, NULL, 10);
+        } else {
+            fprintf(stderr, "option parsing failed: %s\n", argv[i]);
+            return -1;
+        }
+    }
+
+    plugin_init();
+
+    qemu_plugin_register_vcpu_tb_trans_cb(id, vcpu_tb_trans);
+    qemu_plugin_register_atexit_cb(id, plugin_exit, NULL);
+    return 0;
+}
@@ -52,4 +52,11 @@ bool qlit_equal_qobject(const QLitObject *lhs, const QObject *rhs);
 
 QObject *qobject_from_qlit(const QLitObject *qlit);
 
+/*
+ * Like qobject_from_qlit(), but convert every dict and list array of
+ * @qlit just once: where an array occurs again, the QObject converted
+ * from it is shared.  The result must not be modified.
+ */
+QObject *qobject_from_qlit_shared(const QLitObject *qlit);
+
 #endif /* QLIT_H */
@@ -0,0 +1,96 @@
+/*
+ * Table-driven instruction decoders generated by scripts/decodetree.py
+ *
+ * This work is licensed under the terms of the GNU GPL, version 2 or later.
+ * See the COPYING file in the top-level directory.
+ */
+
+#ifndef QEMU_DECODETREE_H
+#define QEMU_DECODETREE_H
+
+/*
+ * With --tables, decodetree.py describes the decode tree with the
+ * tables below instead of emitting it as C code, and decodetree_decode()
+ * interprets them.  See docs/devel/decodetree.rst.
+ */
+
+typedef enum DecodeTreeNodeKind {
+    /* Select the one edge whose bits equal insn & mask */
+    DECODETREE_SWITCH,
+    /* Likewise, with edge (insn & mask) >> shift */
+    DECODETREE_INDEX,
+    /* Try the edges in order, those whose bits equal insn & edge mask */
+    DECODETREE_GROUP,
+    /* Extract the fields of a pattern and call its translate function */
+    DECODETREE_PATTERN,
+} DecodeTreeNodeKind;
+
+typedef struct DecodeTreeNode {
+    uint8_t kind;               /* DecodeTreeNodeKind */
+    uint8_t shift;              /* DECODETREE_INDEX: of the first mask bit */
+    uint16_t value;             /* index of the mask of a switch, or of the
+                                   translate function of a pattern */
+    uint16_t first;             /* index of the first edge or field */
+    uint16_t count;             /* number of edges or fields */
+} DecodeTreeNode;
+
+typedef struct DecodeTreeEdge {
+    uint32_t bits;              /* value of the bits, sorted for a switch */
+    uint16_t mask;              /* DECODETREE_GROUP: index of the bits tested */
+    uint16_t node;              /* node taken */
+} DecodeTreeEdge;
+
+typedef enum DecodeTreeFieldKind {
+    /* Concatenate the parts, most significant first */
+    DECODETREE_FIELD_EXTRACT,
+    /* Concatenate the parts and pass the result through a function */
+    DECODETREE_FIELD_FUNCTION,
+    /* A constant */
+    DECODETREE_FIELD_CONST,
+    /* The value of a function of the DisasContext */
+    DECODETREE_FIELD_PARAMETER,
+} DecodeTreeFieldKind;
+
+typedef struct DecodeTreeField {
+    int16_t value;              /* constant, or function index */
+    uint16_t first;             /* index of the first part */
+    uint8_t offset;             /* of the argument in its argument set */
+    uint8_t kind;               /* DecodeTreeFieldKind */
+    uint8_t count;              /* number of parts */
+} DecodeTreeField;
+
+typedef struct DecodeTreePart {
+    uint8_t pos;
+    uint8_t len;
+    bool sign;
+} DecodeTreePart;
+
+typedef struct DecodeTree {
+    const DecodeTreeNode *nodes;
+    const DecodeTreeEdge *edges;
+    const DecodeTreeField *fields;
+    const DecodeTreePart *parts;
+    const uint32_t *masks;
+    /* Call field function @func with @x, or parameter function @func */
+    int (*call)(void *ctx, int func, int x);
+    /* Call translate function @trans with argument set @args */
+    bool (*trans)(void *ctx, int trans, void *args);
+} DecodeTree;
+
+/**
+ * decodetree_decode:
+ * @dt: the tables of the decoder
+ * @ctx: the DisasContext passed to the decoder
+ * @insn: the instruction to decode
+ * @args: storage for the argument set of any pattern
+ *
+ * Decode @insn like the decoder emitted as C code would: call the
+ * translate function of the first pattern matching @insn, and of the
+ * patterns after it in overlap groups until one returns true.
+ *
+ * Returns: true if a translate function returned true.
+ */
+bool decodetree_decode(const DecodeTree *dt, void *ctx, uint32_t insn,
+                       void *args);
+
+#endif /* QEMU_DECODETREE_H */
@@ -75,6 +75,9 @@ bool have_guest_base;
  */
 static bool enable_strace;
 
+/* Write a perf map of translated code, set by -perfmap. */
+static bool perfmap;
+
 /*
  * The last log mask given by the user in an environment variable or argument.
  * Used to support command line arguments overriding environment variables.
@@ -382,6 +385,11 @@ static void handle_arg_singlestep(const char *arg)
     singlestep = 1;
 }
 
+static void handle_arg_perfmap(const char *arg)
+{
+    perfmap = true;
+}
+
 static void handle_arg_strace(const char *arg)
 {
     enable_strace = true;
@@ -460,6 +468,8 @@ static const struct qemu_argument arg_table[] = {
      "pagesize",   "set the host page size to 'pagesize'"},
     {"singlestep", "QEMU_SINGLESTEP",  false, handle_arg_singlestep,
      "",           "run in singlestep mode"},
+    {"perfmap",    "QEMU_PERFMAP",     false, handle_arg_perfmap,
+     "",           "write perf map of translated code to /tmp/perf-<pid>.map"},
     {"strace",     "QEMU_STRACE",      false, handle_arg_strace,
      "",           "log system calls"},
     {"seed",       "QEMU_RAND_SEED",   true,  handle_arg_seed,
@@ -733,6 +743,9 @@ int main(int argc, char **argv, char **envp)
         ac->init_machine(NULL);
         accel_init_interfaces(ac);
     }
+    if (perfmap) {
+        perf_enable_perfmap();
+    }
     cpu = cpu_create(cpu_type);
     env = cpu->env_ptr;
     cpu_reset(cpu);
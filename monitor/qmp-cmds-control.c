@@ -204,7 +204,7 @@ static SchemaInfoList *zap_deprecated(SchemaInfoList *schema)
 
 SchemaInfoList *qmp_query_qmp_schema(Error **errp)
 {
-    QObject *obj = qobject_from_qlit(&qmp_schema_qlit);
+    QObject *obj = qobject_from_qlit_shared(&qmp_schema_qlit);
     Visitor *v = qobject_input_visitor_new(obj);
     SchemaInfoList *schema = NULL;
 
@@ -88,8 +88,24 @@ bool qlit_equal_qobject(const QLitObject *lhs, const QObject *rhs)
     return false;
 }
 
-QObject *qobject_from_qlit(const QLitObject *qlit)
+static QObject *qobject_from_qlit_memo(const QLitObject *qlit,
+                                       GHashTable *memo)
 {
+    const void *array = NULL;
+    QObject *obj;
+
+    if (qlit->type == QTYPE_QDICT) {
+        array = qlit->value.qdict;
+    } else if (qlit->type == QTYPE_QLIST) {
+        array = qlit->value.qlist;
+    }
+    if (memo && array) {
+        obj = g_hash_table_lookup(memo, array);
+        if (obj) {
+            return qobject_ref(obj);
+        }
+    }
+
     switch (qlit->type) {
     case QTYPE_QNULL:
         return QOBJECT(qnull());
@@ -102,24 +118,46 @@ QObject *qobject_from_qlit(const QLitObject *qlit)
         QLitDictEntry *e;
 
         for (e = qlit->value.qdict; e->key; e++) {
-            qdict_put_obj(qdict, e->key, qobject_from_qlit(&e->value));
+            qdict_put_obj(qdict, e->key,
+                          qobject_from_qlit_memo(&e->value, memo));
         }
-        return QOBJECT(qdict);
+        obj = QOBJECT(qdict);
+        break;
     }
     case QTYPE_QLIST: {
         QList *qlist = qlist_new();
         QLitObject *e;
 
         for (e = qlit->value.qlist; e->type != QTYPE_NONE; e++) {
-            qlist_append_obj(qlist, qobject_from_qlit(e));
+            qlist_append_obj(qlist, qobject_from_qlit_memo(e, memo));
         }
-        return QOBJECT(qlist);
+        obj = QOBJECT(qlist);
+        break;
     }
     case QTYPE_QBOOL:
         return QOBJECT(qbool_from_bool(qlit->value.qbool));
     default:
         assert(0);
+        return NULL;
     }
 
-    return NULL;
+    if (memo) {
+        /* The result holds a reference, which keeps obj alive */
+        g_hash_table_insert(memo, (gpointer)array, obj);
+    }
+    return obj;
+}
+
+QObject *qobject_from_qlit(const QLitObject *qlit)
+{
+    return qobject_from_qlit_memo(qlit, NULL);
+}
+
+QObject *qobject_from_qlit_shared(const QLitObject *qlit)
+{
+    GHashTable *memo = g_hash_table_new(NULL, NULL);
+    QObject *obj = qobject_from_qlit_memo(qlit, memo);
+
+    g_hash_table_destroy(memo);
+    return obj;
 }
@@ -21,6 +21,7 @@
 import os
 import argparse
 import collections
+import hashlib
 import struct
 import sys
 
@@ -121,6 +122,7 @@ def __init__(self, file, version_id, ramargs, section_key):
         self.TARGET_PAGE_SIZE = ramargs['page_size']
         self.dump_memory = ramargs['dump_memory']
         self.write_memory = ramargs['write_memory']
+        self.digest_memory = ramargs.get('digest_memory', False)
         self.sizeinfo = collections.OrderedDict()
         self.data = collections.OrderedDict()
         self.data['section sizes'] = self.sizeinfo
@@ -130,6 +132,12 @@ def __init__(self, file, version_id, ramargs, section_key):
         if self.dump_memory:
             self.memory = collections.OrderedDict()
             self.data['memory'] = self.memory
+        if self.digest_memory:
+            # One fixed-size digest per page, indexed by page number, so
+            # memory use stays at PAGE_DIGEST_SIZE bytes per guest page
+            # no matter in which order the stream sends pages.
+            self.digests = collections.OrderedDict()
+            self.fill_digests = { }
 
     def __repr__(self):
         return self.data.__repr__()
@@ -140,6 +148,17 @@ def __str__(self):
     def getDict(self):
         return self.data
 
+    def store_digest(self, addr, digest):
+        page = addr // self.TARGET_PAGE_SIZE
+        offset = page * PAGE_DIGEST_SIZE
+        self.digests[self.name][offset:offset + PAGE_DIGEST_SIZE] = digest
+
+    def fill_digest(self, fill_char):
+        if fill_char not in self.fill_digests:
+            page = bytes([fill_char & 0xff]) * self.TARGET_PAGE_SIZE
+            self.fill_digests[fill_char] = page_digest(page)
+        return self.fill_digests[fill_char]
+
     def read(self):
         # Read all RAM sections
         while True:
@@ -167,6 +186,9 @@ def read(self):
                         f.truncate(0)
                         f.truncate(len)
                         self.files[self.name] = f
+                    if self.digest_memory:
+                        npages = len // self.TARGET_PAGE_SIZE
+                        self.digests[self.name] = bytearray(npages * PAGE_DIGEST_SIZE)
                 flags &= ~self.RAM_SAVE_FLAG_MEM_SIZE
 
             if flags & self.RAM_SAVE_FLAG_COMPRESS:
@@ -181,6 +203,8 @@ def read(self):
                     self.files[self.name].write(chr(fill_char) * self.TARGET_PAGE_SIZE)
                 if self.dump_memory:
                     self.memory['%s (0x%016x)' % (self.name, addr)] = 'Filled with 0x%02x' % fill_char
+                if self.digest_memory:
+                    self.store_digest(addr, self.fill_digest(fill_char))
                 flags &= ~self.RAM_SAVE_FLAG_COMPRESS
             elif flags & self.RAM_SAVE_FLAG_PAGE:
                 if flags & self.RAM_SAVE_FLAG_CONTINUE:
@@ -188,11 +212,14 @@ def read(self):
                 else:
                     self.name = self.file.readstr()
 
-                if self.write_memory or self.dump_memory:
+                if self.write_memory or self.dump_memory or self.digest_memory:
                     data = self.file.readvar(size = self.TARGET_PAGE_SIZE)
                 else: # Just skip RAM data
                     self.file.file.seek(self.TARGET_PAGE_SIZE, 1)
 
+                if self.digest_memory:
+                    self.store_digest(addr, page_digest(data))
+
                 if self.write_memory:
                     self.files[self.name].seek(addr, os.SEEK_SET)
                     self.files[self.name].write(data)
@@ -219,6 +246,17 @@ def __del__(self):
                 self.files[key].close()
 
 
+# Size in bytes of the per-page digest kept when diffing RAM contents
+PAGE_DIGEST_SIZE = 8
+
+# Number of pages whose digests are compared as a single slice before
+# falling back to a page-by-page scan
+DIFF_CHUNK_PAGES = 4096
+
+def page_digest(data):
+    return hashlib.blake2b(data, digest_size=PAGE_DIGEST_SIZE).digest()
+
+
 class HTABSection(object):
     HASH_PTE_SIZE_64       = 16
 
@@ -495,7 +533,8 @@ def __init__(self, filename):
         self.filename = filename
         self.vmsd_desc = None
 
-    def read(self, desc_only = False, dump_memory = False, write_memory = False):
+    def read(self, desc_only = False, dump_memory = False, write_memory = False,
+             digest_memory = False):
         # Read in the whole file
         file = MigrationFile(self.filename)
 
@@ -521,6 +560,7 @@ def read(self, desc_only = False, dump_memory = False, write_memory = False):
         ramargs['page_size'] = self.vmsd_desc['page_size']
         ramargs['dump_memory'] = dump_memory
         ramargs['write_memory'] = write_memory
+        ramargs['digest_memory'] = digest_memory
         self.section_classes[('ram',0)][1] = ramargs
 
         while True:
@@ -566,6 +606,110 @@ def getDict(self):
            r[key] = value.getDict()
         return r
 
+    def getSections(self):
+        r = collections.OrderedDict()
+        for value in self.sections.values():
+            key = "%s (%d)" % value.section_key
+            r[key] = value
+        return r
+
+###############################################################################
+
+def diff_ram_block(old, new, page_size):
+    # Compare DIFF_CHUNK_PAGES digests at a time with a single slice
+    # comparison and only walk the pages of chunks that differ.
+    ranges = []
+    old = memoryview(old)
+    new = memoryview(new)
+    chunk = DIFF_CHUNK_PAGES * PAGE_DIGEST_SIZE
+    start = None
+    for base in range(0, len(old), chunk):
+        end = min(base + chunk, len(old))
+        if old[base:end] == new[base:end]:
+            if start is not None:
+                ranges.append((start, base // PAGE_DIGEST_SIZE))
+                start = None
+            continue
+        for offset in range(base, end, PAGE_DIGEST_SIZE):
+            limit = offset + PAGE_DIGEST_SIZE
+            page = offset // PAGE_DIGEST_SIZE
+            if old[offset:limit] != new[offset:limit]:
+                if start is None:
+                    start = page
+            elif start is not None:
+                ranges.append((start, page))
+                start = None
+    if start is not None:
+        ranges.append((start, len(old) // PAGE_DIGEST_SIZE))
+    return ['0x%016x-0x%016x' % (s * page_size, e * page_size - 1)
+            for (s, e) in ranges]
+
+def diff_ram(old, new):
+    r = collections.OrderedDict()
+    for name in old.digests.keys() | new.digests.keys():
+        if name not in new.digests:
+            r[name] = 'removed'
+        elif name not in old.digests:
+            r[name] = 'added'
+        elif len(old.digests[name]) != len(new.digests[name]):
+            r[name] = 'size changed from %s to %s' % (old.sizeinfo[name],
+                                                      new.sizeinfo[name])
+        else:
+            ranges = diff_ram_block(old.digests[name], new.digests[name],
+                                    old.TARGET_PAGE_SIZE)
+            if ranges:
+                r[name] = ranges
+    return r
+
+def diff_state(old, new, path, r):
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old:
+            if key not in new:
+                r['%s.%s' % (path, key)] = [ old[key], None ]
+            else:
+                diff_state(old[key], new[key], '%s.%s' % (path, key), r)
+        for key in new:
+            if key not in old:
+                r['%s.%s' % (path, key)] = [ None, new[key] ]
+    elif (isinstance(old, list) and isinstance(new, list) and
+          len(old) == len(new)):
+        for (i, (o, n)) in enumerate(zip(old, new)):
+            diff_state(o, n, '%s[%d]' % (path, i), r)
+    elif old != new:
+        r[path] = [ old, new ]
+
+def diff_dumps(old_file, new_file):
+    old = MigrationDump(old_file)
+    old.read(digest_memory = True)
+    new = MigrationDump(new_file)
+    new.read(digest_memory = True)
+
+    old_sections = old.getSections()
+    new_sections = new.getSections()
+    ram = collections.OrderedDict()
+    devices = collections.OrderedDict()
+    for key in old_sections.keys() | new_sections.keys():
+        old_section = old_sections.get(key)
+        new_section = new_sections.get(key)
+        if old_section is None:
+            devices[key] = 'added'
+        elif new_section is None:
+            devices[key] = 'removed'
+        elif isinstance(old_section, RamSection):
+            ram.update(diff_ram(old_section, new_section))
+        elif isinstance(old_section, VMSDSection):
+            fields = collections.OrderedDict()
+            diff_state(old_section.getDict(), new_section.getDict(),
+                       old_section.vmsd_name or old_section.section_key[0],
+                       fields)
+            if fields:
+                devices[key] = fields
+
+    r = collections.OrderedDict()
+    r['ram'] = collections.OrderedDict(sorted(ram.items()))
+    r['devices'] = collections.OrderedDict(sorted(devices.items()))
+    return r
+
 ###############################################################################
 
 class JSONEncoder(json.JSONEncoder):
@@ -577,7 +721,8 @@ def default(self, o):
 parser = argparse.ArgumentParser()
 parser.add_argument("-f", "--file", help='migration dump to read from', required=True)
 parser.add_argument("-m", "--memory", help='dump RAM contents as well', action='store_true')
-parser.add_argument("-d", "--dump", help='what to dump ("state" or "desc")', default='state')
+parser.add_argument("-d", "--dump", help='what to dump ("state", "desc" or "diff")', default='state')
+parser.add_argument("--diff-file", help='second migration dump to compare against for "-d diff"')
 parser.add_argument("-x", "--extract", help='extract contents into individual files', action='store_true')
 args = parser.parse_args()
 
@@ -609,5 +754,9 @@ def default(self, o):
     dump = MigrationDump(args.file)
     dump.read(desc_only = True)
     print(jsonenc.encode(dump.vmsd_desc))
+elif args.dump == "diff":
+    if args.diff_file is None:
+        raise Exception("-d diff needs a second dump passed with --diff-file")
+    print(jsonenc.encode(diff_dumps(args.file, args.diff_file)))
 else:
-    raise Exception("Please specify either -x, -d state or -d dump")
+    raise Exception("Please specify either -x, -d state, -d desc or -d diff")
@@ -25,6 +25,10 @@
 import re
 import sys
 import getopt
+import hashlib
+import shutil
+import tempfile
+import time
 
 insnwidth = 32
 insnmask = 0xffffffff
@@ -42,6 +46,11 @@
 output_fd = None
 insntype = 'uint32_t'
 decode_function = 'decode'
+cache_dir = None
+# Cached outputs not used for this many seconds are removed
+cache_max_age = 30 * 24 * 60 * 60
+profile_file = None
+tables = False
 
 # An identifier for C.
 re_C_ident = '[a-zA-Z][a-zA-Z0-9_]*'
@@ -168,6 +177,11 @@ def eq_fields_for_fmts(flds_a, flds_b):
     return True
 
 
+def overlaps(a, b):
+    """Return true if some insn may match both A and B"""
+    return (a.fixedbits ^ b.fixedbits) & a.fixedmask & b.fixedmask == 0
+
+
 class Field:
     """Class representing a simple instruction field"""
     def __init__(self, sign, pos, len):
@@ -329,6 +343,7 @@ def __init__(self, name, lineno, base, fixb, fixm, udfm, fldm, flds, w):
         self.fieldmask = fldm
         self.fields = flds
         self.width = w
+        self.count = 0
 
     def __str__(self):
         return self.name + ' ' + str_match_bits(self.fixedbits, self.fixedmask)
@@ -387,6 +402,8 @@ def prop_format(self):
         return
     def prop_width(self):
         return
+    def reorder(self):
+        return
 
 # end Pattern
 
@@ -403,6 +420,7 @@ def __init__(self, lineno):
         self.fixedmask = 0
         self.undefmask = 0
         self.width = None
+        self.count = 0
 
     def __str__(self):
         r = 'group'
@@ -464,6 +482,10 @@ def prop_width(self):
                                 'width mismatch in patterns within braces')
         self.width = width
 
+    def reorder(self):
+        for p in self.pats:
+            p.reorder()
+
 # end MultiPattern
 
 
@@ -486,6 +508,23 @@ def output_code(self, i, extracted, outerbits, outermask):
                 output(ind, '}\n')
             else:
                 p.output_code(i, extracted, p.fixedbits, p.fixedmask)
+
+    def reorder(self):
+        """Try the patterns matched most often by the profile first"""
+        super().reorder()
+
+        # Only patterns that cannot match the same insn may be swapped,
+        # so that every insn is still matched by the same pattern first.
+        todo = self.pats
+        self.pats = []
+        while todo:
+            best = None
+            for i, p in enumerate(todo):
+                if any(overlaps(q, p) for q in todo[:i]):
+                    continue
+                if best is None or p.count > todo[best].count:
+                    best = i
+            self.pats.append(todo.pop(best))
 #end IncMultiPattern
 
 
@@ -497,6 +536,13 @@ def __init__(self, fm, tm):
         self.thismask = tm
         self.subs = []
         self.base = None
+        self.bins = None
+
+    def find_sub(self, insn):
+        """Return the node below this one selected by INSN, or None"""
+        if self.bins is None:
+            self.bins = dict(self.subs)
+        return self.bins.get(insn & self.thismask)
 
     def str1(self, i):
         ind = str_indent(i)
@@ -1251,6 +1297,396 @@ def prop_size(tree):
 # end prop_size
 
 
+def fail_tests(node, outermask):
+    """Return the most mask tests NODE can make without matching"""
+    if isinstance(node, Tree):
+        innermask = outermask | node.thismask
+        return 1 + max((fail_tests(s, innermask) for b, s in node.subs),
+                       default=0)
+    if isinstance(node, ExcMultiPattern):
+        return fail_tests(node.tree, outermask)
+    if isinstance(node, IncMultiPattern):
+        r = 0
+        for p in node.pats:
+            if outermask != p.fixedmask:
+                r += 1
+            r += fail_tests(p, p.fixedmask)
+        return r
+    return 0
+# end fail_tests
+
+
+def decode_insn(node, insn, outermask, count):
+    """
+    Decode INSN as the code output for NODE would, and add COUNT to the
+    count of every node matching it.  Return whether INSN was matched,
+    assuming that translate functions succeed, and the number of mask
+    tests made.
+    """
+    if isinstance(node, Tree):
+        s = node.find_sub(insn)
+        if s is None:
+            return False, 1
+        m, t = decode_insn(s, insn, outermask | node.thismask, count)
+        return m, t + 1
+    if isinstance(node, ExcMultiPattern):
+        m, t = decode_insn(node.tree, insn, outermask, count)
+    elif isinstance(node, IncMultiPattern):
+        m, t = False, 0
+        for p in node.pats:
+            if outermask != p.fixedmask:
+                t += 1
+                innermask = p.fixedmask & ~outermask
+                if (insn & innermask) != (p.fixedbits & innermask):
+                    continue
+            m, pt = decode_insn(p, insn, p.fixedmask, count)
+            t += pt
+            if m:
+                break
+    else:
+        m, t = True, 0
+    if m:
+        node.count += count
+    return m, t
+# end decode_insn
+
+
+def parse_profile(filename):
+    """Parse a profile of how often each insn is decoded from FILENAME"""
+    profile = {}
+    with open(filename, 'rt', encoding='utf-8') as f:
+        for lineno, line in enumerate(f, 1):
+            toks = line.split('#', 1)[0].split()
+            if not toks:
+                continue
+            try:
+                if len(toks) != 2:
+                    raise ValueError
+                count = int(toks[0])
+                insn = int(toks[1], 16)
+            except ValueError:
+                error_with_file(filename, lineno,
+                                'expected a count and an insn in hex')
+            profile[insn] = profile.get(insn, 0) + count
+    return profile
+# end parse_profile
+
+
+def profile_tests(toppat, profile, count):
+    """
+    Decode the insns of PROFILE with TOPPAT, adding to the counts of the
+    nodes matching them if COUNT.  Return the number of insns, of insns
+    not decoded and of the mask tests made.
+    """
+    insns = undecoded = tests = 0
+    for insn, n in profile.items():
+        m, t = decode_insn(toppat, insn, 0, n if count else 0)
+        insns += n
+        tests += n * t
+        if not m:
+            undecoded += n
+    return insns, undecoded, tests
+# end profile_tests
+
+
+class DecodeStats:
+    """Class collecting the cost of the decode tree for --stats"""
+
+    def __init__(self):
+        self.depth = 0
+        self.fanouts = []
+        self.tests = []
+        self.profile = None
+
+    def walk(self, node, outermask, tests, depth):
+        """Walk NODE as its output_code would, counting mask tests"""
+        if isinstance(node, Tree):
+            self.depth = max(self.depth, depth + 1)
+            self.fanouts.append(len(node.subs))
+            innermask = outermask | node.thismask
+            for b, s in node.subs:
+                self.walk(s, innermask, tests + 1, depth + 1)
+        elif isinstance(node, ExcMultiPattern):
+            self.walk(node.tree, outermask, tests, depth)
+        elif isinstance(node, IncMultiPattern):
+            # Every pattern tried before P may fail after all its tests.
+            for p in node.pats:
+                if outermask != p.fixedmask:
+                    tests += 1
+                self.walk(p, p.fixedmask, tests, depth)
+                tests += fail_tests(p, p.fixedmask)
+        else:
+            self.tests.append((tests, node))
+
+    def output(self, file):
+        n = len(self.tests)
+        print('{0} patterns, {1} switches, depth {2}'
+              .format(n, len(self.fanouts), self.depth), file=file)
+        if self.fanouts:
+            print('switch fan-out: max {0}, mean {1:.1f}'
+                  .format(max(self.fanouts),
+                          sum(self.fanouts) / len(self.fanouts)), file=file)
+        if n:
+            print('mask tests per pattern: max {0}, mean {1:.1f}'
+                  .format(max(t for t, p in self.tests),
+                          sum(t for t, p in self.tests) / n), file=file)
+            print('most mask tests:', file=file)
+            worst = sorted(self.tests, key=lambda x: -x[0])
+            for t, p in worst[:10]:
+                print('  {0:3d}  {1}:{2}: {3}'
+                      .format(t, p.file, p.lineno, p.name), file=file)
+        if self.profile:
+            insns, undecoded, before, after = self.profile
+            print('profile: {0} insns, {1} not decoded'
+                  .format(insns, undecoded), file=file)
+            if insns:
+                print('mask tests per profiled insn: {0:.2f} in pattern '
+                      'order, {1:.2f} reordered'
+                      .format(before / insns, after / insns), file=file)
+# end DecodeStats
+
+
+class DecodeTables:
+    """Class building the decode tables output with --tables"""
+
+    def __init__(self):
+        self.nodes = []
+        self.edges = []
+        self.fields = []
+        self.parts = []
+        self.masks = {0: 0}
+        self.funcs = {}
+        self.trans = {}
+        self.runs = {}
+
+    def add_run(self, table, items):
+        """Add ITEMS to TABLE unless already there, and return the index"""
+        key = (id(table), tuple(items))
+        if key not in self.runs:
+            self.runs[key] = len(table)
+            table += items
+        return self.runs[key]
+
+    def mask(self, mask):
+        return self.masks.setdefault(mask, len(self.masks))
+
+    def add(self, node, outermask):
+        """Add NODE and the nodes below it, and return its index"""
+        if isinstance(node, ExcMultiPattern):
+            return self.add(node.tree, outermask)
+
+        n = len(self.nodes)
+        self.nodes.append(None)
+        if isinstance(node, Tree):
+            innermask = outermask | node.thismask
+            edges = [(b, 0, self.add(s, innermask))
+                     for b, s in sorted(node.subs, key=lambda x: x[0])]
+            kind = 'DECODETREE_SWITCH'
+            shift = is_contiguous(node.thismask)
+            # Index the edges directly when they fill enough of the table
+            if shift >= 0 and node.thismask >> shift < 4 * len(edges):
+                kind = 'DECODETREE_INDEX'
+                size = node.thismask >> shift
+                index = [(~node.thismask & 0xffffffff, 0, 0)] * (size + 1)
+                for e in edges:
+                    index[e[0] >> shift] = e
+                edges = index
+            else:
+                shift = 0
+            self.nodes[n] = (kind, shift, self.mask(node.thismask),
+                             len(self.edges), len(edges), None)
+            self.edges += edges
+        elif isinstance(node, IncMultiPattern):
+            edges = []
+            for p in node.pats:
+                innermask = 0
+                innerbits = 0
+                if outermask != p.fixedmask:
+                    innermask = p.fixedmask & ~outermask
+                    innerbits = p.fixedbits & ~outermask
+                edges.append((innerbits, self.mask(innermask),
+                              self.add(p, p.fixedmask)))
+            self.nodes[n] = ('DECODETREE_GROUP', 0, 0,
+                             len(self.edges), len(edges), None)
+            self.edges += edges
+        else:
+            if len(node.base.base.fields) > 63:
+                error_with_file(node.file, node.lineno,
+                                'too many arguments for --tables')
+            fields = list(node.base.fields.items()) + list(node.fields.items())
+            fields = [self.field(node, name, f) for name, f in fields]
+            first = self.add_run(self.fields, fields)
+            trans = self.trans.setdefault(node.name, len(self.trans))
+            self.nodes[n] = ('DECODETREE_PATTERN', 0, trans, first,
+                             len(fields),
+                             '{0}:{1}: {2}'.format(node.file, node.lineno,
+                                                   node.name))
+        return n
+
+    def field(self, pat, name, f):
+        """Return the table entry for field F of pattern PAT"""
+        offset = 'offsetof({0}, {1})'.format(pat.base.base.struct_name(),
+                                             name)
+        if isinstance(f, ConstField):
+            if f.value < -0x8000 or f.value > 0x7fff:
+                error_with_file(pat.file, pat.lineno,
+                                'constant {0} out of range for --tables'
+                                .format(name))
+            return (f.value, 0, offset, 'CONST', 0)
+        if isinstance(f, ParameterField):
+            func = self.funcs.setdefault((f.func, False), len(self.funcs))
+            return (func, 0, offset, 'PARAMETER', 0)
+        kind = 'EXTRACT'
+        value = 0
+        if isinstance(f, FunctionField):
+            kind = 'FUNCTION'
+            value = self.funcs.setdefault((f.func, True), len(self.funcs))
+            f = f.base
+        subs = f.subs if isinstance(f, MultiField) else [f]
+        first = self.add_run(self.parts, [(sub.pos, sub.len, sub.sign)
+                                          for sub in subs])
+        return (value, first, offset, kind, len(subs))
+
+    def output_code(self, decode_scope):
+        global decode_function
+
+        for what, items in (('nodes', self.nodes), ('edges', self.edges),
+                            ('fields', self.fields), ('parts', self.parts),
+                            ('masks', self.masks), ('patterns', self.trans)):
+            if len(items) > 0xffff:
+                error(0, 'too many decode table {0} ({1})'
+                         .format(what, len(items)))
+
+        name = decode_function
+        output('static const uint32_t ', name, '_masks[] = {\n')
+        for mask in self.masks:
+            output('    0x{0:08x},\n'.format(mask))
+        output('};\n\n')
+
+        output('static const DecodeTreeNode ', name, '_nodes[] = {\n')
+        for kind, shift, value, first, count, comment in self.nodes:
+            output('    {{ {0}, {1}, {2}, {3}, {4} }},'
+                   .format(kind, shift, value, first, count))
+            if comment:
+                output(' /* ', comment, ' */')
+            output('\n')
+        output('};\n\n')
+
+        if self.edges:
+            output('static const DecodeTreeEdge ', name, '_edges[] = {\n')
+            for bits, mask, node in self.edges:
+                output('    {{ 0x{0:08x}, {1}, {2} }},\n'
+                       .format(bits, mask, node))
+            output('};\n\n')
+
+        if self.fields:
+            output('static const DecodeTreeField ', name, '_fields[] = {\n')
+            for value, first, offset, kind, count in self.fields:
+                output('    {{ {0}, {1}, {2}, DECODETREE_FIELD_{3}, {4} }},\n'
+                       .format(value, first, offset, kind, count))
+            output('};\n\n')
+
+        if self.parts:
+            output('static const DecodeTreePart ', name, '_parts[] = {\n')
+            for pos, length, sign in self.parts:
+                output('    {{ {0}, {1}, {2} }},\n'
+                       .format(pos, length, 'true' if sign else 'false'))
+            output('};\n\n')
+
+        output('static int ', name, '_call(void *ctx, int func, int x)\n{\n',
+               '    switch (func) {\n')
+        for (func, base), i in self.funcs.items():
+            output('    case ', str(i), ':\n',
+                   '        return ', func,
+                   '(ctx, x);\n' if base else '(ctx);\n')
+        output('    default:\n',
+               '        g_assert_not_reached();\n',
+               '    }\n',
+               '}\n\n')
+
+        output('static bool ', name,
+               '_trans(void *ctx, int trans, void *args)\n{\n',
+               '    switch (trans) {\n')
+        for pat, i in self.trans.items():
+            output('    case ', str(i), ':\n',
+                   '        return ', translate_prefix, '_', pat,
+                   '(ctx, args);\n')
+        output('    default:\n',
+               '        g_assert_not_reached();\n',
+               '    }\n',
+               '}\n\n')
+
+        output('static const DecodeTree ', name, '_tables = {\n',
+               '    .nodes = ', name, '_nodes,\n')
+        for what, items in (('edges', self.edges), ('fields', self.fields),
+                            ('parts', self.parts)):
+            if items:
+                output('    .', what, ' = ', name, '_', what, ',\n')
+        output('    .masks = ', name, '_masks,\n',
+               '    .call = ', name, '_call,\n',
+               '    .trans = ', name, '_trans,\n',
+               '};\n\n')
+
+        output(decode_scope, 'bool ', decode_function,
+               '(DisasContext *ctx, ', insntype, ' insn)\n{\n')
+        output('    union {\n')
+        for n in sorted(arguments.keys()):
+            f = arguments[n]
+            output('        ', f.struct_name(), ' f_', f.name, ';\n')
+        output('    } u;\n\n',
+               '    return decodetree_decode(&', name, '_tables, ctx, insn, '
+               '&u);\n',
+               '}\n')
+# end DecodeTables
+
+
+def cache_file_name(opts, args):
+    """Return the name of the cached output for OPTS and input files ARGS"""
+    h = hashlib.sha256()
+    with open(__file__, 'rb') as f:
+        h.update(f.read())
+    for o, a in opts:
+        if o not in ('-o', '--output', '--cache-dir', '--stats'):
+            h.update(repr((o, a)).encode('utf-8'))
+        if o == '--profile':
+            with open(a, 'rb') as f:
+                h.update(hashlib.sha256(f.read()).digest())
+    for filename in args:
+        h.update(repr(filename).encode('utf-8'))
+        with open(filename, 'rb') as f:
+            h.update(hashlib.sha256(f.read()).digest())
+    return os.path.join(cache_dir, h.hexdigest() + '.c.inc')
+# end cache_file_name
+
+
+def cache_store(cache_file):
+    """Store the output file as CACHE_FILE, then prune the cache"""
+    # Several builds may generate the same decoder at once, so each
+    # writes its own temporary file and renames it into place.
+    os.makedirs(cache_dir, exist_ok=True)
+    (fd, tmp) = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        os.close(fd)
+        shutil.copyfile(output_file, tmp)
+        shutil.copymode(output_file, tmp)
+        os.replace(tmp, cache_file)
+    except OSError:
+        os.remove(tmp)
+        raise
+
+    # Hits refresh the modification time, so this only removes outputs
+    # that were replaced by newer ones, and temporary files left behind.
+    oldest = time.time() - cache_max_age
+    for name in os.listdir(cache_dir):
+        try:
+            path = os.path.join(cache_dir, name)
+            if os.stat(path).st_mtime < oldest:
+                os.remove(path)
+        except OSError:
+            pass
+# end cache_store
+
+
 def main():
     global arguments
     global formats
@@ -1266,11 +1702,16 @@ def main():
     global decode_function
     global variablewidth
     global anyextern
+    global cache_dir
+    global profile_file
+    global tables
 
     decode_scope = 'static '
+    stats = False
 
     long_opts = ['decode=', 'translate=', 'output=', 'insnwidth=',
-                 'static-decode=', 'varinsnwidth=']
+                 'static-decode=', 'varinsnwidth=', 'cache-dir=', 'stats',
+                 'profile=', 'tables']
     try:
         (opts, args) = getopt.gnu_getopt(sys.argv[1:], 'o:vw:', long_opts)
     except getopt.GetoptError as err:
@@ -1295,12 +1736,41 @@ def main():
                 insnmask = 0xffff
             elif insnwidth != 32:
                 error(0, 'cannot handle insns of width', insnwidth)
+        elif o == '--cache-dir':
+            cache_dir = a
+        elif o == '--stats':
+            stats = True
+        elif o == '--profile':
+            profile_file = a
+        elif o == '--tables':
+            tables = True
         else:
             assert False, 'unhandled option'
 
     if len(args) < 1:
         error(0, 'missing input file')
 
+    # The output only depends on this script, the options and the input
+    # files.  If they are unchanged, reuse the output of an earlier run.
+    cache_file = None
+    if cache_dir and output_file:
+        try:
+            cache_file = cache_file_name(opts, args)
+        except OSError as err:
+            error(0, err)
+        if not stats and os.path.exists(cache_file):
+            try:
+                shutil.copyfile(cache_file, output_file)
+            except FileNotFoundError:
+                # Pruned by a concurrent run, generate it again
+                pass
+            else:
+                try:
+                    os.utime(cache_file)
+                except OSError:
+                    pass
+                return
+
     toppat = ExcMultiPattern(0)
 
     for filename in args:
@@ -1318,6 +1788,13 @@ def main():
     toppat.build_tree()
     toppat.prop_format()
 
+    # Order overlap groups by how often their patterns match.
+    if profile_file:
+        profile = parse_profile(profile_file)
+        insns, undecoded, before = profile_tests(toppat, profile, True)
+        toppat.reorder()
+        _, _, after = profile_tests(toppat, profile, False)
+
     if variablewidth:
         for i in toppat.pats:
             i.prop_width()
@@ -1332,6 +1809,8 @@ def main():
                                      errors="ignore")
 
     output_autogen()
+    if tables:
+        output('#include "qemu/decodetree.h"\n\n')
     for n in sorted(arguments.keys()):
         f = arguments[n]
         f.output_def()
@@ -1364,25 +1843,30 @@ def main():
     if anyextern:
         output("#pragma GCC diagnostic pop\n\n")
 
-    for n in sorted(formats.keys()):
-        f = formats[n]
-        f.output_extract()
+    if tables and len(allpatterns) != 0:
+        t = DecodeTables()
+        t.add(toppat, 0)
+        t.output_code(decode_scope)
+    else:
+        for n in sorted(formats.keys()):
+            f = formats[n]
+            f.output_extract()
 
-    output(decode_scope, 'bool ', decode_function,
-           '(DisasContext *ctx, ', insntype, ' insn)\n{\n')
+        output(decode_scope, 'bool ', decode_function,
+               '(DisasContext *ctx, ', insntype, ' insn)\n{\n')
 
-    i4 = str_indent(4)
+        i4 = str_indent(4)
 
-    if len(allpatterns) != 0:
-        output(i4, 'union {\n')
-        for n in sorted(arguments.keys()):
-            f = arguments[n]
-            output(i4, i4, f.struct_name(), ' f_', f.name, ';\n')
-        output(i4, '} u;\n\n')
-        toppat.output_code(4, False, 0, 0)
+        if len(allpatterns) != 0:
+            output(i4, 'union {\n')
+            for n in sorted(arguments.keys()):
+                f = arguments[n]
+                output(i4, i4, f.struct_name(), ' f_', f.name, ';\n')
+            output(i4, '} u;\n\n')
+            toppat.output_code(4, False, 0, 0)
 
-    output(i4, 'return false;\n')
-    output('}\n')
+        output(i4, 'return false;\n')
+        output('}\n')
 
     if variablewidth:
         output('\n', decode_scope, insntype, ' ', decode_function,
@@ -1393,6 +1877,19 @@ def main():
 
     if output_file:
         output_fd.close()
+
+    if cache_file:
+        try:
+            cache_store(cache_file)
+        except OSError:
+            pass
+
+    if stats:
+        s = DecodeStats()
+        s.walk(toppat, 0, 0, 0)
+        if profile_file:
+            s.profile = (insns, undecoded, before, after)
+        s.output(sys.stderr)
 # end main
 
 
@@ -14,7 +14,10 @@
 """
 
 import ctypes
+import os
+import queue
 import struct
+import threading
 
 try:
     UINTPTR_T = gdb.lookup_type("uintptr_t")
@@ -26,6 +29,13 @@
 TARGET_PAGE_SIZE = 0x1000
 TARGET_PAGE_MASK = 0xFFFFFFFFFFFFF000
 
+# Guest memory is read from the core in chunks of this size, which keeps
+# the number of round trips through gdb low.
+DUMP_CHUNK_SIZE = 16 << 20
+
+# Maximum number of chunks that have been read but not yet written.
+DUMP_QUEUE_DEPTH = 4
+
 # Special value for e_phnum. This indicates that the real number of
 # program headers is too large to fit into e_phnum. Instead the real
 # value is in the field sh_info of section 0.
@@ -365,6 +375,69 @@ def int128_get64(val):
             return u64[1]
 
 
+class VmcoreWriter(threading.Thread):
+    """Writes guest memory chunks to the vmcore in the background.
+
+    Reading from the qemu core has to happen in gdb's thread, so the
+    reader hands chunks over through a bounded queue and keeps reading
+    while earlier chunks are being written. Pages that are all zero are
+    skipped with a seek rather than written, which leaves holes in the
+    output file.
+    """
+
+    def __init__(self, vmcore):
+        super(VmcoreWriter, self).__init__()
+        self.vmcore = vmcore
+        self.queue = queue.Queue(DUMP_QUEUE_DEPTH)
+        self.error = None
+        self.zero_page = bytes(TARGET_PAGE_SIZE)
+        self.start()
+
+    def put(self, chunk):
+        self.queue.put(chunk)
+
+    def finish(self):
+        self.queue.put(None)
+        self.join()
+        # A trailing hole must still count towards the file size.
+        self.vmcore.truncate(self.vmcore.tell())
+        if self.error is not None:
+            raise self.error
+
+    def write_chunk(self, chunk):
+        view = memoryview(chunk)
+        zero_page = self.zero_page
+        length = len(view)
+        start = 0
+        while start < length:
+            # Write out the data up to the next zero page in one go.
+            end = start
+            while (end < length and
+                   view[end:end + TARGET_PAGE_SIZE] != zero_page):
+                end += TARGET_PAGE_SIZE
+            end = min(end, length)
+            if end > start:
+                self.vmcore.write(view[start:end])
+            start = end
+            while (start < length and
+                   view[start:start + TARGET_PAGE_SIZE] == zero_page):
+                start += TARGET_PAGE_SIZE
+            if start > end:
+                self.vmcore.seek(start - end, os.SEEK_CUR)
+
+    def run(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                return
+            if self.error is not None:
+                continue
+            try:
+                self.write_chunk(chunk)
+            except Exception as inst:
+                self.error = inst
+
+
 def qlist_foreach(head, field_str):
     """Generator for qlists."""
 
@@ -483,7 +556,8 @@ class DumpGuestMemory(gdb.Command):
 For simplicity, the "paging", "begin" and "end" parameters of the QMP
 command are not supported -- no attempt is made to get the guest's
 internal paging structures (ie. paging=false is hard-wired), and guest
-memory is always fully dumped.
+memory is always fully dumped. Guest pages that only contain zeroes are
+not written but left as holes, so the vmcore is a sparse file.
 
 Currently aarch64-be, aarch64-le, X86_64, 386, s390, ppc64-be,
 ppc64-le guests are supported.
@@ -531,18 +605,22 @@ def dump_iterate(self, vmcore):
         """Writes guest core to file."""
 
         qemu_core = gdb.inferiors()[0]
-        for block in self.guest_phys_blocks:
-            cur = block["host_addr"]
-            left = block["target_end"] - block["target_start"]
-            print("dumping range at %016x for length %016x" %
-                  (cur.cast(UINTPTR_T), left))
-
-            while left > 0:
-                chunk_size = min(TARGET_PAGE_SIZE, left)
-                chunk = qemu_core.read_memory(cur, chunk_size)
-                vmcore.write(chunk)
-                cur += chunk_size
-                left -= chunk_size
+        writer = VmcoreWriter(vmcore)
+        try:
+            for block in self.guest_phys_blocks:
+                cur = block["host_addr"]
+                left = block["target_end"] - block["target_start"]
+                print("dumping range at %016x for length %016x" %
+                      (cur.cast(UINTPTR_T), left))
+
+                while left > 0 and writer.error is None:
+                    chunk_size = min(DUMP_CHUNK_SIZE, left)
+                    chunk = qemu_core.read_memory(cur, chunk_size)
+                    writer.put(chunk)
+                    cur += chunk_size
+                    left -= chunk_size
+        finally:
+            writer.finish()
 
     def phys_memory_read(self, addr, size):
         qemu_core = gdb.inferiors()[0]
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+
+#  Run a suite of linux-user benchmarks with a set of QEMU executables
+#  and generate a static HTML and JSON dashboard of the results.
+#
+#  Every benchmark is run with every QEMU executable under perf stat
+#  (instructions, cycles, task clock and elapsed host time) and/or
+#  callgrind (instructions), as many runs at a time as there are host
+#  CPUs. Results are cached by the hash of the QEMU and target
+#  executables, so only new builds have to be run again when the suite
+#  is extended with a new QEMU version.
+#
+#  Syntax:
+#  bench_dashboard.py [-h] [-j <jobs>] [-r <repeat>] [-c <cache dir>] \
+#                     [-o <output dir>] <suite JSON file>
+#
+#  [-h] - Print the script arguments help message.
+#  [-j] - Number of runs at a time, defaults to the number of host CPUs.
+#  [-r] - Number of perf stat runs to average over, defaults to 3.
+#  [-c] - Result cache directory,
+#         defaults to ~/.cache/qemu-bench-dashboard.
+#  [-o] - Directory to write index.html and dashboard.json to,
+#         defaults to the current directory.
+#
+#  The suite file lists the QEMU executables in the order they should
+#  appear in trends, the benchmarks as target command lines, and
+#  optionally the tools to run:
+#
+#  {
+#      "qemu": [{"id": "v5.1", "path": "/opt/qemu-5.1/bin/qemu-arm"},
+#               {"id": "v5.2", "path": "/opt/qemu-5.2/bin/qemu-arm"}],
+#      "benchmarks": [{"id": "coulomb",
+#                      "command": ["coulomb_double-arm"]}],
+#      "tools": ["perf", "callgrind"]
+#  }
+#
+#  This file is a part of the project "TCG Continuous Benchmarking".
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import hashlib
+import html
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tcg_profile import check_tool, parse_callgrind
+
+
+# Metrics reported by each tool, in display order
+METRICS = {
+    "perf": ("instructions", "cycles", "task-clock", "elapsed"),
+    "callgrind": ("callgrind instructions",),
+}
+
+UNITS = {
+    "task-clock": "ms",
+    "elapsed": "s",
+}
+
+
+# SHA-256 of the executables, by path
+hashes = {}
+
+
+def file_hash(path):
+    """
+    Return the SHA-256 of the contents of path, computed once per run.
+    """
+    if path not in hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as data:
+            for chunk in iter(lambda: data.read(1 << 20), b""):
+                digest.update(chunk)
+        hashes[path] = digest.hexdigest()
+    return hashes[path]
+
+
+def cache_key(qemu, benchmark, tool, repeat):
+    """
+    Return the name of the cache entry of a run.
+
+    Runs are identified by the contents of the QEMU and target executables
+    rather than their paths, so rebuilding a QEMU version invalidates its
+    results and renaming it does not. Cycles and times depend on the host,
+    so its name is part of the key too.
+    """
+    target = benchmark["command"][0]
+    key = {
+        "qemu": file_hash(qemu["path"]),
+        "target": file_hash(target) if os.path.isfile(target) else target,
+        "command": benchmark["command"][1:],
+        "tool": tool,
+        "repeat": repeat if tool == "perf" else 1,
+        "host": platform.node(),
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True)
+                          .encode("utf-8")).hexdigest()
+
+
+def run_perf(command, repeat, tmpdirname):
+    output_path = os.path.join(tmpdirname, "perf-stat.csv")
+    start = time.monotonic()
+    perf_stat = subprocess.run(["perf", "stat", "-x", ",",
+                                "-e", "instructions,cycles,task-clock",
+                                "-r", str(repeat), "-o", output_path, "--"] +
+                               command,
+                               stdout=subprocess.DEVNULL,
+                               stderr=subprocess.PIPE)
+    elapsed = (time.monotonic() - start) / repeat
+    if perf_stat.returncode:
+        return {"error": perf_stat.stderr.decode("utf-8")}
+
+    result = {"elapsed": elapsed}
+    with open(output_path, "r") as data:
+        for line in data:
+            fields = line.strip().split(",")
+            if len(fields) < 3 or line.startswith("#"):
+                continue
+            # Events may be reported with a modifier, e.g. cycles:u
+            event = fields[2].split(":")[0]
+            if event in METRICS["perf"]:
+                try:
+                    result[event] = float(fields[0])
+                except ValueError:
+                    # <not counted> or <not supported>
+                    continue
+    return result
+
+
+def run_callgrind(command, repeat, tmpdirname):
+    data_path = os.path.join(tmpdirname, "callgrind.data")
+    callgrind = subprocess.run(["valgrind", "--tool=callgrind",
+                                "--callgrind-out-file=" + data_path] +
+                               command,
+                               stdout=subprocess.DEVNULL,
+                               stderr=subprocess.PIPE)
+    if callgrind.returncode:
+        return {"error": callgrind.stderr.decode("utf-8")}
+    _, _, total = parse_callgrind(data_path)
+    return {"callgrind instructions": total}
+
+
+RUNNERS = {
+    "perf": run_perf,
+    "callgrind": run_callgrind,
+}
+
+
+def run_cached(qemu, benchmark, tool, repeat, cache_dir):
+    """
+    Return the result of one run, from the cache if possible. Failed runs
+    are not cached, so that they are retried next time.
+    """
+    cache_path = os.path.join(cache_dir,
+                              cache_key(qemu, benchmark, tool, repeat) +
+                              ".json")
+    try:
+        with open(cache_path, "r") as data:
+            return json.load(data), True
+    except (OSError, ValueError):
+        pass
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        result = RUNNERS[tool]([qemu["path"]] + benchmark["command"],
+                               repeat, tmpdirname)
+    if "error" not in result:
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "w") as data:
+            json.dump(result, data)
+        os.replace(tmp_path, cache_path)
+    return result, False
+
+
+def run_suite(suite, jobs, repeat, cache_dir):
+    """
+    Run every benchmark with every QEMU executable under every tool.
+
+    Returns:
+    (dict): Mapping benchmark id to a mapping of QEMU id to the metrics
+            of all tools, or to an "error" message.
+    """
+    tools = suite.get("tools", ["perf"])
+    runs = [(qemu, benchmark, tool)
+            for benchmark in suite["benchmarks"]
+            for qemu in suite["qemu"]
+            for tool in tools]
+
+    results = {b["id"]: {q["id"]: {} for q in suite["qemu"]}
+               for b in suite["benchmarks"]}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(run_cached, qemu, benchmark, tool, repeat,
+                                   cache_dir)
+                   for qemu, benchmark, tool in runs]
+        for (qemu, benchmark, tool), future in zip(runs, futures):
+            result, cached = future.result()
+            print("{:<20} {:<20} {:<10} {}".format(
+                benchmark["id"], qemu["id"], tool,
+                "failed" if "error" in result else
+                "cached" if cached else "done"), file=sys.stderr)
+            results[benchmark["id"]][qemu["id"]].update(result)
+    return results
+
+
+def format_value(value, metric):
+    if value is None:
+        return "-"
+    if metric in UNITS:
+        return "{:.3f} {}".format(value, UNITS[metric])
+    return format(int(value), ",")
+
+
+def svg_trend(values, width=360, height=120, pad=8):
+    """
+    Return an inline SVG line chart of values; missing values are gaps.
+    """
+    present = [v for v in values if v is not None]
+    if not present:
+        return ""
+    low, high = min(present), max(present)
+    span = (high - low) or 1
+    step = (width - 2 * pad) / max(len(values) - 1, 1)
+
+    segments, points = [], []
+    for i, value in enumerate(values):
+        if value is None:
+            if points:
+                segments.append(points)
+            points = []
+            continue
+        x = pad + i * step
+        y = height - pad - (value - low) / span * (height - 2 * pad)
+        points.append("{:.1f},{:.1f}".format(x, y))
+    if points:
+        segments.append(points)
+
+    shapes = ["<polyline fill='none' stroke='#1f77b4' stroke-width='2' "
+              "points='{}'/>".format(" ".join(s)) for s in segments]
+    shapes += ["<circle cx='{}' cy='{}' r='3' fill='#1f77b4'/>"
+               .format(*p.split(",")) for s in segments for p in s]
+    return ("<svg width='{}' height='{}' style='border:1px solid #ccc'>{}"
+            "</svg>".format(width, height, "".join(shapes)))
+
+
+def generate_html(suite, results):
+    qemu_ids = [q["id"] for q in suite["qemu"]]
+    metrics = [m for tool in suite.get("tools", ["perf"])
+               for m in METRICS[tool]]
+
+    out = ["<!DOCTYPE html>", "<html><head><meta charset='utf-8'>",
+           "<title>QEMU TCG benchmarks</title>",
+           "<style>body{font-family:sans-serif} td,th{padding:2px 8px;"
+           "text-align:right} .error{color:#c00}</style>",
+           "</head><body>", "<h1>QEMU TCG benchmarks</h1>",
+           "<p>Generated on {} on {}</p>".format(
+               html.escape(time.strftime("%Y-%m-%d %H:%M")),
+               html.escape(platform.node()))]
+
+    for benchmark in suite["benchmarks"]:
+        row = results[benchmark["id"]]
+        out.append("<h2>{}</h2>".format(html.escape(benchmark["id"])))
+        out.append("<p><code>{}</code></p>".format(
+            html.escape(" ".join(benchmark["command"]))))
+
+        out.append("<table><tr><th>QEMU</th>{}</tr>".format(
+            "".join("<th>{}</th>".format(html.escape(m)) for m in metrics)))
+        for qemu_id in qemu_ids:
+            result = row[qemu_id]
+            if "error" in result:
+                cells = "<td class='error' colspan='{}'>{}</td>".format(
+                    len(metrics), html.escape(result["error"][-200:]))
+            else:
+                cells = "".join("<td>{}</td>".format(
+                    format_value(result.get(m), m)) for m in metrics)
+            out.append("<tr><th>{}</th>{}</tr>".format(html.escape(qemu_id),
+                                                       cells))
+        out.append("</table>")
+
+        for metric in metrics:
+            values = [row[q].get(metric) for q in qemu_ids]
+            chart = svg_trend(values)
+            if chart:
+                out.append("<h3>{}</h3>{}<br><small>{}</small>".format(
+                    html.escape(metric), chart,
+                    html.escape(" → ".join(qemu_ids))))
+
+    out.append("</body></html>")
+    return "\n".join(out)
+
+
+def main():
+    # Parse the command line arguments
+    parser = argparse.ArgumentParser(
+        usage='bench_dashboard.py [-h] [-j <jobs>] [-r <repeat>] '
+              '[-c <cache dir>] [-o <output dir>] <suite JSON file>')
+
+    parser.add_argument('-j', dest='jobs', type=int,
+                        default=os.cpu_count(),
+                        help='Number of runs at a time.')
+    parser.add_argument('-r', dest='repeat', type=int, default=3,
+                        help='Number of perf stat runs to average over.')
+    parser.add_argument('-c', dest='cache_dir',
+                        default=os.path.expanduser(
+                            "~/.cache/qemu-bench-dashboard"),
+                        help='Result cache directory.')
+    parser.add_argument('-o', dest='output_dir', default=".",
+                        help='Directory to write the dashboard to.')
+    parser.add_argument('suite', help='Suite JSON file.')
+
+    args = parser.parse_args()
+
+    with open(args.suite, "r") as data:
+        suite = json.load(data)
+
+    for tool in suite.get("tools", ["perf"]):
+        if tool not in RUNNERS:
+            sys.exit("Unknown tool {}".format(tool))
+        check_tool(tool)
+
+    os.makedirs(args.cache_dir, exist_ok=True)
+    results = run_suite(suite, args.jobs, args.repeat, args.cache_dir)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    with open(os.path.join(args.output_dir, "dashboard.json"), "w") as data:
+        json.dump({"suite": suite, "host": platform.node(),
+                   "results": results}, data, indent=4)
+    with open(os.path.join(args.output_dir, "index.html"), "w") as data:
+        data.write(generate_html(suite, results))
+
+
+if __name__ == "__main__":
+    main()
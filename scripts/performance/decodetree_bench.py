@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+
+#  Measure the decode cost of a decodetree decoder on a profiled workload.
+#
+#  A profile lists how often each insn is decoded, one "<count> <insn>"
+#  line per insn with the insn in hex, as written by the opcodes TCG
+#  plugin (contrib/plugins/opcodes.c). The decoder for the decode file
+#  is generated three times, in pattern order, reordered for the profile
+#  (decodetree.py --profile) and as tables for util/decodetree.c
+#  (decodetree.py --tables), and compiled together with stub translate
+#  functions. Each decoder then decodes insns sampled from the profile,
+#  and the time per insn is printed along with the number of mask tests
+#  per insn of the decodetree.py cost model and the code and data size
+#  of the decoder. All decoders must select the same pattern for every
+#  insn, or the script fails.
+#
+#  Syntax:
+#  decodetree_bench.py [-h] [-n <number of runs>] [-s <samples>]
+#                      [-D <decodetree option>] <decode file> <profile>
+#
+#  [-h] - Print the script arguments help message.
+#  [-n] - Specify the number of times to run each decoder (default 5).
+#  [-s] - Specify the number of insns sampled from the profile
+#         (default 1000000).
+#  [-D] - Pass an option to decodetree.py, e.g. -D=--static-decode=foo.
+#         May be given several times.
+#
+#  Example of usage:
+#  qemu-arm -plugin contrib/plugins/libopcodes.so,arg=size=4,arg=halfwords \
+#           -d plugin -D t32.prof ./program
+#  decodetree_bench.py -D=--static-decode=disas_t32 \
+#                      target/arm/t32.decode t32.prof
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import os
+import random
+import re
+import struct
+import subprocess
+import sys
+import tempfile
+
+SOURCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          '..', '..')
+DECODETREE = os.path.join(SOURCE_DIR, 'scripts', 'decodetree.py')
+
+# Stand-ins for the QEMU headers used by util/decodetree.c
+OSDEP_H = r'''
+#include <stdbool.h>
+#include <stddef.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+
+#define g_assert_not_reached() abort()
+'''
+
+BITOPS_H = r'''
+static inline uint32_t extract32(uint32_t value, int start, int length)
+{
+    return (value >> start) & (~0U >> (32 - length));
+}
+
+static inline int32_t sextract32(uint32_t value, int start, int length)
+{
+    return ((int32_t)(value << (32 - length - start))) >> (32 - length);
+}
+
+static inline uint32_t deposit32(uint32_t value, int start, int length,
+                                 uint32_t fieldval)
+{
+    uint32_t mask = (~0U >> (32 - length)) << start;
+    return (value & ~mask) | ((fieldval << start) & mask);
+}
+'''
+
+HARNESS_HEAD = r'''
+#include "qemu/osdep.h"
+#include "qemu/bitops.h"
+#include <time.h>
+
+typedef struct DisasContext DisasContext;
+
+static const char *matched;
+'''
+
+HARNESS_MAIN = r'''
+int main(int argc, char **argv)
+{
+    FILE *f = fopen(argv[1], "rb");
+    long n, i, size;
+    uint32_t *insns;
+    struct timespec start, end;
+
+    fseek(f, 0, SEEK_END);
+    size = ftell(f);
+    rewind(f);
+    insns = malloc(size);
+    n = fread(insns, sizeof(uint32_t), size / sizeof(uint32_t), f);
+    fclose(f);
+
+    if (argc > 2) {
+        /* Print the pattern selected for every insn */
+        for (i = 0; i < n; i++) {
+            matched = NULL;
+            DECODE(NULL, insns[i]);
+            printf("%s\n", matched ? matched : "-");
+        }
+        return 0;
+    }
+
+    clock_gettime(CLOCK_MONOTONIC, &start);
+    for (i = 0; i < n; i++) {
+        DECODE(NULL, insns[i]);
+    }
+    clock_gettime(CLOCK_MONOTONIC, &end);
+    printf("%f\n", ((end.tv_sec - start.tv_sec) * 1e9 +
+                    (end.tv_nsec - start.tv_nsec)) / n);
+    return 0;
+}
+'''
+
+
+def write_harness(fname, decoder, decode_file, decode_function):
+    """
+    Write a C program decoding insns with the decoder in file decoder,
+    with stubs for the functions it calls.
+    """
+    with open(decoder, 'r', encoding='utf-8') as f:
+        code = f.read()
+
+    # Argument sets declared by another decoder
+    stubs = ''
+    with open(decode_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            toks = line.split('#', 1)[0].split()
+            if toks and toks[0].startswith('&') and '!extern' in toks:
+                stubs += 'typedef struct {\n'
+                for field in sorted(t for t in toks[1:]
+                                    if not t.startswith('!')):
+                    stubs += '    int {};\n'.format(field)
+                stubs += '}} arg_{};\n'.format(toks[0][1:])
+
+    # Field functions, with and without the extracted value, called
+    # from the extract functions or from the call function of the tables
+    funcs = re.findall(r'(?:= |return )(\w+)\(ctx, ', code)
+    for func in sorted(set(funcs) - set(re.findall(r'return (\w+)\(ctx, args',
+                                                   code))):
+        stubs += ('static int {}(DisasContext *ctx, int x) {{ return x; }}\n'
+                  .format(func))
+    for func in sorted(set(re.findall(r'(?:= |return )(\w+)\(ctx\)', code))):
+        stubs += ('static int {}(DisasContext *ctx) {{ return 0; }}\n'
+                  .format(func))
+
+    # Translate functions remember their pattern and keep the arguments.
+    # They are kept out of line and out of the size of the decoder, like
+    # translate functions of a target.
+    trans = ''
+    for scope, func, arg in re.findall(
+            r'^((?:static )?)bool (\w+)\(DisasContext \*ctx, (arg_\w+) \*a\);',
+            code, re.M):
+        trans += ('__attribute__((noinline, section(".text.stubs")))\n'
+                  '{}bool {}(DisasContext *ctx, {} *a)\n'
+                  '{{\n'
+                  '    matched = "{}";\n'
+                  '    __asm__ volatile("" : : "r"(a) : "memory");\n'
+                  '    return true;\n'
+                  '}}\n'.format(scope, func, arg, func))
+
+    with open(fname, 'w', encoding='utf-8') as f:
+        f.write(HARNESS_HEAD)
+        f.write(stubs)
+        f.write('#include "{}"\n'.format(os.path.abspath(decoder)))
+        f.write(trans)
+        f.write('#define DECODE {}\n'.format(decode_function))
+        f.write(HARNESS_MAIN)
+
+
+def decode_function(options):
+    """Return the name of the decode function for decodetree options"""
+    name = 'decode'
+    for opt in options:
+        match = re.match(r'--(?:static-)?decode=(.*)', opt)
+        if match:
+            name = match.group(1)
+    return name
+
+
+def write_includes(workdir):
+    """
+    Write the stand-ins for the QEMU headers to workdir, and return the
+    compiler options to find them and include/qemu/decodetree.h.
+    """
+    qemu = os.path.join(workdir, 'include', 'qemu')
+    os.makedirs(qemu)
+    for header, text in (('osdep.h', OSDEP_H), ('bitops.h', BITOPS_H)):
+        with open(os.path.join(qemu, header), 'w', encoding='utf-8') as f:
+            f.write(text)
+    return ['-I', os.path.join(workdir, 'include'),
+            '-I', os.path.join(SOURCE_DIR, 'include')]
+
+
+def compile_object(source, obj, includes):
+    """
+    Compile source to obj, and return the size of the code and data of
+    obj, without the translate functions and their pattern names.
+    """
+    subprocess.run([os.environ.get('CC', 'cc'), '-O2', '-w', '-c',
+                    '-o', obj, source] + includes, check=True)
+    output = subprocess.run(['size', '-A', obj], check=True,
+                            stdout=subprocess.PIPE,
+                            universal_newlines=True).stdout
+    size = 0
+    for line in output.splitlines():
+        toks = line.split()
+        if (len(toks) == 3 and
+                toks[0].startswith(('.text', '.rodata', '.data')) and
+                not toks[0].startswith(('.text.stubs', '.rodata.str'))):
+            size += int(toks[1])
+    return size
+
+
+def build(workdir, name, decode_file, options, includes):
+    """
+    Generate and compile the decoder for decode_file, and return the
+    path of the program, the output of decodetree.py --stats and the
+    code and data size of the decoder in bytes.
+    """
+    decoder = os.path.join(workdir, name + '.c.inc')
+    stats = subprocess.run([sys.executable, DECODETREE, '--stats',
+                            '-o', decoder, decode_file] + options,
+                           check=True, stderr=subprocess.PIPE,
+                           universal_newlines=True).stderr
+    harness = os.path.join(workdir, name + '.c')
+    write_harness(harness, decoder, decode_file, decode_function(options))
+    objects = [os.path.join(workdir, name + '.o')]
+    size = compile_object(harness, objects[0], includes)
+    if '--tables' in options:
+        objects.append(os.path.join(workdir, 'decodetree.o'))
+        size += compile_object(os.path.join(SOURCE_DIR, 'util',
+                                            'decodetree.c'),
+                               objects[1], includes)
+    program = os.path.join(workdir, name)
+    subprocess.run([os.environ.get('CC', 'cc'), '-o', program] + objects,
+                   check=True)
+    return program, stats, size
+
+
+def main():
+    # Parse the command line arguments
+    parser = argparse.ArgumentParser(
+        usage='decodetree_bench.py [-h] [-n <number of runs>] '
+              '[-s <samples>] [-D <decodetree option>] '
+              '<decode file> <profile>')
+
+    parser.add_argument('-n', dest='runs', type=int, default=5,
+                        help='Specify the number of times to run '
+                             'each decoder.')
+    parser.add_argument('-s', dest='samples', type=int, default=1000000,
+                        help='Specify the number of insns sampled from '
+                             'the profile.')
+    parser.add_argument('-D', dest='options', action='append', default=[],
+                        help='Pass an option to decodetree.py.')
+    parser.add_argument('decode_file', type=str, help=argparse.SUPPRESS)
+    parser.add_argument('profile', type=str, help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    if any(opt.startswith('--varinsnwidth') for opt in args.options):
+        sys.exit('variable width decoders are not supported')
+
+    # Sample the insns to decode from the profile
+    profile = {}
+    with open(args.profile, 'r', encoding='utf-8') as f:
+        for line in f:
+            toks = line.split('#', 1)[0].split()
+            if len(toks) == 2:
+                insn = int(toks[1], 16)
+                profile[insn] = profile.get(insn, 0) + int(toks[0])
+    if not profile:
+        sys.exit('{}: no insns in profile'.format(args.profile))
+    insns = random.Random(0).choices(list(profile), list(profile.values()),
+                                     k=args.samples)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        data = os.path.join(workdir, 'insns.bin')
+        with open(data, 'wb') as f:
+            f.write(struct.pack('={}I'.format(len(insns)), *insns))
+
+        includes = write_includes(workdir)
+        decoders = [
+            ('pattern order', build(workdir, 'plain', args.decode_file,
+                                    args.options, includes)),
+            ('profiled', build(workdir, 'profiled', args.decode_file,
+                               args.options +
+                               ['--profile=' + args.profile], includes)),
+            ('tables', build(workdir, 'tables', args.decode_file,
+                             args.options + ['--tables'], includes)),
+        ]
+
+        # All decoders must select the same patterns
+        selected = [subprocess.run([program, data, 'check'], check=True,
+                                   stdout=subprocess.PIPE).stdout
+                    for _, (program, _, _) in decoders]
+        for (name, _), sel in zip(decoders[1:], selected[1:]):
+            if sel != selected[0]:
+                sys.exit('the {} decoder selects different patterns'
+                         .format(name))
+
+        # The tables decoder tests the masks in pattern order
+        match = re.search(r'mask tests per profiled insn: ([0-9.]+) in '
+                          r'pattern order, ([0-9.]+) reordered',
+                          decoders[1][1][1])
+        tests = [float(match.group(1)), float(match.group(2)),
+                 float(match.group(1))]
+
+        # Print table header
+        print('{:<13}  {:>10}  {:>9}  {:>9}\n'
+              '{}  {}  {}  {}'.format('Decoder', 'Tests/insn', 'ns/insn',
+                                      'Size (B)', '-' * 13, '-' * 10,
+                                      '-' * 9, '-' * 9))
+
+        for (name, (program, _, size)), model in zip(decoders, tests):
+            best = min(float(subprocess.run([program, data], check=True,
+                                            stdout=subprocess.PIPE,
+                                            universal_newlines=True).stdout)
+                       for _ in range(args.runs))
+            print('{:<13}  {:>10.2f}  {:>9.2f}  {:>9}'.format(name, model,
+                                                            best, size))
+
+
+if __name__ == "__main__":
+    main()
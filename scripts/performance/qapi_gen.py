@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+#  Time how long each QAPI code generation backend takes on a schema.
+#
+#  The schema is parsed and checked once, then every backend generates
+#  its code into a temporary directory the given number of times, and
+#  the fastest run of each is printed along with the amount of code it
+#  generated.
+#
+#  Syntax:
+#  qapi_gen.py [-h] [-n <number of runs>] [-b] [<schema file>]
+#
+#  [-h] - Print the script arguments help message.
+#  [-n] - Specify the number of times to run each backend (default 5).
+#  [-b] - Also generate code for built-in types.
+#
+#  If no schema file is given, qapi/qapi-schema.json of the source tree
+#  is used.
+#
+#  Example of usage:
+#  qapi_gen.py -n 10 -b qapi/qapi-schema.json
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+SOURCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          '..', '..')
+sys.path.append(os.path.join(SOURCE_DIR, 'scripts'))
+# pylint: disable=wrong-import-position
+from qapi import types
+from qapi.commands import gen_commands
+from qapi.error import QAPIError
+from qapi.events import gen_events
+from qapi.introspect import gen_introspect
+from qapi.schema import QAPISchema
+from qapi.visit import gen_visit
+
+
+def directory_size(path):
+    """
+    Return the number of files below path and their total size in bytes.
+    """
+    files = 0
+    size = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            files += 1
+            size += os.path.getsize(os.path.join(dirpath, filename))
+    return files, size
+
+
+def best_time(function, runs):
+    """
+    Return the fastest of runs calls to function, in seconds.
+    """
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def gen_types(schema, output_dir, builtins):
+    # gen_object() remembers the structs it emitted, forget them so
+    # that every run generates the same code
+    types.objects_seen.clear()
+    types.gen_types(schema, output_dir, '', builtins)
+
+
+def main():
+    # Parse the command line arguments
+    parser = argparse.ArgumentParser(
+        usage='qapi_gen.py [-h] [-n <number of runs>] [-b] [<schema file>]')
+
+    parser.add_argument('-n', dest='runs', type=int, default=5,
+                        help='Specify the number of times to run '
+                             'each backend.')
+    parser.add_argument('-b', dest='builtins', action='store_true',
+                        help='Also generate code for built-in types.')
+    parser.add_argument('schema', type=str, nargs='?',
+                        default=os.path.join(SOURCE_DIR, 'qapi',
+                                             'qapi-schema.json'),
+                        help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        schema = QAPISchema(args.schema)
+    except QAPIError as err:
+        sys.exit(str(err))
+    print('Parsing and checking {}: {:.2f} ms\n'.format(
+        os.path.relpath(args.schema),
+        (time.perf_counter() - start) * 1000))
+
+    backends = [
+        ('types', lambda d: gen_types(schema, d, args.builtins)),
+        ('visit', lambda d: gen_visit(schema, d, '', args.builtins)),
+        ('commands', lambda d: gen_commands(schema, d, '')),
+        ('events', lambda d: gen_events(schema, d, '')),
+        ('introspect', lambda d: gen_introspect(schema, d, '', False)),
+    ]
+
+    # Print table header
+    print('{:<10}  {:>9}  {:>6}  {:>10}\n'
+          '{}  {}  {}  {}'.format('Backend', 'Time (ms)', 'Files',
+                                  'Size (KiB)',
+                                  '-' * 10, '-' * 9, '-' * 6, '-' * 10))
+
+    total = 0
+    for name, backend in backends:
+        with tempfile.TemporaryDirectory() as output_dir:
+            elapsed = best_time(lambda: backend(output_dir), args.runs)
+            files, size = directory_size(output_dir)
+        total += elapsed
+        print('{:<10}  {:>9.2f}  {:>6}  {:>10.1f}'.format(
+            name, elapsed * 1000, files, size / 1024))
+    print('{:<10}  {:>9.2f}'.format('total', total * 1000))
+
+
+if __name__ == "__main__":
+    main()
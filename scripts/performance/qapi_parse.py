@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+#  Time how long the QAPI frontend takes to parse a schema.
+#
+#  Each schema is parsed the given number of times, including the files
+#  it includes, and the fastest parse is printed along with the number of
+#  definitions and documentation blocks found. With [-s], the schema is
+#  also checked, to compare parsing with the rest of the frontend.
+#
+#  Syntax:
+#  qapi_parse.py [-h] [-n <number of runs>] [-s] [<schema file> ...]
+#
+#  [-h] - Print the script arguments help message.
+#  [-n] - Specify the number of times to parse each schema (default 10).
+#  [-s] - Also time building the checked QAPISchema.
+#
+#  If no schema file is given, qapi/qapi-schema.json and the QAPI test
+#  schema of the source tree are parsed.
+#
+#  Example of usage:
+#  qapi_parse.py -n 20 qapi/qapi-schema.json
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import os
+import sys
+import time
+
+SOURCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          '..', '..')
+sys.path.append(os.path.join(SOURCE_DIR, 'scripts'))
+# pylint: disable=wrong-import-position
+from qapi.error import QAPIError
+from qapi.parser import QAPISchemaParser
+from qapi.schema import QAPISchema
+
+
+def best_time(function, runs):
+    """
+    Return the result of function and the fastest of runs calls to it,
+    in seconds.
+    """
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return result, best
+
+
+def main():
+    # Parse the command line arguments
+    parser = argparse.ArgumentParser(
+        usage='qapi_parse.py [-h] [-n <number of runs>] [-s] '
+              '[<schema file> ...]')
+
+    parser.add_argument('-n', dest='runs', type=int, default=10,
+                        help='Specify the number of times to parse '
+                             'each schema.')
+    parser.add_argument('-s', dest='schema', action='store_true',
+                        help='Also time building the checked QAPISchema.')
+    parser.add_argument('files', type=str, nargs='*',
+                        help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    files = args.files or [
+        os.path.join(SOURCE_DIR, 'qapi', 'qapi-schema.json'),
+        os.path.join(SOURCE_DIR, 'tests', 'qapi-schema',
+                     'qapi-schema-test.json')]
+
+    # Print table header
+    print('{:>10}  {:>10}  {:>6}  {:>6}  {}\n'
+          '{}  {}  {}  {}  {}'.format('Parse (ms)', 'Check (ms)',
+                                      'Exprs', 'Docs', 'Schema',
+                                      '-' * 10, '-' * 10, '-' * 6, '-' * 6,
+                                      '-' * 25))
+
+    for fname in files:
+        try:
+            schema_parser, parse_time = best_time(
+                lambda: QAPISchemaParser(fname), args.runs)
+            check_time = None
+            if args.schema:
+                _, check_time = best_time(lambda: QAPISchema(fname),
+                                          args.runs)
+        except QAPIError as err:
+            sys.exit(str(err))
+
+        print('{:>10.2f}  {:>10}  {:>6}  {:>6}  {}'.format(
+            parse_time * 1000,
+            '{:.2f}'.format(check_time * 1000) if check_time else '-',
+            len(schema_parser.exprs), len(schema_parser.docs),
+            os.path.relpath(fname)))
+
+
+if __name__ == "__main__":
+    main()
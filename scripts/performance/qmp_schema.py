@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+#  Measure the latency of query-qmp-schema and the size of QEMU binaries.
+#
+#  Every given QEMU binary is started with no machine, and query-qmp-schema
+#  is executed the given number of times over QMP. The median and fastest
+#  round trip are printed along with the size of the response and the text
+#  and data size of the binary. With several binaries, e.g. built before
+#  and after a change to the QAPI introspection generator, the size
+#  difference of each binary to the first one is printed as well.
+#
+#  Syntax:
+#  qmp_schema.py [-h] [-n <number of runs>] <qemu binary> ...
+#
+#  [-h] - Print the script arguments help message.
+#  [-n] - Specify the number of times to run query-qmp-schema (default 50).
+#
+#  Example of usage:
+#  qmp_schema.py -n 100 old/qemu-system-x86_64 new/qemu-system-x86_64
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SOURCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          '..', '..')
+sys.path.append(os.path.join(SOURCE_DIR, 'python'))
+# pylint: disable=wrong-import-position
+from qemu.machine import QEMUMachine
+
+
+def binary_size(binary):
+    """
+    Return the text and data size of binary in bytes, as reported by
+    size(1). Fall back to the file size when size(1) is not available.
+    """
+    try:
+        output = subprocess.run(['size', binary], check=True,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL,
+                                universal_newlines=True).stdout
+        text, data = output.splitlines()[1].split()[:2]
+        return int(text), int(data)
+    except (OSError, subprocess.CalledProcessError, IndexError, ValueError):
+        return os.path.getsize(binary), 0
+
+
+def query_qmp_schema(binary, runs):
+    """
+    Run query-qmp-schema runs times on binary and return the round trip
+    times in seconds, and the size of the JSON response in bytes.
+    """
+    vm = QEMUMachine(binary, args=['-machine', 'none', '-display', 'none'])
+    vm.launch()
+    try:
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            response = vm.qmp('query-qmp-schema')
+            times.append(time.perf_counter() - start)
+            if 'return' not in response:
+                sys.exit('{}: query-qmp-schema failed: {}'.format(
+                    binary, response))
+    finally:
+        vm.shutdown()
+    return times, len(json.dumps(response['return']))
+
+
+def main():
+    # Parse the command line arguments
+    parser = argparse.ArgumentParser(
+        usage='qmp_schema.py [-h] [-n <number of runs>] <qemu binary> ...')
+
+    parser.add_argument('-n', dest='runs', type=int, default=50,
+                        help='Specify the number of times to run '
+                             'query-qmp-schema.')
+    parser.add_argument('binaries', type=str, nargs='+',
+                        help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    # Print table header
+    print('{:>11}  {:>9}  {:>11}  {:>10}  {:>10}  {:>10}  {}\n'
+          '{}  {}  {}  {}  {}  {}  {}'.format(
+              'Median (ms)', 'Best (ms)', 'Reply (KiB)', 'Text (KiB)',
+              'Data (KiB)', 'Delta (B)', 'Binary',
+              '-' * 11, '-' * 9, '-' * 11, '-' * 10, '-' * 10, '-' * 10,
+              '-' * 25))
+
+    first_size = None
+    for binary in args.binaries:
+        times, reply_size = query_qmp_schema(binary, args.runs)
+        text, data = binary_size(binary)
+        if first_size is None:
+            first_size = text + data
+        print('{:>11.3f}  {:>9.3f}  {:>11.1f}  {:>10.1f}  {:>10.1f}  '
+              '{:>+10}  {}'.format(statistics.median(times) * 1000,
+                                   min(times) * 1000, reply_size / 1024,
+                                   text / 1024, data / 1024,
+                                   text + data - first_size, binary))
+
+
+if __name__ == "__main__":
+    main()
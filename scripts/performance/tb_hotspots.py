@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+
+#  Print the guest code QEMU spends most of its JIT execution time in.
+#
+#  QEMU is run under perf with its perf map enabled, so that samples that
+#  hit translated code can be attributed to the translation block they
+#  hit and to the guest code that block was translated from. Blocks of
+#  the same guest code are merged, and the number of times the code was
+#  translated is printed next to its share of the samples: hot code that
+#  is translated many times suffers from invalidation or retranslation.
+#
+#  Syntax:
+#  tb_hotspots.py [-h] [-n <number of blocks>] [-g <guest ELF>] \
+#                 [-r <region size>] -- \
+#                 <qemu executable> [<qemu executable options>] \
+#                 <target executable> [<target executable options>]
+#
+#  [-h] - Print the script arguments help message.
+#  [-n] - Specify the number of hot spots to print (default 25).
+#  [-g] - Guest ELF file to look up guest symbols in.
+#  [-r] - Merge guest code into aligned regions of this many bytes
+#         instead of printing every block on its own.
+#
+#  Example of usage:
+#  tb_hotspots.py -n 20 -g coulomb_double-arm -- \
+#                 qemu-arm coulomb_double-arm
+#
+#  This file is a part of the project "TCG Continuous Benchmarking".
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import bisect
+import heapq
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+
+# Lines written by QEMU to /tmp/perf-<pid>.map for each translation block
+PERFMAP_RE = re.compile(r"^([0-9a-f]+) ([0-9a-f]+) tb 0x([0-9a-f]+) "
+                        r"flags=0x([0-9a-f]+) size=(\d+) insns=(\d+)$")
+
+
+def enable_perfmap(command):
+    """
+    Return command with the QEMU perf map enabled.
+    """
+    if os.path.basename(command[0]).startswith("qemu-system-"):
+        return command[:1] + ["-accel", "tcg,perfmap=on"] + command[1:]
+    return command[:1] + ["-perfmap"] + command[1:]
+
+
+def read_perfmap(pid):
+    """
+    Parse the perf map written by QEMU process pid.
+
+    Returns:
+    (list): Translation blocks as (host start, host size, guest pc, flags,
+            guest size, guest instructions) tuples, in the order QEMU
+            generated them.
+    """
+    blocks = []
+    with open("/tmp/perf-{}.map".format(pid), "r") as perfmap:
+        for line in perfmap:
+            match = PERFMAP_RE.match(line.strip())
+            if match:
+                start, size, pc, flags = (int(x, 16)
+                                          for x in match.group(1, 2, 3, 4))
+                blocks.append((start, size, pc, flags,
+                               int(match.group(5)), int(match.group(6))))
+    return blocks
+
+
+def host_ranges(blocks):
+    """
+    Split the host code of blocks into ranges, each owned by the newest
+    block covering it, as QEMU reuses the host code of flushed blocks.
+
+    Returns:
+    (list): Sorted start addresses of the ranges
+    (list): Index in blocks of the owner of each range, or None where no
+            block covers it
+    """
+    events = sorted([(start, 1, index)
+                     for index, (start, *_) in enumerate(blocks)] +
+                    [(start + size, 0, index)
+                     for index, (start, size, *_) in enumerate(blocks)])
+    starts = []
+    owners = []
+    live = []
+    ended = set()
+    for address, begins, index in events:
+        if begins:
+            heapq.heappush(live, -index)
+        else:
+            ended.add(index)
+        while live and -live[0] in ended:
+            heapq.heappop(live)
+        owner = -live[0] if live else None
+        if starts and starts[-1] == address:
+            owners[-1] = owner
+        else:
+            starts.append(address)
+            owners.append(owner)
+    return starts, owners
+
+
+def read_guest_symbols(elf):
+    """
+    Return sorted (address, name) list of the functions defined in elf.
+    """
+    nm = subprocess.run(["nm", "--defined-only", "-n", elf],
+                        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if nm.returncode:
+        sys.exit(nm.stderr.decode("utf-8"))
+
+    symbols = []
+    for line in nm.stdout.decode("utf-8").splitlines():
+        fields = line.split()
+        if len(fields) == 3 and fields[1] in "tTwW":
+            symbols.append((int(fields[0], 16), fields[2]))
+    return symbols
+
+
+def guest_symbol(symbols, pc):
+    index = bisect.bisect_right(symbols, (pc, chr(0x10ffff))) - 1
+    if index < 0:
+        return ""
+    address, name = symbols[index]
+    return "{}+{:#x}".format(name, pc - address)
+
+
+def record(command, data_path):
+    """
+    Run command under perf and return the pid of each sample and its
+    instruction pointer.
+    """
+    perf_record = subprocess.run(["perf", "record", "--output=" + data_path] +
+                                 command,
+                                 stdout=subprocess.DEVNULL,
+                                 stderr=subprocess.PIPE)
+    if perf_record.returncode:
+        sys.exit(perf_record.stderr.decode("utf-8"))
+
+    perf_script = subprocess.run(["perf", "script", "--input=" + data_path,
+                                  "--fields=pid,ip"],
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE)
+    if perf_script.returncode:
+        sys.exit(perf_script.stderr.decode("utf-8"))
+
+    samples = []
+    for line in perf_script.stdout.decode("utf-8").splitlines():
+        fields = line.split()
+        if len(fields) == 2:
+            samples.append((int(fields[0]), int(fields[1], 16)))
+    return samples
+
+
+def attribute(samples, blocks_by_pid, region_size):
+    """
+    Attribute samples to the guest code of the translation blocks they hit.
+
+    Returns:
+    (dict): Mapping guest address (the block pc, or the region start) to
+            [samples, translations, guest size, guest instructions]
+    (int): Number of samples in translated code
+    """
+    hot = {}
+    for blocks in blocks_by_pid.values():
+        for _, _, pc, _, size, insns in blocks:
+            key = pc - pc % region_size if region_size else pc
+            entry = hot.setdefault(key, [0, 0, 0, 0])
+            entry[1] += 1
+            entry[2] = max(entry[2], size)
+            entry[3] = max(entry[3], insns)
+
+    ranges_by_pid = {pid: host_ranges(blocks)
+                     for pid, blocks in blocks_by_pid.items()}
+    jit_samples = 0
+    for pid, ip in samples:
+        if pid not in ranges_by_pid:
+            continue
+        starts, owners = ranges_by_pid[pid]
+        index = bisect.bisect_right(starts, ip) - 1
+        if index < 0 or owners[index] is None:
+            continue
+        pc = blocks_by_pid[pid][owners[index]][2]
+        hot[pc - pc % region_size if region_size else pc][0] += 1
+        jit_samples += 1
+
+    return hot, jit_samples
+
+
+def main():
+    # Parse the command line arguments
+    parser = argparse.ArgumentParser(
+        usage='tb_hotspots.py [-h] [-n <number of blocks>] '
+              '[-g <guest ELF>] [-r <region size>] -- '
+              '<qemu executable> [<qemu executable options>] '
+              '<target executable> [<target executable options>]')
+
+    parser.add_argument('-n', dest='top', type=int, default=25,
+                        help='Specify the number of hot spots to print.')
+    parser.add_argument('-g', dest='guest_elf', type=str,
+                        help='Guest ELF file to look up guest symbols in.')
+    parser.add_argument('-r', dest='region_size', type=lambda x: int(x, 0),
+                        default=0,
+                        help='Merge guest code into aligned regions of '
+                             'this many bytes.')
+    parser.add_argument('command', type=str, nargs='+',
+                        help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    # Insure that perf is installed
+    check_perf_presence = subprocess.run(["which", "perf"],
+                                         stdout=subprocess.DEVNULL)
+    if check_perf_presence.returncode:
+        sys.exit("Please install perf before running the script!")
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        samples = record(enable_perfmap(args.command),
+                         os.path.join(tmpdirname, "perf.data"))
+
+    # QEMU processes are the ones that left a perf map behind
+    blocks_by_pid = {}
+    for pid in set(pid for pid, _ in samples):
+        try:
+            blocks_by_pid[pid] = read_perfmap(pid)
+        except FileNotFoundError:
+            continue
+        os.unlink("/tmp/perf-{}.map".format(pid))
+    if not blocks_by_pid:
+        sys.exit("No perf map was written, is {} built with TCG?"
+                 .format(args.command[0]))
+
+    symbols = read_guest_symbols(args.guest_elf) if args.guest_elf else []
+
+    hot, jit_samples = attribute(samples, blocks_by_pid, args.region_size)
+    total = len(samples)
+    print("Samples in translated code: {} of {} ({:.3f}%)\n".format(
+        jit_samples, total, jit_samples * 100 / total if total else 0))
+
+    # Print table header
+    print('{:>4}  {:>10}  {:>18}  {:>6}  {:>6}  {:>6}  {}\n'
+          '{}  {}  {}  {}  {}  {}  {}'.format('No.', 'Percentage',
+                                              'Guest address',
+                                              'Trans.', 'Size', 'Insns',
+                                              'Guest symbol',
+                                              '-' * 4, '-' * 10, '-' * 18,
+                                              '-' * 6, '-' * 6, '-' * 6,
+                                              '-' * 25))
+
+    # Print top N hot spots
+    top_spots = sorted(hot.items(), key=lambda h: -h[1][0])[:args.top]
+    for (index, (pc, (count, translations, size, insns))) in \
+            enumerate(top_spots, start=1):
+        if not count:
+            break
+        print('{:>4}  {:>9.3f}%  {:>#18x}  {:>6}  {:>6}  {:>6}  {}'.format(
+            index, count * 100 / total, pc, translations, size, insns,
+            guest_symbol(symbols, pc)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+
+#  Profile a QEMU TCG run with perf and/or callgrind, split the cost into
+#  code generation, JIT execution, helpers, softmmu and everything else,
+#  and save or compare the results as JSON.
+#
+#  Code generation is the inclusive cost of tb_gen_code(), the translator
+#  entry point. The rest of QEMU (main loop, device emulation, startup),
+#  libraries and the kernel are reported as "other".
+#
+#  Syntax:
+#  tcg_profile.py [-h] [-t {perf,callgrind,all}] [-n <number of functions>]
+#                 [-o <output JSON file>] [-c <JSON file to compare with>]
+#                 [-a <other qemu executable>] -- \
+#                 <qemu executable> [<qemu executable options>] \
+#                 <target executable> [<target executable options>]
+#
+#  [-h] - Print the script arguments help message.
+#  [-t] - Profiler(s) to run, defaults to callgrind.
+#  [-n] - Number of top functions to record, defaults to 25.
+#  [-o] - Save the profile to a JSON file.
+#  [-c] - Compare the profile with one previously saved with -o.
+#  [-a] - Also profile the same command with another QEMU executable
+#         and compare the two profiles.
+#
+#  Example of usage:
+#  tcg_profile.py -t all -o new.json -a ./qemu-arm.old -- \
+#      ./qemu-arm coulomb_double-arm
+#
+#  This file is a part of the project "TCG Continuous Benchmarking".
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+
+BUCKETS = ("code generation", "JIT execution", "helpers", "softmmu",
+           "other")
+
+# The translator entry point, whose inclusive cost is code generation
+TRANSLATOR = "tb_gen_code"
+
+# Functions implementing guest memory accesses and TLB handling
+SOFTMMU_RE = re.compile(r"(^|_)(tlb|mmu)(_|$)|load_helper|store_helper|"
+                        r"^helper_(le|be|ret)_(ld|st)|^cpu_(ld|st)|"
+                        r"^probe_access|^io_(read|write)x")
+
+
+def is_softmmu(name):
+    return bool(SOFTMMU_RE.search(name))
+
+
+def check_tool(tool):
+    """
+    Exit with an error message if the given profiler is not installed.
+    """
+    binary = "valgrind" if tool == "callgrind" else tool
+    check = subprocess.run(["which", binary], stdout=subprocess.DEVNULL)
+    if check.returncode:
+        sys.exit("Please install {} before running the script.".format(binary))
+
+
+def parse_callgrind(data_path):
+    """
+    Parse a callgrind output file.
+
+    Parameters:
+    data_path (str): Path of the callgrind.out file
+
+    Returns:
+    (tuple): Mapping "file:function" to [self cost, file, function],
+             mapping of JIT code address to a mapping of (file, function)
+             callees to the inclusive cost of calls made from there,
+             mapping of function name to its inclusive cost, and the
+             total cost (first event only)
+    """
+    functions = {}
+    jit_calls = {}
+    # Cost of the calls each function makes, apart from recursive ones
+    call_costs = {}
+    total = 0
+    positions = 1
+    names = {"fl": {}, "fn": {}, "cfl": {}, "cfn": {}}
+    # cfl shares its name space with fl, cfn with fn
+    names["cfl"] = names["fl"]
+    names["cfn"] = names["fn"]
+    current = {"fl": "???", "fn": "???", "cfl": None, "cfn": None}
+    in_call = False
+    func = None
+
+    def decode(kind, value):
+        m = re.match(r"\((\d+)\)(?: (.*))?$", value)
+        if not m:
+            return value
+        if m.group(2) is not None:
+            names[kind][m.group(1)] = m.group(2)
+            return m.group(2)
+        return names[kind].get(m.group(1), "???")
+
+    with open(data_path, "r") as data:
+        for line in data:
+            line = line.rstrip("\n")
+            if not line or line[0] == "#":
+                continue
+            if line[0].isdigit() or line[0] in "+-*":
+                fields = line.split()
+                cost = int(fields[positions]) if len(fields) > positions else 0
+                if in_call:
+                    # Inclusive cost of the call on the previous line
+                    callee = (current["cfl"] or current["fl"],
+                              current["cfn"] or current["fn"])
+                    if is_jit(current["fl"], current["fn"]):
+                        calls = jit_calls.setdefault(current["fn"], {})
+                        calls[callee] = calls.get(callee, 0) + cost
+                    if callee[1] != current["fn"]:
+                        call_costs[current["fn"]] = \
+                            call_costs.get(current["fn"], 0) + cost
+                    in_call = False
+                    current["cfl"] = current["cfn"] = None
+                elif func is not None:
+                    func[0] += cost
+                continue
+
+            key, _, value = line.partition("=")
+            if key == "fl":
+                current["fl"] = decode("fl", value)
+            elif key in ("fi", "fe"):
+                # Inlined code, still accounted to the current function
+                decode("fl", value)
+            elif key == "fn":
+                current["fn"] = decode("fn", value)
+                name = "{}:{}".format(current["fl"], current["fn"])
+                func = functions.setdefault(name, [0, current["fl"],
+                                                   current["fn"]])
+            elif key in ("cfl", "cfi"):
+                current["cfl"] = decode("cfl", value)
+            elif key == "cfn":
+                current["cfn"] = decode("cfn", value)
+            elif key == "calls":
+                in_call = True
+            elif line.startswith("positions:"):
+                positions = len(line.split()) - 1
+            elif line.startswith(("summary:", "totals:")):
+                total = int(line.split()[1])
+
+    if not total:
+        total = sum(f[0] for f in functions.values())
+    inclusive = dict(call_costs)
+    for f in functions.values():
+        inclusive[f[2]] = inclusive.get(f[2], 0) + f[0]
+    return functions, jit_calls, inclusive, total
+
+
+def is_jit(file_name, function_name):
+    """
+    Code without symbols, that is code generated by TCG at run time.
+    """
+    return file_name == "???" and (function_name == "???" or
+                                   function_name.startswith("0x"))
+
+
+def callgrind_profile(command, top, tmpdirname):
+    """
+    Run callgrind once and bucket the executed instructions.
+    """
+    data_path = os.path.join(tmpdirname, "callgrind.data")
+    callgrind = subprocess.run((["valgrind",
+                                 "--tool=callgrind",
+                                 "--callgrind-out-file=" + data_path]
+                                + command),
+                               stdout=subprocess.DEVNULL,
+                               stderr=subprocess.PIPE)
+    if callgrind.returncode:
+        sys.exit(callgrind.stderr.decode("utf-8"))
+
+    functions, jit_calls, inclusive, total = parse_callgrind(data_path)
+
+    # Each piece of JIT code callgrind sees is a translation block
+    blocks = []
+    for f in functions.values():
+        if not is_jit(f[1], f[2]):
+            continue
+        block = {"address": f[2], "JIT execution": f[0],
+                 "helpers": 0, "softmmu": 0}
+        for (file_name, function_name), cost in \
+                jit_calls.get(f[2], {}).items():
+            # Calls between blocks are accounted to the callee block
+            if is_jit(file_name, function_name):
+                continue
+            if is_softmmu(function_name):
+                block["softmmu"] += cost
+            else:
+                block["helpers"] += cost
+        blocks.append(block)
+
+    buckets = dict.fromkeys(BUCKETS, 0)
+    for block in blocks:
+        for bucket in ("JIT execution", "helpers", "softmmu"):
+            buckets[bucket] += block[bucket]
+    buckets["code generation"] = inclusive.get(TRANSLATOR, 0)
+    buckets["other"] = max(total - sum(buckets.values()), 0)
+
+    blocks.sort(key=lambda b: -(b["JIT execution"] + b["helpers"] +
+                                b["softmmu"]))
+    top_functions = sorted(functions.values(), key=lambda f: -f[0])[:top]
+    return {
+        "unit": "instructions",
+        "total": total,
+        "buckets": buckets,
+        "functions": [{"name": f[2], "file": f[1], "cost": f[0]}
+                      for f in top_functions],
+        "translation_blocks": blocks[:top],
+    }
+
+
+def parse_perf_script(output):
+    """
+    Parse the output of perf script with call chains.
+
+    Parameters:
+    output (str): Output of perf script -F ip,sym,dso
+
+    Returns:
+    (list): The call chain of each sample, as a list of (dso, symbol)
+            frames starting with the one that was executing
+    """
+    samples = []
+    frames = []
+    for line in output.splitlines():
+        if not line.strip():
+            if frames:
+                samples.append(frames)
+                frames = []
+            continue
+        m = re.match(r"\s*[0-9a-f]+\s+(.*?)\s+\((.*)\)$", line)
+        if m:
+            frames.append((m.group(2), m.group(1)))
+    if frames:
+        samples.append(frames)
+    return samples
+
+
+def perf_profile(command, top, tmpdirname):
+    """
+    Run perf record once with call graphs and bucket the samples. A
+    sample is code generation if tb_gen_code() is on its call chain, and
+    is otherwise bucketed by the function that was executing, so helpers
+    only include the helper functions themselves.
+    """
+    data_path = os.path.join(tmpdirname, "perf.data")
+    perf_record = subprocess.run((["perf", "record", "--call-graph=dwarf",
+                                   "--output=" + data_path] + command),
+                                 stdout=subprocess.DEVNULL,
+                                 stderr=subprocess.PIPE)
+    if perf_record.returncode:
+        sys.exit(perf_record.stderr.decode("utf-8"))
+
+    perf_script = subprocess.run(["perf", "script", "--input=" + data_path,
+                                  "-F", "ip,sym,dso"],
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE)
+    if perf_script.returncode:
+        sys.exit(perf_script.stderr.decode("utf-8"))
+
+    samples = parse_perf_script(perf_script.stdout.decode("utf-8"))
+    buckets = dict.fromkeys(BUCKETS, 0)
+    self_samples = {}
+    for frames in samples:
+        dso, sym = frames[0]
+        self_samples[(dso, sym)] = self_samples.get((dso, sym), 0) + 1
+        if any(frame_sym == TRANSLATOR for _, frame_sym in frames):
+            buckets["code generation"] += 1
+        elif dso.startswith(("[unknown]", "[JIT]")) or \
+                os.path.basename(dso).startswith("perf-") or \
+                sym.startswith("0x"):
+            buckets["JIT execution"] += 1
+        elif is_softmmu(sym):
+            buckets["softmmu"] += 1
+        elif sym.startswith("helper_"):
+            buckets["helpers"] += 1
+        else:
+            buckets["other"] += 1
+
+    functions = sorted(self_samples.items(), key=lambda f: -f[1])
+    return {
+        "unit": "samples",
+        "total": len(samples),
+        "buckets": buckets,
+        "functions": [{"name": sym, "file": dso, "cost": cost}
+                      for (dso, sym), cost in functions[:top]],
+    }
+
+
+PROFILERS = {
+    "callgrind": callgrind_profile,
+    "perf": perf_profile,
+}
+
+
+def profile(command, tools, top):
+    """
+    Run command once under each of the given tools.
+    """
+    result = {"command": command, "tools": {}}
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        for tool in tools:
+            result["tools"][tool] = PROFILERS[tool](command, top, tmpdirname)
+    return result
+
+
+def print_profile(result):
+    for tool, data in result["tools"].items():
+        total = data["total"]
+        print("{} ({})\n".format(tool, data["unit"]))
+        print('{:<20}{:>20}\n'.format("Total:", format(total, ",")))
+        for bucket in BUCKETS:
+            cost = data["buckets"][bucket]
+            print('{:<20}{:>20}\t{:>6.3f}%'.format(
+                bucket.capitalize() + ":", format(cost, ","),
+                cost / total * 100 if total else 0))
+        print()
+
+
+def print_diff(old, new):
+    """
+    Print the change of totals and buckets of each tool present in both
+    profiles, and of the top functions of the new profile.
+    """
+    def change(a, b):
+        return (b - a) / a * 100 if a else float("inf")
+
+    for tool, data in new["tools"].items():
+        if tool not in old["tools"]:
+            continue
+        base = old["tools"][tool]
+        print("{} ({}): {} -> {}\n".format(tool, data["unit"],
+                                          " ".join(old["command"][:1]),
+                                          " ".join(new["command"][:1])))
+        print('{:<20}{:>20}{:>20}{:>10}'.format("", "Old", "New", "Change"))
+        rows = [("Total", base["total"], data["total"])]
+        # Profiles saved before "other" was split out don't have it
+        rows += [(bucket.capitalize(), base["buckets"].get(bucket, 0),
+                  data["buckets"][bucket]) for bucket in BUCKETS]
+        for name, a, b in rows:
+            print('{:<20}{:>20}{:>20}{:>+9.2f}%'.format(
+                name + ":", format(a, ","), format(b, ","), change(a, b)))
+
+        old_functions = {f["name"]: f["cost"] for f in base["functions"]}
+        print('\n{:<40}{:>20}{:>20}'.format("Function", "Old", "New"))
+        for f in data["functions"]:
+            a = old_functions.get(f["name"])
+            print('{:<40}{:>20}{:>20}'.format(
+                f["name"][:39], "-" if a is None else format(a, ","),
+                format(f["cost"], ",")))
+        print()
+
+
+def main():
+    # Parse the command line arguments
+    parser = argparse.ArgumentParser(
+        usage='tcg_profile.py [-h] [-t {perf,callgrind,all}] [-n N] '
+        '[-o OUTPUT] [-c COMPARE] [-a OTHER_QEMU] -- '
+        '<qemu executable> [<qemu executable options>] '
+        '<target executable> [<target executable options>]')
+
+    parser.add_argument('-t', dest='tool', default='callgrind',
+                        choices=['perf', 'callgrind', 'all'],
+                        help='Profiler to run.')
+    parser.add_argument('-n', dest='top', type=int, default=25,
+                        help='Number of top functions to record.')
+    parser.add_argument('-o', dest='output',
+                        help='Save the profile as JSON to this file.')
+    parser.add_argument('-c', dest='compare',
+                        help='Compare with a profile saved with -o.')
+    parser.add_argument('-a', dest='against',
+                        help='Compare with the same command run with '
+                        'another QEMU executable.')
+    parser.add_argument('command', type=str, nargs='+', help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    tools = ["callgrind", "perf"] if args.tool == "all" else [args.tool]
+    for tool in tools:
+        check_tool(tool)
+
+    result = profile(args.command, tools, args.top)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(result, output, indent=4)
+
+    if args.compare:
+        with open(args.compare, "r") as data:
+            print_diff(json.load(data), result)
+    elif args.against:
+        other = profile([args.against] + args.command[1:], tools, args.top)
+        print_diff(other, result)
+    else:
+        print_profile(result)
+
+
+if __name__ == "__main__":
+    main()
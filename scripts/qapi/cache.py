@@ -0,0 +1,266 @@
+#
+# QAPI incremental code generation
+#
+# This work is licensed under the terms of the GNU GPL, version 2 or later.
+# See the COPYING file in the top-level directory.
+
+"""
+QAPI incremental code generation
+
+The code generated for a module depends on the schema source of the
+module, and on the modules its definitions include or refer to.  The
+cache remembers a fingerprint of these inputs for every module, so that
+the backends can skip modules whose inputs didn't change since the last
+run.
+"""
+
+import hashlib
+import json
+import os
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+)
+
+from .schema import (
+    QAPISchema,
+    QAPISchemaFeature,
+    QAPISchemaModule,
+    QAPISchemaObjectType,
+    QAPISchemaObjectTypeMember,
+    QAPISchemaType,
+    QAPISchemaVariants,
+    QAPISchemaVisitor,
+)
+from .source import QAPISourceInfo
+
+
+def _hash_file(fname: str) -> str:
+    try:
+        with open(fname, 'rb') as fp:
+            return hashlib.sha256(fp.read()).hexdigest()
+    except OSError:
+        return ''
+
+
+def _generator_hash() -> str:
+    """Return a hash of the code generator's own source."""
+    sha = hashlib.sha256()
+    srcdir = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(srcdir)):
+        if name.endswith('.py'):
+            sha.update(name.encode('utf-8'))
+            sha.update(_hash_file(os.path.join(srcdir, name)).encode())
+    return sha.hexdigest()
+
+
+class QAPISchemaDependencyVisitor(QAPISchemaVisitor):
+    """
+    Collect the modules each module's generated code depends on.
+
+    A module depends on the modules it includes, and on the modules
+    defining the types its definitions use.  Union variants are a
+    dependency both ways: gen_object() emits a variant's struct along
+    with the first union using it, wherever that is.
+    """
+
+    def __init__(self) -> None:
+        self._schema: Optional[QAPISchema] = None
+        self._module: Optional[str] = None
+        self.deps: Dict[str, Set[str]] = {}
+
+    def _module_of(self, typ: QAPISchemaType) -> str:
+        assert self._schema is not None
+        if typ.info is None:
+            return QAPISchemaModule.BUILTIN_MODULE_NAME
+        name: str = self._schema.module_by_fname(typ.info.fname).name
+        return name
+
+    def _use_type(self, typ: Optional[QAPISchemaType]) -> None:
+        assert self._module is not None
+        if typ is not None:
+            self.deps[self._module].add(self._module_of(typ))
+
+    def _use_variants(self, variants: Optional[QAPISchemaVariants]) -> None:
+        assert self._module is not None
+        if variants is None:
+            return
+        self._use_type(variants.tag_member.type)
+        for var in variants.variants:
+            self._use_type(var.type)
+            if isinstance(var.type, QAPISchemaObjectType):
+                self.deps.setdefault(self._module_of(var.type),
+                                     set()).add(self._module)
+
+    def visit_begin(self, schema: QAPISchema) -> None:
+        self._schema = schema
+
+    def visit_module(self, name: str) -> None:
+        self._module = name
+        self.deps.setdefault(name, set())
+
+    def visit_include(self, name: str, info: Optional[QAPISourceInfo]) -> None:
+        assert self._module is not None
+        self.deps[self._module].add(name)
+
+    def visit_array_type(self, name: str, info: Optional[QAPISourceInfo],
+                         ifcond: Sequence[str],
+                         element_type: QAPISchemaType) -> None:
+        self._use_type(element_type)
+
+    def visit_object_type(self, name: str, info: Optional[QAPISourceInfo],
+                          ifcond: Sequence[str],
+                          features: List[QAPISchemaFeature],
+                          base: Optional[QAPISchemaObjectType],
+                          members: List[QAPISchemaObjectTypeMember],
+                          variants: Optional[QAPISchemaVariants]) -> None:
+        self._use_type(base)
+        for memb in members:
+            self._use_type(memb.type)
+        self._use_variants(variants)
+
+    def visit_alternate_type(self, name: str, info: Optional[QAPISourceInfo],
+                             ifcond: Sequence[str],
+                             features: List[QAPISchemaFeature],
+                             variants: QAPISchemaVariants) -> None:
+        self._use_variants(variants)
+
+    def visit_command(self, name: str, info: Optional[QAPISourceInfo],
+                      ifcond: Sequence[str],
+                      features: List[QAPISchemaFeature],
+                      arg_type: Optional[QAPISchemaObjectType],
+                      ret_type: Optional[QAPISchemaType], gen: bool,
+                      success_response: bool, boxed: bool, allow_oob: bool,
+                      allow_preconfig: bool, coroutine: bool) -> None:
+        self._use_type(arg_type)
+        self._use_type(ret_type)
+
+    def visit_event(self, name: str, info: Optional[QAPISourceInfo],
+                    ifcond: Sequence[str],
+                    features: List[QAPISchemaFeature],
+                    arg_type: Optional[QAPISchemaObjectType],
+                    boxed: bool) -> None:
+        self._use_type(arg_type)
+
+
+class QAPIGenCache:
+    """
+    Fingerprints of the modules code was last generated for.
+
+    The cache is stored in the output directory.  It is used only when
+    the code generator, its options and every file it wrote last time
+    are unchanged.
+
+    :param output_dir: The output directory of the generated code.
+    :param schema_file: The primary QAPI schema file.
+    :param prefix: C-code prefix for symbol names.
+    :param unmask: Expose non-ABI names through introspection?
+    :param builtins: Generate code for built-in types?
+    """
+
+    def __init__(self, output_dir: str, schema_file: str, prefix: str,
+                 unmask: bool, builtins: bool):
+        self._output_dir = output_dir
+        self._fname = os.path.join(output_dir,
+                                   '.%sqapi-gen-cache.json' % prefix)
+        self._key = hashlib.sha256(json.dumps(
+            [_generator_hash(), schema_file, prefix, unmask, builtins])
+            .encode('utf-8')).hexdigest()
+        self._old_modules: Dict[str, str] = {}
+        self._old_sources: Dict[str, str] = {}
+        self._modules: Dict[str, str] = {}
+        self._sources: Dict[str, str] = {}
+        self._outputs: List[str] = []
+
+        try:
+            with open(self._fname, 'r', encoding='utf-8') as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return
+        if data.get('key') != self._key:
+            return
+        for output in data.get('outputs', []):
+            if not os.path.exists(os.path.join(output_dir, output)):
+                return
+        self._old_modules = data.get('modules', {})
+        self._old_sources = data.get('sources', {})
+
+    def up_to_date(self) -> bool:
+        """
+        Return True if no schema file changed since the last run, so
+        there is nothing to generate.
+        """
+        if not self._old_sources:
+            return False
+        return all(_hash_file(fname) == sha
+                   for fname, sha in self._old_sources.items())
+
+    def update(self, schema: QAPISchema) -> None:
+        """
+        Compute the fingerprints of the modules of schema.
+
+        The stored cache is removed until save(), so that it can't
+        outlive generated code it no longer matches.
+        """
+        vis = QAPISchemaDependencyVisitor()
+        schema.visit(vis)
+
+        schema_dir = os.path.dirname(schema.fname)
+        sources: Dict[str, str] = {}
+        for name in vis.deps:
+            if QAPISchemaModule.is_user_module(name):
+                fname = os.path.join(schema_dir, name)
+                sources[name] = _hash_file(fname)
+                self._sources[fname] = sources[name]
+            else:
+                sources[name] = ''
+
+        for name in vis.deps:
+            closure = {name}
+            todo = [name]
+            while todo:
+                for dep in vis.deps.get(todo.pop(), ()):
+                    if dep not in closure:
+                        closure.add(dep)
+                        todo.append(dep)
+            self._modules[name] = hashlib.sha256(json.dumps(
+                sorted([dep, sources.get(dep, '')] for dep in closure))
+                .encode('utf-8')).hexdigest()
+
+        if os.path.exists(self._fname):
+            os.unlink(self._fname)
+
+    def unchanged(self, name: str) -> bool:
+        """
+        Return True if the code generated for module name last time is
+        still up to date.
+        """
+        fingerprint = self._modules.get(name)
+        return (fingerprint is not None
+                and self._old_modules.get(name) == fingerprint)
+
+    @property
+    def outputs(self) -> List[str]:
+        """The files recorded with add_output() so far."""
+        return self._outputs
+
+    def add_output(self, fname: str) -> None:
+        """Record a file generated (or kept up to date) by this run."""
+        # QAPIGen.write() leaves files starting with ../ to the main schema
+        if not fname.startswith('../'):
+            self._outputs.append(fname)
+
+    def save(self) -> None:
+        data = {'key': self._key,
+                'modules': self._modules,
+                'sources': self._sources,
+                'outputs': self._outputs}
+        if self._output_dir:
+            os.makedirs(self._output_dir, exist_ok=True)
+        tmp = self._fname + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as fp:
+            json.dump(data, fp, indent=1, sort_keys=True)
+        os.replace(tmp, self._fname)
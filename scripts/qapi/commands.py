@@ -21,6 +21,7 @@
     Set,
 )
 
+from .cache import QAPIGenCache
 from .common import c_name, mcgen
 from .gen import (
     QAPIGenC,
@@ -30,6 +31,8 @@
 )
 from .schema import (
     QAPISchema,
+    QAPISchemaCommand,
+    QAPISchemaEntity,
     QAPISchemaFeature,
     QAPISchemaObjectType,
     QAPISchemaType,
@@ -242,10 +245,11 @@ def gen_register_command(name: str,
 
 
 class QAPISchemaGenCommandVisitor(QAPISchemaModularCVisitor):
-    def __init__(self, prefix: str):
+    def __init__(self, prefix: str,
+                 cache: Optional[QAPIGenCache] = None):
         super().__init__(
             prefix, 'qapi-commands',
-            ' * Schema-defined QAPI/QMP commands', None, __doc__)
+            ' * Schema-defined QAPI/QMP commands', None, __doc__, cache)
         self._visited_ret_types: Dict[QAPIGenC, Set[QAPISchemaType]] = {}
 
     def _begin_user_module(self, name: str) -> None:
@@ -298,6 +302,32 @@ def visit_end(self) -> None:
 }
 '''))
 
+    def _gen_marshal(self,
+                     name: str,
+                     ifcond: Sequence[str],
+                     arg_type: Optional[QAPISchemaObjectType],
+                     ret_type: Optional[QAPISchemaType],
+                     boxed: bool) -> None:
+        # FIXME: If T is a user-defined type, the user is responsible
+        # for making this work, i.e. to make T's condition the
+        # conjunction of the T-returning commands' conditions.  If T
+        # is a built-in type, this isn't possible: the
+        # qmp_marshal_output_T() will be generated unconditionally.
+        if ret_type and ret_type not in self._visited_ret_types[self._genc]:
+            self._visited_ret_types[self._genc].add(ret_type)
+            with ifcontext(ret_type.ifcond,
+                           self._genh, self._genc):
+                self._genc.add(gen_marshal_output(ret_type))
+        with ifcontext(ifcond, self._genh, self._genc):
+            self._genh.add(gen_command_decl(name, arg_type, boxed, ret_type))
+            self._genh.add(gen_marshal_decl(name))
+            self._genc.add(gen_marshal(name, arg_type, boxed, ret_type))
+
+    def visit_needed(self, entity: QAPISchemaEntity) -> bool:
+        # ./init registers the commands of all modules
+        return (isinstance(entity, QAPISchemaCommand)
+                or super().visit_needed(entity))
+
     def visit_command(self,
                       name: str,
                       info: Optional[QAPISourceInfo],
@@ -313,20 +343,8 @@ def visit_command(self,
                       coroutine: bool) -> None:
         if not gen:
             return
-        # FIXME: If T is a user-defined type, the user is responsible
-        # for making this work, i.e. to make T's condition the
-        # conjunction of the T-returning commands' conditions.  If T
-        # is a built-in type, this isn't possible: the
-        # qmp_marshal_output_T() will be generated unconditionally.
-        if ret_type and ret_type not in self._visited_ret_types[self._genc]:
-            self._visited_ret_types[self._genc].add(ret_type)
-            with ifcontext(ret_type.ifcond,
-                           self._genh, self._genc):
-                self._genc.add(gen_marshal_output(ret_type))
-        with ifcontext(ifcond, self._genh, self._genc):
-            self._genh.add(gen_command_decl(name, arg_type, boxed, ret_type))
-            self._genh.add(gen_marshal_decl(name))
-            self._genc.add(gen_marshal(name, arg_type, boxed, ret_type))
+        if not self._module_unchanged():
+            self._gen_marshal(name, ifcond, arg_type, ret_type, boxed)
         with self._temp_module('./init'):
             with ifcontext(ifcond, self._genh, self._genc):
                 self._genc.add(gen_register_command(
@@ -336,7 +354,8 @@ def visit_command(self,
 
 def gen_commands(schema: QAPISchema,
                  output_dir: str,
-                 prefix: str) -> None:
-    vis = QAPISchemaGenCommandVisitor(prefix)
+                 prefix: str,
+                 cache: Optional[QAPIGenCache] = None) -> None:
+    vis = QAPISchemaGenCommandVisitor(prefix, cache)
     schema.visit(vis)
     vis.write(output_dir)
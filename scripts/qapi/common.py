@@ -124,6 +124,7 @@ class Indentation:
     """
     def __init__(self, initial: int = 0) -> None:
         self._level = initial
+        self._spaces = ' ' * initial
 
     def __int__(self) -> int:
         return self._level
@@ -133,7 +134,7 @@ def __repr__(self) -> str:
 
     def __str__(self) -> str:
         """Return the current indentation as a string of spaces."""
-        return ' ' * self._level
+        return self._spaces
 
     def __bool__(self) -> bool:
         """True when there is a non-zero indentation."""
@@ -142,6 +143,7 @@ def __bool__(self) -> bool:
     def increase(self, amount: int = 4) -> None:
         """Increase the indentation level by ``amount``, default 4."""
         self._level += amount
+        self._spaces = ' ' * self._level
 
     def decrease(self, amount: int = 4) -> None:
         """Decrease the indentation level by ``amount``, default 4."""
@@ -149,11 +151,15 @@ def decrease(self, amount: int = 4) -> None:
             raise ArithmeticError(
                 f"Can't remove {amount:d} spaces from {self!r}")
         self._level -= amount
+        self._spaces = ' ' * self._level
 
 
 #: Global, current indent level for code generation.
 indent = Indentation()
 
+_INDENT_RE = re.compile(r'^(?!(#|$))', re.MULTILINE)
+_EATSPACE_RE = re.compile(re.escape(EATSPACE) + r' *')
+
 
 def cgen(code: str, **kwds: object) -> str:
     """
@@ -163,8 +169,10 @@ def cgen(code: str, **kwds: object) -> str:
     """
     raw = code % kwds
     if indent:
-        raw = re.sub(r'^(?!(#|$))', str(indent), raw, flags=re.MULTILINE)
-    return re.sub(re.escape(EATSPACE) + r' *', '', raw)
+        raw = _INDENT_RE.sub(str(indent), raw)
+    if EATSPACE in raw:
+        raw = _EATSPACE_RE.sub('', raw)
+    return raw
 
 
 def mcgen(code: str, **kwds: object) -> str:
@@ -14,11 +14,14 @@
 
 from typing import List, Optional, Sequence
 
+from .cache import QAPIGenCache
 from .common import c_enum_const, c_name, mcgen
 from .gen import QAPISchemaModularCVisitor, build_params, ifcontext
 from .schema import (
     QAPISchema,
+    QAPISchemaEntity,
     QAPISchemaEnumMember,
+    QAPISchemaEvent,
     QAPISchemaFeature,
     QAPISchemaObjectType,
 )
@@ -172,10 +175,11 @@ def gen_event_send(name: str,
 
 class QAPISchemaGenEventVisitor(QAPISchemaModularCVisitor):
 
-    def __init__(self, prefix: str):
+    def __init__(self, prefix: str,
+                 cache: Optional[QAPIGenCache] = None):
         super().__init__(
             prefix, 'qapi-events',
-            ' * Schema-defined QAPI/QMP events', None, __doc__)
+            ' * Schema-defined QAPI/QMP events', None, __doc__, cache)
         self._event_enum_name = c_name(prefix + 'QAPIEvent', protect=False)
         self._event_enum_members: List[QAPISchemaEnumMember] = []
         self._event_emit_name = c_name(prefix + 'qapi_event_emit')
@@ -224,6 +228,11 @@ def visit_end(self) -> None:
                              event_emit=self._event_emit_name,
                              event_enum=self._event_enum_name))
 
+    def visit_needed(self, entity: QAPISchemaEntity) -> bool:
+        # ./emit enumerates the events of all modules
+        return (isinstance(entity, QAPISchemaEvent)
+                or super().visit_needed(entity))
+
     def visit_event(self,
                     name: str,
                     info: Optional[QAPISourceInfo],
@@ -231,11 +240,12 @@ def visit_event(self,
                     features: List[QAPISchemaFeature],
                     arg_type: Optional[QAPISchemaObjectType],
                     boxed: bool) -> None:
-        with ifcontext(ifcond, self._genh, self._genc):
-            self._genh.add(gen_event_send_decl(name, arg_type, boxed))
-            self._genc.add(gen_event_send(name, arg_type, features, boxed,
-                                          self._event_enum_name,
-                                          self._event_emit_name))
+        if not self._module_unchanged():
+            with ifcontext(ifcond, self._genh, self._genc):
+                self._genh.add(gen_event_send_decl(name, arg_type, boxed))
+                self._genc.add(gen_event_send(name, arg_type, features,
+                                              boxed, self._event_enum_name,
+                                              self._event_emit_name))
         # Note: we generate the enum member regardless of @ifcond, to
         # keep the enumeration usable in target-independent code.
         self._event_enum_members.append(QAPISchemaEnumMember(name, None))
@@ -243,7 +253,8 @@ def visit_event(self,
 
 def gen_events(schema: QAPISchema,
                output_dir: str,
-               prefix: str) -> None:
-    vis = QAPISchemaGenEventVisitor(prefix)
+               prefix: str,
+               cache: Optional[QAPIGenCache] = None) -> None:
+    vis = QAPISchemaGenEventVisitor(prefix, cache)
     schema.visit(vis)
     vis.write(output_dir)
@@ -17,11 +17,13 @@
 from typing import (
     Dict,
     Iterator,
+    List,
     Optional,
     Sequence,
     Tuple,
 )
 
+from .cache import QAPIGenCache
 from .common import (
     c_fname,
     c_name,
@@ -32,6 +34,7 @@
     mcgen,
 )
 from .schema import (
+    QAPISchemaEntity,
     QAPISchemaModule,
     QAPISchemaObjectType,
     QAPISchemaVisitor,
@@ -42,17 +45,19 @@
 class QAPIGen:
     def __init__(self, fname: str):
         self.fname = fname
-        self._preamble = ''
-        self._body = ''
+        # Lists of text chunks, joined only by get_content()
+        self._preamble: List[str] = []
+        self._body: List[str] = []
 
     def preamble_add(self, text: str) -> None:
-        self._preamble += text
+        self._preamble.append(text)
 
     def add(self, text: str) -> None:
-        self._body += text
+        self._body.append(text)
 
     def get_content(self) -> str:
-        return self._top() + self._preamble + self._body + self._bottom()
+        return ''.join([self._top()] + self._preamble + self._body
+                       + [self._bottom()])
 
     def _top(self) -> str:
         # pylint: disable=no-self-use
@@ -85,20 +90,20 @@ def write(self, output_dir: str) -> None:
                 fp.write(text)
 
 
-def _wrap_ifcond(ifcond: Sequence[str], before: str, after: str) -> str:
-    if before == after:
-        return after   # suppress empty #if ... #endif
+def _wrap_ifcond(ifcond: Sequence[str], chunks: List[str],
+                 start: int) -> None:
+    """Wrap the text added to chunks since index start in ifcond."""
+    added = ''.join(chunks[start:])
+    del chunks[start:]
+    if not added:
+        return   # suppress empty #if ... #endif
 
-    assert after.startswith(before)
-    out = before
-    added = after[len(before):]
     if added[0] == '\n':
-        out += '\n'
+        chunks.append('\n')
         added = added[1:]
-    out += gen_if(ifcond)
-    out += added
-    out += gen_endif(ifcond)
-    return out
+    chunks.append(gen_if(ifcond))
+    chunks.append(added)
+    chunks.append(gen_endif(ifcond))
 
 
 def build_params(arg_type: Optional[QAPISchemaObjectType],
@@ -127,18 +132,16 @@ def build_params(arg_type: Optional[QAPISchemaObjectType],
 class QAPIGenCCode(QAPIGen):
     def __init__(self, fname: str):
         super().__init__(fname)
-        self._start_if: Optional[Tuple[Sequence[str], str, str]] = None
+        self._start_if: Optional[Tuple[Sequence[str], int, int]] = None
 
     def start_if(self, ifcond: Sequence[str]) -> None:
         assert self._start_if is None
-        self._start_if = (ifcond, self._body, self._preamble)
+        self._start_if = (ifcond, len(self._body), len(self._preamble))
 
     def end_if(self) -> None:
         assert self._start_if is not None
-        self._body = _wrap_ifcond(self._start_if[0],
-                                  self._start_if[1], self._body)
-        self._preamble = _wrap_ifcond(self._start_if[0],
-                                      self._start_if[2], self._preamble)
+        _wrap_ifcond(self._start_if[0], self._body, self._start_if[1])
+        _wrap_ifcond(self._start_if[0], self._preamble, self._start_if[2])
         self._start_if = None
 
     def get_content(self) -> str:
@@ -219,17 +222,22 @@ def __init__(self,
                  prefix: str,
                  what: str,
                  blurb: str,
-                 pydoc: str):
+                 pydoc: str,
+                 cache: Optional[QAPIGenCache] = None):
         self._prefix = prefix
         self._what = what
         self._genc = QAPIGenC(self._prefix + self._what + '.c',
                               blurb, pydoc)
         self._genh = QAPIGenH(self._prefix + self._what + '.h',
                               blurb, pydoc)
+        self._cache = cache
 
     def write(self, output_dir: str) -> None:
         self._genc.write(output_dir)
         self._genh.write(output_dir)
+        if self._cache:
+            self._cache.add_output(self._genc.fname)
+            self._cache.add_output(self._genh.fname)
 
 
 class QAPISchemaModularCVisitor(QAPISchemaVisitor):
@@ -238,12 +246,14 @@ def __init__(self,
                  what: str,
                  user_blurb: str,
                  builtin_blurb: Optional[str],
-                 pydoc: str):
+                 pydoc: str,
+                 cache: Optional[QAPIGenCache] = None):
         self._prefix = prefix
         self._what = what
         self._user_blurb = user_blurb
         self._builtin_blurb = builtin_blurb
         self._pydoc = pydoc
+        self._cache = cache
         self._current_module: Optional[str] = None
         self._module: Dict[str, Tuple[QAPIGenC, QAPIGenH]] = {}
         self._main_module: Optional[str] = None
@@ -297,13 +307,30 @@ def _temp_module(self, name: str) -> Iterator[None]:
         yield
         self._current_module = old_module
 
+    def _module_unchanged(self, name: Optional[str] = None) -> bool:
+        """
+        Return True if the cache has the code of module name (default:
+        the current module) from an earlier run, so it needn't be
+        generated again.
+        """
+        name = name or self._current_module
+        return (self._cache is not None and name is not None
+                and self._cache.unchanged(name))
+
     def write(self, output_dir: str, opt_builtins: bool = False) -> None:
         for name in self._module:
             if QAPISchemaModule.is_builtin_module(name) and not opt_builtins:
                 continue
             (genc, genh) = self._module[name]
-            genc.write(output_dir)
-            genh.write(output_dir)
+            if not self._module_unchanged(name):
+                genc.write(output_dir)
+                genh.write(output_dir)
+            if self._cache:
+                self._cache.add_output(genc.fname)
+                self._cache.add_output(genh.fname)
+
+    def visit_needed(self, entity: QAPISchemaEntity) -> bool:
+        return not self._module_unchanged()
 
     def _begin_builtin_module(self) -> None:
         pass
@@ -24,6 +24,7 @@
     Union,
 )
 
+from .cache import QAPIGenCache
 from .common import (
     c_name,
     gen_endif,
@@ -98,76 +99,96 @@ def __init__(self, value: _ValueT, ifcond: Iterable[str],
         self.ifcond: Tuple[str, ...] = tuple(ifcond)
 
 
-def _tree_to_qlit(obj: JSONValue,
-                  level: int = 0,
-                  dict_value: bool = False) -> str:
+class _QLitTable:
     """
-    Convert the type tree into a QLIT C string, recursively.
+    Convert type trees into QLIT C static data.
 
-    :param obj: The value to convert.
-                This value may not be Annotated when dict_value is True.
-    :param level: The indentation level for this particular value.
-    :param dict_value: True when the value being processed belongs to a
-                       dict key; which suppresses the output indent.
-    """
+    Every list and dict is emitted as a static array of its own, and
+    referred to by name.  Identical lists and dicts are emitted just
+    once: the introspection data repeats many of them (feature lists,
+    members of commonly used types, enum values), and sharing the
+    arrays makes the data smaller.  It also lets
+    qobject_from_qlit_shared() convert every distinct array just once.
 
-    def indent(level: int) -> str:
-        return level * 4 * ' '
+    An array is defined under the conditionals of the value it belongs
+    to, so that it isn't left unused when they are false.
 
-    if isinstance(obj, Annotated):
-        # NB: _tree_to_qlit is called recursively on the values of a
-        # key:value pair; those values can't be decorated with
-        # comments or conditionals.
-        msg = "dict values cannot have attached comments or if-conditionals."
-        assert not dict_value, msg
+    :param name: The C name prefix of the arrays.
+    """
 
-        ret = ''
-        if obj.comment:
-            ret += indent(level) + f"/* {obj.comment} */\n"
-        if obj.ifcond:
+    def __init__(self, name: str):
+        self._name = name
+        self._arrays: Dict[Tuple[str, str, Tuple[str, ...]], str] = {}
+        self._defns: List[str] = []
+        self._ifcond: Tuple[str, ...] = ()
+
+    def get_content(self) -> str:
+        """Return the definitions of the arrays emitted so far."""
+        return ''.join(self._defns)
+
+    def _array(self, ctype: str, body: str) -> str:
+        key = (ctype, body, self._ifcond)
+        name = self._arrays.get(key)
+        if name is None:
+            name = '%s_%d' % (self._name, len(self._arrays))
+            self._arrays[key] = name
+            self._defns.append(gen_if(self._ifcond) + f"""\
+static {ctype} {name}[] = {{
+{body}    {{}}
+}};
+""" + gen_endif(self._ifcond) + '\n')
+        return name
+
+    def _element(self, obj: JSONValue) -> str:
+        if isinstance(obj, Annotated):
+            ret = ''
+            if obj.comment:
+                ret += f"    /* {obj.comment} */\n"
             ret += gen_if(obj.ifcond)
-        ret += _tree_to_qlit(obj.value, level)
-        if obj.ifcond:
-            ret += '\n' + gen_endif(obj.ifcond)
-        return ret
-
-    ret = ''
-    if not dict_value:
-        ret += indent(level)
-
-    # Scalars:
-    if obj is None:
-        ret += 'QLIT_QNULL'
-    elif isinstance(obj, str):
-        ret += f"QLIT_QSTR({to_c_string(obj)})"
-    elif isinstance(obj, bool):
-        ret += f"QLIT_QBOOL({str(obj).lower()})"
-
-    # Non-scalars:
-    elif isinstance(obj, list):
-        ret += 'QLIT_QLIST(((QLitObject[]) {\n'
-        for value in obj:
-            ret += _tree_to_qlit(value, level + 1).strip('\n') + '\n'
-        ret += indent(level + 1) + '{}\n'
-        ret += indent(level) + '}))'
-    elif isinstance(obj, dict):
-        ret += 'QLIT_QDICT(((QLitDictEntry[]) {\n'
-        for key, value in sorted(obj.items()):
-            ret += indent(level + 1) + "{{ {:s}, {:s} }},\n".format(
-                to_c_string(key),
-                _tree_to_qlit(value, level + 1, dict_value=True)
-            )
-        ret += indent(level + 1) + '{}\n'
-        ret += indent(level) + '}))'
-    else:
+            outer = self._ifcond
+            self._ifcond += obj.ifcond
+            ret += '    ' + self.qlit(obj.value) + ',\n'
+            self._ifcond = outer
+            ret += gen_endif(obj.ifcond)
+            return ret
+        return '    ' + self.qlit(obj) + ',\n'
+
+    def qlit(self, obj: JSONValue) -> str:
+        """
+        Convert the type tree into a QLIT C initializer, emitting the
+        arrays its lists and dicts need, recursively.
+
+        :param obj: The value to convert.  Only the elements of lists
+                    may be Annotated.
+        """
+        # Scalars:
+        if obj is None:
+            return 'QLIT_QNULL'
+        if isinstance(obj, str):
+            return f"QLIT_QSTR({to_c_string(obj)})"
+        if isinstance(obj, bool):
+            return f"QLIT_QBOOL({str(obj).lower()})"
+
+        # Non-scalars:
+        if isinstance(obj, list):
+            body = ''.join(self._element(value) for value in obj)
+            return 'QLIT_QLIST(%s)' % self._array('QLitObject', body)
+        if isinstance(obj, dict):
+            body = ''
+            for key, value in sorted(obj.items()):
+                # NB: dict values can't be decorated with comments or
+                # conditionals.
+                msg = ("dict values cannot have attached comments or "
+                       "if-conditionals.")
+                assert not isinstance(value, Annotated), msg
+                body += '    {{ {:s}, {:s} }},\n'.format(to_c_string(key),
+                                                         self.qlit(value))
+            return 'QLIT_QDICT(%s)' % self._array('QLitDictEntry', body)
+
         raise NotImplementedError(
             f"type '{type(obj).__name__}' not implemented"
         )
 
-    if level > 0:
-        ret += ','
-    return ret
-
 
 def to_c_string(string: str) -> str:
     return '"' + string.replace('\\', r'\\').replace('"', r'\"') + '"'
@@ -175,10 +196,11 @@ def to_c_string(string: str) -> str:
 
 class QAPISchemaGenIntrospectVisitor(QAPISchemaMonolithicCVisitor):
 
-    def __init__(self, prefix: str, unmask: bool):
+    def __init__(self, prefix: str, unmask: bool,
+                 cache: Optional[QAPIGenCache] = None):
         super().__init__(
             prefix, 'qapi-introspect',
-            ' * QAPI/QMP schema introspection', __doc__)
+            ' * QAPI/QMP schema introspection', __doc__, cache)
         self._unmask = unmask
         self._schema: Optional[QAPISchema] = None
         self._trees: List[Annotated[SchemaInfo]] = []
@@ -206,11 +228,14 @@ def visit_end(self) -> None:
 extern const QLitObject %(c_name)s;
 ''',
                              c_name=c_name(name)))
+        table = _QLitTable(c_name(name))
+        c_string = table.qlit(self._trees)
+        self._genc.add(table.get_content())
         self._genc.add(mcgen('''
 const QLitObject %(c_name)s = %(c_string)s;
 ''',
                              c_name=c_name(name),
-                             c_string=_tree_to_qlit(self._trees)))
+                             c_string=c_string))
         self._schema = None
         self._trees = []
         self._used_types = []
@@ -378,7 +403,8 @@ def visit_event(self, name: str, info: Optional[QAPISourceInfo],
 
 
 def gen_introspect(schema: QAPISchema, output_dir: str, prefix: str,
-                   opt_unmask: bool) -> None:
-    vis = QAPISchemaGenIntrospectVisitor(prefix, opt_unmask)
+                   opt_unmask: bool,
+                   cache: Optional[QAPIGenCache] = None) -> None:
+    vis = QAPISchemaGenIntrospectVisitor(prefix, opt_unmask, cache)
     schema.visit(vis)
     vis.write(output_dir)
@@ -8,10 +8,17 @@
 """
 
 import argparse
+import multiprocessing
 import re
 import sys
-from typing import Optional
-
+from typing import (
+    Callable,
+    List,
+    Optional,
+    Sequence,
+)
+
+from .cache import QAPIGenCache
 from .commands import gen_commands
 from .error import QAPIError
 from .events import gen_events
@@ -30,11 +37,60 @@ def invalid_prefix_char(prefix: str) -> Optional[str]:
     return None
 
 
+# The backends run by _run_backends(), for the processes it forks
+_BACKENDS: Sequence[Callable[[], None]] = []
+_CACHE: Optional[QAPIGenCache] = None
+
+
+def _run_backend(index: int) -> List[str]:
+    # A pool process runs several backends and keeps its copy of the
+    # cache, so only return the outputs added by this one.
+    start = len(_CACHE.outputs) if _CACHE else 0
+    _BACKENDS[index]()
+    return _CACHE.outputs[start:] if _CACHE else []
+
+
+def _run_backends(backends: Sequence[Callable[[], None]],
+                  cache: Optional[QAPIGenCache],
+                  jobs: int) -> None:
+    """
+    Run the code generation backends, up to jobs of them at once.
+
+    The backends only read the checked schema, and write files of their
+    own, so they can run in forked processes.  The files each process
+    generated are recorded in the cache in backend order, same as when
+    running them one after the other.
+    """
+    # pylint: disable=global-statement
+    global _BACKENDS, _CACHE
+
+    jobs = min(jobs, len(backends))
+    if jobs <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        for backend in backends:
+            backend()
+        return
+
+    _BACKENDS = backends
+    _CACHE = cache
+    try:
+        with multiprocessing.get_context('fork').Pool(jobs) as pool:
+            results = pool.map(_run_backend, range(len(backends)), 1)
+    finally:
+        _BACKENDS = []
+        _CACHE = None
+    if cache:
+        for outputs in results:
+            for fname in outputs:
+                cache.add_output(fname)
+
+
 def generate(schema_file: str,
              output_dir: str,
              prefix: str,
              unmask: bool = False,
-             builtins: bool = False) -> None:
+             builtins: bool = False,
+             incremental: bool = False,
+             jobs: int = 1) -> None:
     """
     Generate C code for the given schema into the target directory.
 
@@ -43,17 +99,34 @@ def generate(schema_file: str,
     :param prefix: Optional C-code prefix for symbol names.
     :param unmask: Expose non-ABI names through introspection?
     :param builtins: Generate code for built-in types?
+    :param incremental: Skip modules whose inputs didn't change since
+                        the last incremental run into output_dir?
+    :param jobs: How many backends to run in parallel.
 
     :raise QAPIError: On failures.
     """
     assert invalid_prefix_char(prefix) is None
 
+    cache = None
+    if incremental:
+        cache = QAPIGenCache(output_dir, schema_file, prefix,
+                             unmask, builtins)
+        if cache.up_to_date():
+            return
+
     schema = QAPISchema(schema_file)
-    gen_types(schema, output_dir, prefix, builtins)
-    gen_visit(schema, output_dir, prefix, builtins)
-    gen_commands(schema, output_dir, prefix)
-    gen_events(schema, output_dir, prefix)
-    gen_introspect(schema, output_dir, prefix, unmask)
+    if cache:
+        cache.update(schema)
+    # Slowest first, so that they don't end up last in a process
+    _run_backends(
+        [lambda: gen_types(schema, output_dir, prefix, builtins, cache),
+         lambda: gen_visit(schema, output_dir, prefix, builtins, cache),
+         lambda: gen_commands(schema, output_dir, prefix, cache),
+         lambda: gen_introspect(schema, output_dir, prefix, unmask, cache),
+         lambda: gen_events(schema, output_dir, prefix, cache)],
+        cache, jobs)
+    if cache:
+        cache.save()
 
 
 def main() -> int:
@@ -76,6 +149,13 @@ def main() -> int:
     parser.add_argument('-u', '--unmask-non-abi-names', action='store_true',
                         dest='unmask',
                         help="expose non-ABI names in introspection")
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help="regenerate only the modules whose schema "
+                             "changed since the last incremental run")
+    parser.add_argument('-j', '--jobs', type=int,
+                        default=1,
+                        help="run up to JOBS backends in parallel "
+                             "(default: 1)")
     parser.add_argument('schema', action='store')
     args = parser.parse_args()
 
@@ -90,7 +170,9 @@ def main() -> int:
                  output_dir=args.output_dir,
                  prefix=args.prefix,
                  unmask=args.unmask,
-                 builtins=args.builtins)
+                 builtins=args.builtins,
+                 incremental=args.incremental,
+                 jobs=args.jobs)
     except QAPIError as err:
         print(f"{sys.argv[0]}: {str(err)}", file=sys.stderr)
         return 1
@@ -24,6 +24,24 @@
 
 class QAPISchemaParser:
 
+    # The tokens accept() recognizes, as alternatives matched after the
+    # whitespace at the cursor.  Only well-formed strings match group
+    # 'string', the rest are rescanned by _scan_string() to report what
+    # is wrong with them.  Anything else is a stray character.
+    _token_re = re.compile(r"""
+        (?P<space> \s* )
+        (?:
+          (?P<comment> \# )
+        | (?P<punct> [{}:,\[\]] )
+        | ' (?P<string> [ -&(-\[\]-~]* (?: \\\\ [ -&(-\[\]-~]* )* ) '
+        | (?P<bad_string> ' )
+        | (?P<bool> true | false )
+        | (?P<eof> \Z )
+        | (?P<stray> )
+        )
+    """, re.VERBOSE)
+    _stray_re = re.compile(r'[^[\]{}:,\s\'"]+')
+
     def __init__(self, fname, previously_included=None, incl_info=None):
         previously_included = previously_included or set()
         previously_included.add(os.path.abspath(fname))
@@ -41,7 +59,8 @@ def __init__(self, fname, previously_included=None, incl_info=None):
         if self.src == '' or self.src[-1] != '\n':
             self.src += '\n'
         self.cursor = 0
-        self.info = QAPISourceInfo(fname, 1, incl_info)
+        self._info = QAPISourceInfo(fname, 1, incl_info)
+        self._line = 1
         self.line_pos = 0
         self.exprs = []
         self.docs = []
@@ -144,14 +163,36 @@ def _pragma(self, name, value, info):
         else:
             raise QAPISemError(info, "unknown pragma '%s'" % name)
 
+    @property
+    def info(self):
+        # Source info is created only for the lines something asks about,
+        # and shared by everything on the same line.
+        if self._info.line != self._line:
+            self._info = self._info.next_line(self._line - self._info.line)
+        return self._info
+
     def accept(self, skip_comment=True):
         while True:
-            self.tok = self.src[self.cursor]
-            self.pos = self.cursor
-            self.cursor += 1
+            match = self._token_re.match(self.src, self.cursor)
+            kind = match.lastgroup
+            self.pos = match.end('space')
+            if kind == 'eof':
+                # The newline terminating the source ends the input
+                self.pos -= 1
+            if self.pos != self.cursor:
+                newlines = self.src.count('\n', self.cursor, self.pos)
+                if newlines:
+                    self._line += newlines
+                    self.line_pos = self.src.rindex('\n', self.cursor,
+                                                    self.pos) + 1
+            self.cursor = match.end()
             self.val = None
 
-            if self.tok == '#':
+            if kind == 'eof':
+                self.tok = None
+                return
+            self.tok = self.src[self.pos]
+            if kind == 'comment':
                 if self.src[self.cursor] == '#':
                     # Start of doc comment
                     skip_comment = False
@@ -159,55 +200,50 @@ def accept(self, skip_comment=True):
                 if not skip_comment:
                     self.val = self.src[self.pos:self.cursor]
                     return
-            elif self.tok in '{}:,[]':
+            elif kind == 'punct':
                 return
-            elif self.tok == "'":
-                # Note: we accept only printable ASCII
-                string = ''
-                esc = False
-                while True:
-                    ch = self.src[self.cursor]
-                    self.cursor += 1
-                    if ch == '\n':
-                        raise QAPIParseError(self, "missing terminating \"'\"")
-                    if esc:
-                        # Note: we recognize only \\ because we have
-                        # no use for funny characters in strings
-                        if ch != '\\':
-                            raise QAPIParseError(self,
-                                                 "unknown escape \\%s" % ch)
-                        esc = False
-                    elif ch == '\\':
-                        esc = True
-                        continue
-                    elif ch == "'":
-                        self.val = string
-                        return
-                    if ord(ch) < 32 or ord(ch) >= 127:
-                        raise QAPIParseError(
-                            self, "funny character in string")
-                    string += ch
-            elif self.src.startswith('true', self.pos):
-                self.val = True
-                self.cursor += 3
+            elif kind == 'string':
+                self.val = match.group('string').replace('\\\\', '\\')
                 return
-            elif self.src.startswith('false', self.pos):
-                self.val = False
-                self.cursor += 4
+            elif kind == 'bad_string':
+                self.val = self._scan_string()
                 return
-            elif self.tok == '\n':
-                if self.cursor == len(self.src):
-                    self.tok = None
-                    return
-                self.info = self.info.next_line()
-                self.line_pos = self.cursor
-            elif not self.tok.isspace():
+            elif kind == 'bool':
+                self.val = self.tok == 't'
+                return
+            else:
                 # Show up to next structural, whitespace or quote
                 # character
-                match = re.match('[^[\\]{}:,\\s\'"]+',
-                                 self.src[self.cursor-1:])
+                match = self._stray_re.match(self.src, self.pos)
                 raise QAPIParseError(self, "stray '%s'" % match.group(0))
 
+    def _scan_string(self):
+        # Scan the string starting at self.pos character by character,
+        # to report what keeps _token_re from matching it.
+        # Note: we accept only printable ASCII
+        esc = False
+        while True:
+            ch = self.src[self.cursor]
+            self.cursor += 1
+            if ch == '\n':
+                raise QAPIParseError(self, "missing terminating \"'\"")
+            if esc:
+                # Note: we recognize only \\ because we have
+                # no use for funny characters in strings
+                if ch != '\\':
+                    raise QAPIParseError(self,
+                                         "unknown escape \\%s" % ch)
+                esc = False
+            elif ch == '\\':
+                esc = True
+                continue
+            elif ch == "'":
+                string = self.src[self.pos + 1:self.cursor - 1]
+                return string.replace('\\\\', '\\')
+            if ord(ch) < 32 or ord(ch) >= 127:
+                raise QAPIParseError(
+                    self, "funny character in string")
+
     def get_members(self):
         expr = OrderedDict()
         if self.tok == '}':
@@ -47,9 +47,9 @@ def set_defn(self, meta: str, name: str) -> None:
         self.defn_meta = meta
         self.defn_name = name
 
-    def next_line(self: T) -> T:
+    def next_line(self: T, lines: int = 1) -> T:
         info = copy.copy(self)
-        info.line += 1
+        info.line += lines
         return info
 
     def loc(self) -> str:
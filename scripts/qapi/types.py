@@ -15,6 +15,7 @@
 
 from typing import List, Optional, Sequence
 
+from .cache import QAPIGenCache
 from .common import (
     c_enum_const,
     c_name,
@@ -266,10 +267,11 @@ def gen_type_cleanup(name: str) -> str:
 
 class QAPISchemaGenTypeVisitor(QAPISchemaModularCVisitor):
 
-    def __init__(self, prefix: str):
+    def __init__(self, prefix: str,
+                 cache: Optional[QAPIGenCache] = None):
         super().__init__(
             prefix, 'qapi-types', ' * Schema-defined QAPI types',
-            ' * Built-in QAPI types', __doc__)
+            ' * Built-in QAPI types', __doc__, cache)
 
     def _begin_builtin_module(self) -> None:
         self._genc.preamble_add(mcgen('''
@@ -365,7 +367,8 @@ def visit_alternate_type(self,
 def gen_types(schema: QAPISchema,
               output_dir: str,
               prefix: str,
-              opt_builtins: bool) -> None:
-    vis = QAPISchemaGenTypeVisitor(prefix)
+              opt_builtins: bool,
+              cache: Optional[QAPIGenCache] = None) -> None:
+    vis = QAPISchemaGenTypeVisitor(prefix, cache)
     schema.visit(vis)
     vis.write(output_dir, opt_builtins)
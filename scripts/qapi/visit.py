@@ -15,6 +15,7 @@
 
 from typing import List, Optional, Sequence
 
+from .cache import QAPIGenCache
 from .common import (
     c_enum_const,
     c_name,
@@ -315,10 +316,11 @@ def gen_visit_object(name: str) -> str:
 
 class QAPISchemaGenVisitVisitor(QAPISchemaModularCVisitor):
 
-    def __init__(self, prefix: str):
+    def __init__(self, prefix: str,
+                 cache: Optional[QAPIGenCache] = None):
         super().__init__(
             prefix, 'qapi-visit', ' * Schema-defined QAPI visitors',
-            ' * Built-in QAPI visitors', __doc__)
+            ' * Built-in QAPI visitors', __doc__, cache)
 
     def _begin_builtin_module(self) -> None:
         self._genc.preamble_add(mcgen('''
@@ -405,7 +407,8 @@ def visit_alternate_type(self,
 def gen_visit(schema: QAPISchema,
               output_dir: str,
               prefix: str,
-              opt_builtins: bool) -> None:
-    vis = QAPISchemaGenVisitVisitor(prefix)
+              opt_builtins: bool,
+              cache: Optional[QAPIGenCache] = None) -> None:
+    vis = QAPISchemaGenVisitVisitor(prefix, cache)
     schema.visit(vis)
     vis.write(output_dir, opt_builtins)
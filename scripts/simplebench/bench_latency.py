@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+#
+# Benchmark per-request latency distribution with qemu-io
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+
+import simplebench
+from histogram import hist_add, hist_percentile
+from results_to_text import results_to_text
+
+
+# Output of read/write commands with -C: bytes,ops,time,bytes/sec,ops/sec.
+# qemu-io prints its prompt before each command, on the same line.
+csv_re = re.compile(r'(\d+),(\d+),[\d:.]+,[\d.]+,([\d.]+)$', re.MULTILINE)
+
+
+def parse_qemu_io_csv(output):
+    """Return the latency in seconds of each request reported by
+    read/write -C commands in qemu-io output"""
+    latencies = []
+    for _, ops, ops_per_sec in csv_re.findall(output):
+        ops_per_sec = float(ops_per_sec)
+        if ops_per_sec != 0:
+            latencies.append(int(ops) / ops_per_sec)
+    return latencies
+
+
+def bench_latency(qemu_io, image, fmt, op, block_size, count, cache, aio,
+                  sequential, write_percent=None):
+    """Run count single requests of block_size bytes through one qemu-io
+    process and collect the latency of each of them.
+
+    op is 'read' or 'write'. If write_percent is set, op is ignored and each
+    request is a write with that probability and a read otherwise.
+
+    Returns {'iops': float, 'latency-hist': dict, 'p50': float, 'p99': float,
+    'p99.9': float} on success and {'error': str} on failure. Latencies are
+    in seconds. Return value is compatible with simplebench lib.
+    """
+    # Use qemu-img from the same build as qemu-io, if there is one
+    qemu_img = os.path.join(os.path.dirname(qemu_io), 'qemu-img')
+    if not os.path.exists(qemu_img):
+        qemu_img = 'qemu-img'
+    info = subprocess.run([qemu_img, 'info', '-f', fmt, '--output=json',
+                           image], stdout=subprocess.PIPE,
+                          universal_newlines=True)
+    if info.returncode != 0:
+        return {'error': f'qemu-img info failed: {info.returncode}'}
+    size = json.loads(info.stdout)['virtual-size']
+
+    n_blocks = size // block_size
+    if n_blocks == 0:
+        return {'error': f'image {image} is smaller than block size'}
+
+    cmds = []
+    for i in range(count):
+        block = i % n_blocks if sequential else random.randrange(n_blocks)
+        if write_percent is not None:
+            op = 'write' if random.random() * 100 < write_percent else 'read'
+        cmds.append(f'{op} -C {block * block_size} {block_size}')
+    cmds.append('quit')
+
+    args = [qemu_io, '-f', fmt, '-t', cache, '-i', aio]
+    if op == 'read' and write_percent is None:
+        args.append('-r')
+    args.append(image)
+
+    p = subprocess.run(args, input='\n'.join(cmds) + '\n',
+                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                       universal_newlines=True)
+    if p.returncode != 0:
+        return {'error': f'qemu-io failed: {p.returncode}: {p.stdout}'}
+
+    hist = {}
+    total = 0.0
+    n = 0
+    for latency in parse_qemu_io_csv(p.stdout):
+        hist_add(hist, latency)
+        total += latency
+        n += 1
+
+    if n != count:
+        return {'error': f'expected {count} results from qemu-io, got {n}: '
+                f'{p.stdout[-1000:]}'}
+
+    return {
+        'iops': n / total,
+        'latency-hist': hist,
+        'p50': hist_percentile(hist, 50),
+        'p99': hist_percentile(hist, 99),
+        'p99.9': hist_percentile(hist, 99.9),
+    }
+
+
+def bench_func(env, case):
+    """ Handle one "cell" of benchmarking table. """
+    return bench_latency(env['qemu-io'], case['image'], case['format'],
+                         case['op'], case['block-size'], case['count'],
+                         env['cache'], env['aio'], case['sequential'])
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser('Request latency benchmark', epilog='''
+ENV format
+
+    (LABEL:PATH|PATH)[,cache=MODE][,aio=MODE]
+
+    LABEL    short name for the qemu-io binary
+    PATH     path to the qemu-io binary
+    cache    cache mode, "none" by default
+    aio      aio mode, "threads" by default''',
+                                formatter_class=argparse.RawTextHelpFormatter)
+    p.add_argument('--env', nargs='+', required=True,
+                   help='qemu-io binaries with labels and options')
+    p.add_argument('--image', required=True,
+                   help='existing image to run requests on')
+    p.add_argument('--format', default='qcow2', help='image format')
+    p.add_argument('--op', nargs='+', default=['read', 'write'],
+                   choices=['read', 'write'], help='request types')
+    p.add_argument('--block-size', nargs='+', type=int, default=[4096],
+                   help='request sizes in bytes')
+    p.add_argument('--requests', type=int, default=10000,
+                   help='number of requests in each run')
+    p.add_argument('--sequential', action='store_true',
+                   help='issue requests sequentially instead of randomly')
+    p.add_argument('--count', type=int, default=3,
+                   help='number of runs of each cell')
+    p.add_argument('--results', help='file to save results to')
+    args = p.parse_args()
+
+    test_envs = []
+    for i, e in enumerate(args.env):
+        opts = e.split(',')
+        if ':' in opts[0]:
+            label, path = opts[0].split(':')
+        else:
+            label, path = f'q{i}', opts[0]
+        env = {'id': label, 'qemu-io': path, 'cache': 'none',
+               'aio': 'threads'}
+        for opt in opts[1:]:
+            key, value = opt.split('=')
+            env[key] = value
+        test_envs.append(env)
+
+    test_cases = []
+    for op in args.op:
+        for bs in args.block_size:
+            test_cases.append({
+                'id': f'{op} {bs}',
+                'image': args.image,
+                'format': args.format,
+                'op': op,
+                'block-size': bs,
+                'count': args.requests,
+                'sequential': args.sequential,
+            })
+
+    result = simplebench.bench(bench_func, test_envs, test_cases,
+                               count=args.count)
+    if args.results:
+        with open(args.results, 'w') as f:
+            json.dump(result, f, indent=4)
+    print(results_to_text(result))
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+#
+# Benchmark a matrix of block driver configurations
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import argparse
+import itertools
+import json
+import os
+import re
+import subprocess
+
+import simplebench
+from bench_latency import bench_latency
+from results_to_text import results_to_text
+
+
+help_epilog = '''
+MATRIX file format (JSON)
+
+    {
+        "envs": [
+            {"id": "master", "qemu-img": "/path/to/qemu-img",
+             "qemu-io": "/path/to/qemu-io"},
+            ...
+        ],
+        "dir": "/path/to/directory/for/images",   (default: current)
+        "image-size": "4G",
+        "count": 100000,
+        "format": ["qcow2", "raw"],
+        "cluster-size": [65536, 2097152],
+        "cache": ["none", "writeback"],
+        "aio": ["threads", "native"],
+        "depth": [1, 64],
+        "block-size": [4096, 65536],
+        "rw": ["read", "write", "70"]
+    }
+
+All list-valued keys are axes of the matrix; every combination of them is a
+test case, and "envs" are columns. "rw" is "read", "write" or a percentage
+of writes in a random read/write mix. Pure reads and writes are run through
+"qemu-img bench" with the given queue depth; mixes are run through qemu-io
+one request at a time and also report latency percentiles, so they are only
+combined with depth 1. Combinations that make no sense (cluster size of raw
+images, native aio without cache=none) are skipped.'''
+
+axes = ['format', 'cluster-size', 'cache', 'aio', 'depth', 'block-size', 'rw']
+
+defaults = {
+    'format': ['qcow2'],
+    'cluster-size': [65536],
+    'cache': ['none'],
+    'aio': ['threads'],
+    'depth': [1],
+    'block-size': [4096],
+    'rw': ['read', 'write'],
+}
+
+
+def expand_matrix(matrix):
+    """Return list of test cases for every valid combination of the axes"""
+    values = [matrix.get(axis, defaults[axis]) for axis in axes]
+    cases = []
+    seen = set()
+    for combination in itertools.product(*values):
+        case = dict(zip(axes, combination))
+
+        if case['format'] != 'qcow2':
+            case['cluster-size'] = None
+        if case['aio'] == 'native' and case['cache'] not in ('none',
+                                                             'directsync'):
+            continue
+        if case['rw'] not in ('read', 'write') and case['depth'] != 1:
+            continue
+
+        key = tuple(case.values())
+        if key in seen:
+            continue
+        seen.add(key)
+
+        cluster = f" cl={case['cluster-size']}" if case['cluster-size'] else ''
+        rw = case['rw'] if case['rw'] in ('read', 'write') \
+            else f"{case['rw']}% write"
+        case['id'] = (f"{case['format']}{cluster} {case['cache']}/"
+                      f"{case['aio']} qd={case['depth']} "
+                      f"bs={case['block-size']} {rw}")
+        case['dir'] = matrix.get('dir', os.getcwd())
+        case['image-size'] = matrix.get('image-size', '4G')
+        case['count'] = matrix.get('count', 100000)
+        cases.append(case)
+
+    return cases
+
+
+def create_image(qemu_img, case):
+    fname = os.path.join(case['dir'], 'matrix-test.' + case['format'])
+    try:
+        os.remove(fname)
+    except OSError:
+        pass
+
+    opts = []
+    if case['cluster-size']:
+        opts.append(f"cluster_size={case['cluster-size']}")
+    if case['rw'] != 'write':
+        # Reads of never written areas would not hit the disk
+        opts.append('preallocation=falloc')
+
+    args = [qemu_img, 'create', '-f', case['format']]
+    if opts:
+        args += ['-o', ','.join(opts)]
+    subprocess.run(args + [fname, case['image-size']],
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                   check=True)
+    return fname
+
+
+def qemu_img_bench(qemu_img, fname, case):
+    args = [qemu_img, 'bench', '-f', case['format'], '-t', case['cache'],
+            '-i', case['aio'], '-d', str(case['depth']),
+            '-s', str(case['block-size']), '-c', str(case['count'])]
+    if case['rw'] == 'write':
+        args.append('-w')
+    p = subprocess.run(args + [fname], stdout=subprocess.PIPE,
+                       stderr=subprocess.STDOUT, universal_newlines=True)
+
+    if p.returncode != 0:
+        return {'error': f'qemu-img failed: {p.returncode}: {p.stdout}'}
+    m = re.search(r'Run completed in (\d+.\d+) seconds.', p.stdout)
+    if not m:
+        return {'error': f'failed to parse qemu-img output: {p.stdout}'}
+    seconds = float(m.group(1))
+    return {'iops': case['count'] / seconds, 'seconds': seconds}
+
+
+def bench_func(env, case):
+    """ Handle one "cell" of benchmarking table. """
+    try:
+        fname = create_image(env['qemu-img'], case)
+    except subprocess.CalledProcessError as e:
+        return {'error': f'qemu-img create failed: {e}'}
+
+    try:
+        if case['rw'] in ('read', 'write'):
+            return qemu_img_bench(env['qemu-img'], fname, case)
+        return bench_latency(env['qemu-io'], fname, case['format'], None,
+                             case['block-size'], case['count'],
+                             case['cache'], case['aio'], False,
+                             write_percent=float(case['rw']))
+    finally:
+        os.remove(fname)
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser('Block driver workload matrix benchmark',
+                                epilog=help_epilog,
+                                formatter_class=argparse.RawTextHelpFormatter)
+    p.add_argument('matrix', help='JSON file describing the matrix')
+    p.add_argument('--count', type=int, default=3,
+                   help='number of runs of each cell')
+    p.add_argument('--results', help='''\
+file to save results to; an interrupted run is resumed
+from it''')
+    p.add_argument('--shuffle', action='store_true',
+                   help='run cells in random order')
+    p.add_argument('--dry-run', action='store_true',
+                   help='only list the test cases')
+    args = p.parse_args()
+
+    with open(args.matrix) as f:
+        matrix = json.load(f)
+
+    test_cases = expand_matrix(matrix)
+    if args.dry_run:
+        for case in test_cases:
+            print(case['id'])
+        exit(0)
+
+    result = simplebench.bench(bench_func, matrix['envs'], test_cases,
+                               count=args.count, results_file=args.results,
+                               shuffle=args.shuffle)
+    print(results_to_text(result))
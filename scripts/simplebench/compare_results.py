@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+#
+# Compare saved simplebench results and detect regressions
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import argparse
+import functools
+import json
+import math
+import statistics
+import sys
+
+import tabulate
+
+from simplebench import bootstrap_ci, result_dimension
+
+
+@functools.lru_cache(maxsize=None)
+def _u_count(n1, n2, u):
+    """Number of orderings of n1 + n2 distinct values giving statistic u"""
+    if u < 0 or u > n1 * n2:
+        return 0
+    if n1 == 0 or n2 == 0:
+        return 1 if u == 0 else 0
+    return _u_count(n1 - 1, n2, u - n2) + _u_count(n1, n2 - 1, u)
+
+
+def mann_whitney(a, b):
+    """Two-sided Mann-Whitney U test
+
+    Uses the exact distribution of U for small samples without ties and the
+    normal approximation with tie correction otherwise.
+
+    Returns p-value.
+    """
+    n1, n2 = len(a), len(b)
+    values = sorted([(v, 0) for v in a] + [(v, 1) for v in b])
+
+    # Average ranks over ties
+    ranks = [0.0] * len(values)
+    tie_term = 0
+    i = 0
+    while i < len(values):
+        j = i
+        while j + 1 < len(values) and values[j + 1][0] == values[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        t = j - i + 1
+        tie_term += t ** 3 - t
+        i = j + 1
+
+    r1 = sum(r for r, (v, group) in zip(ranks, values) if group == 0)
+    u1 = r1 - n1 * (n1 + 1) / 2
+    u = min(u1, n1 * n2 - u1)
+
+    if tie_term == 0 and n1 + n2 <= 30:
+        total = math.comb(n1 + n2, n1)
+        tail = sum(_u_count(n1, n2, k) for k in range(int(u) + 1))
+        return min(1.0, 2 * tail / total)
+
+    n = n1 + n2
+    mu = n1 * n2 / 2
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))))
+    if sigma == 0:
+        return 1.0
+    z = (abs(u - mu) - 0.5) / sigma
+    return min(1.0, math.erfc(max(z, 0) / math.sqrt(2)))
+
+
+def relative_change(samples):
+    """Relative change of the average, infinite if the baseline is zero"""
+    base, new = samples
+    base_mean = statistics.mean(base)
+    change = statistics.mean(new) - base_mean
+    if base_mean == 0:
+        return math.copysign(math.inf, change) if change else 0.0
+    return change / base_mean
+
+
+def compare_cell(base, new, threshold, alpha, confidence):
+    """Compare two bench_one() results
+
+    Returns dict with 'change' (relative change of average), 'ci' (bootstrap
+    confidence interval of the change), 'p' (Mann-Whitney p-value) and
+    'regression' (bool) fields, or None if either cell has no successful runs.
+    A change relative to a zero baseline makes no sense, so 'change' and 'ci'
+    are None and 'regression' False in that case.
+    """
+    dim = result_dimension(base['runs'])
+    if dim is None or result_dimension(new['runs']) != dim:
+        return None
+
+    a = [r[dim] for r in base['runs'] if dim in r]
+    b = [r[dim] for r in new['runs'] if dim in r]
+
+    p = mann_whitney(a, b)
+    if statistics.mean(a) == 0:
+        return {'change': None, 'ci': None, 'p': p, 'regression': False}
+
+    change = relative_change((a, b))
+    ci = bootstrap_ci((a, b), confidence=confidence, stat=relative_change)
+
+    # More seconds or fewer iops is worse
+    worse = change if dim == 'seconds' else -change
+
+    return {
+        'change': change,
+        'ci': ci,
+        'p': p,
+        'regression': p < alpha and worse > threshold
+    }
+
+
+def compare_results(base, new, threshold=0.05, alpha=0.05, confidence=0.95):
+    """Compare two bench() results cell by cell
+
+    Returns list of (case id, env id, compare_cell() result) for cells present
+    in both result sets.
+    """
+    cells = []
+    for case_id, row in base['tab'].items():
+        for env_id, res in row.items():
+            new_res = new['tab'].get(case_id, {}).get(env_id)
+            if new_res is None:
+                continue
+            cells.append((case_id, env_id,
+                          compare_cell(res, new_res, threshold, alpha,
+                                       confidence)))
+    return cells
+
+
+def comparison_to_text(cells):
+    tab = [['case', 'env', 'change', 'CI', 'p', '']]
+    for case_id, env_id, cmp in cells:
+        if cmp is None:
+            tab.append([case_id, env_id, 'FAILED', '', '', ''])
+            continue
+        if cmp['change'] is None:
+            tab.append([case_id, env_id, 'N/A', '', f'{cmp["p"]:.3f}',
+                        'zero baseline, not comparable'])
+            continue
+        low, high = cmp['ci']
+        tab.append([case_id, env_id,
+                    f'{cmp["change"] * 100:+.1f}%',
+                    f'[{low * 100:+.1f}%, {high * 100:+.1f}%]',
+                    f'{cmp["p"]:.3f}',
+                    'REGRESSION' if cmp['regression'] else ''])
+    return tabulate.tabulate(tab, headers='firstrow')
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser('Compare simplebench results', description='''\
+Compare results.json files saved from simplebench.bench() against the first
+one. Exits with status 1 if any cell regressed by more than the threshold with
+a statistically significant difference.''')
+    p.add_argument('--threshold', type=float, default=5,
+                   help='regression threshold in percent (default 5)')
+    p.add_argument('--alpha', type=float, default=0.05,
+                   help='significance level of the Mann-Whitney test')
+    p.add_argument('--confidence', type=float, default=0.95,
+                   help='confidence level of bootstrap intervals')
+    p.add_argument('base', help='baseline results file')
+    p.add_argument('results', nargs='+', help='results files to compare')
+    args = p.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+
+    regressed = False
+    for fname in args.results:
+        with open(fname) as f:
+            new = json.load(f)
+        cells = compare_results(base, new, args.threshold / 100, args.alpha,
+                                args.confidence)
+        print(f'{args.base} -> {fname}:\n')
+        print(comparison_to_text(cells))
+        print()
+        regressed = regressed or any(c and c['regression']
+                                     for _, _, c in cells)
+
+    sys.exit(1 if regressed else 0)
@@ -0,0 +1,81 @@
+#
+# Compact log-scale histograms for simplebench latency results
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+# A histogram is a dict mapping bucket number (as a string, to be stored in
+# JSON as is) to number of samples. Samples are in nanoseconds. Each power of
+# two is split into SUB_BUCKETS linear buckets, so every value is known with
+# a relative error below 1 / SUB_BUCKETS whatever its magnitude, and a
+# histogram of millions of requests takes a few hundred entries at most.
+
+SUB_BUCKETS = 32
+
+
+def bucket_of(ns):
+    ns = max(int(ns), 1)
+    exp = ns.bit_length() - 1
+    if exp < 5:
+        return ns
+    sub = (ns >> (exp - 5)) - SUB_BUCKETS
+    return (exp - 4) * SUB_BUCKETS + sub
+
+
+def bucket_value(bucket):
+    """Return the lowest value falling into bucket"""
+    if bucket < SUB_BUCKETS:
+        return bucket
+    exp = bucket // SUB_BUCKETS + 4
+    sub = bucket % SUB_BUCKETS
+    return (SUB_BUCKETS + sub) << (exp - 5)
+
+
+def hist_add(hist, seconds):
+    key = str(bucket_of(seconds * 1e9))
+    hist[key] = hist.get(key, 0) + 1
+
+
+def hist_merge(hists):
+    merged = {}
+    for hist in hists:
+        for key, count in hist.items():
+            merged[key] = merged.get(key, 0) + count
+    return merged
+
+
+def hist_percentile(hist, percent):
+    """Return value in seconds below which percent of samples are
+
+    The value is the middle of the bucket the percentile falls into.
+    """
+    buckets = sorted((int(k), v) for k, v in hist.items())
+    total = sum(v for _, v in buckets)
+    if total == 0:
+        return None
+    rank = total * percent / 100
+    seen = 0
+    for bucket, count in buckets:
+        seen += count
+        if seen >= rank:
+            break
+    return (bucket_value(bucket) + bucket_value(bucket + 1)) / 2e9
+
+
+def format_latency(seconds):
+    if seconds >= 1:
+        return f'{seconds:.3g}s'
+    if seconds >= 1e-3:
+        return f'{seconds * 1e3:.3g}ms'
+    return f'{seconds * 1e6:.3g}us'
@@ -21,6 +21,8 @@
 import math
 import tabulate
 
+from histogram import hist_merge, hist_percentile, format_latency
+
 # We want leading whitespace for difference row cells (see below)
 tabulate.PRESERVE_WHITESPACE = True
 
@@ -34,10 +36,24 @@ def format_value(x, stdev):
         return f'{x:.2g} ± {math.ceil(stdev_pr)}%'
 
 
+def latency_to_text(result):
+    """Return percentiles of latency histograms of all runs merged together,
+    or None if runs don't have them."""
+    hists = [r['latency-hist'] for r in result['runs'] if 'latency-hist' in r]
+    if not hists:
+        return None
+    hist = hist_merge(hists)
+    return ' '.join(f'p{p:g}={format_latency(hist_percentile(hist, p))}'
+                    for p in (50, 99, 99.9))
+
+
 def result_to_text(result):
     """Return text representation of bench_one() returned dict."""
     if 'average' in result:
         s = format_value(result['average'], result['stdev'])
+        latency = latency_to_text(result)
+        if latency:
+            s += '\n' + latency
         if 'n-failed' in result:
             s += '\n({} failed)'.format(result['n-failed'])
         return s
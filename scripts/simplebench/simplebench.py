@@ -18,10 +18,80 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import json
+import os
+import queue
+import random
 import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 
-def bench_one(test_func, test_env, test_case, count=5, initial_run=True):
+def bootstrap_ci(values, confidence=0.95, resamples=2000, stat=None, rng=None):
+    """Bootstrap confidence interval
+
+    values     -- list of samples
+    confidence -- confidence level of the interval
+    resamples  -- number of bootstrap resamples
+    stat       -- statistic function, statistics.mean by default. May take
+                  a tuple of sample lists instead of one list, in which case
+                  values must be that tuple and each list is resampled
+                  independently.
+    rng        -- random.Random instance, a fixed-seed one by default so that
+                  results are reproducible
+
+    Returns (low, high) tuple.
+    """
+    if stat is None:
+        stat = statistics.mean
+    if rng is None:
+        rng = random.Random(0)
+
+    def resample(v):
+        return rng.choices(v, k=len(v))
+
+    if isinstance(values, tuple):
+        estimates = sorted(stat(tuple(resample(v) for v in values))
+                           for _ in range(resamples))
+    else:
+        estimates = sorted(stat(resample(values)) for _ in range(resamples))
+
+    tail = (1 - confidence) / 2
+    low = estimates[int(tail * (resamples - 1))]
+    high = estimates[int((1 - tail) * (resamples - 1))]
+    return low, high
+
+
+def result_dimension(runs):
+    """Return 'iops' or 'seconds' for a list of test_func results, or None
+    if no run succeeded"""
+    succeeded = [r for r in runs if ('seconds' in r or 'iops' in r)]
+    if not succeeded:
+        return None
+    if 'iops' in succeeded[0]:
+        assert all('iops' in r for r in succeeded)
+        return 'iops'
+    assert all('seconds' in r for r in succeeded)
+    assert all('iops' not in r for r in succeeded)
+    return 'seconds'
+
+
+def ci_is_tight(runs, target_ci):
+    """Check that the 95% CI of the mean of runs is within ±target_ci of the
+    mean (target_ci is relative, so 0.05 means ±5%)"""
+    dim = result_dimension(runs)
+    if dim is None:
+        return False
+    values = [r[dim] for r in runs if dim in r]
+    if len(values) < 2:
+        return False
+    mean = statistics.mean(values)
+    low, high = bootstrap_ci(values)
+    return (high - low) / 2 <= abs(mean) * target_ci
+
+
+def bench_one(test_func, test_env, test_case, count=5, initial_run=True,
+              max_count=None, target_ci=0.05):
     """Benchmark one test-case
 
     test_func   -- benchmarking function with prototype
@@ -36,6 +106,11 @@ def bench_one(test_func, test_env, test_case, count=5, initial_run=True):
     test_case   -- test case - opaque second argument for test_func
     count       -- how many times to call test_func, to calculate average
     initial_run -- do initial run of test_func, which don't get into result
+    max_count   -- if set, keep on running test_func after count runs, up to
+                   max_count runs in total, until the 95% confidence interval
+                   of the average is within ±target_ci of it
+    target_ci   -- relative half-width of confidence interval to reach when
+                   max_count is set
 
     Returns dict with the following fields:
         'runs':     list of test_func results
@@ -52,40 +127,69 @@ def bench_one(test_func, test_env, test_case, count=5, initial_run=True):
         print('   ', test_func(test_env, test_case))
 
     runs = []
-    for i in range(count):
-        print('  #run {}'.format(i+1))
+    while len(runs) < count or (max_count is not None and
+                                len(runs) < max_count and
+                                not ci_is_tight(runs, target_ci)):
+        print('  #run {}'.format(len(runs) + 1))
         res = test_func(test_env, test_case)
         print('   ', res)
         runs.append(res)
 
     result = {'runs': runs}
 
+    dim = result_dimension(runs)
     succeeded = [r for r in runs if ('seconds' in r or 'iops' in r)]
     if succeeded:
-        if 'iops' in succeeded[0]:
-            assert all('iops' in r for r in succeeded)
-            dim = 'iops'
-        else:
-            assert all('seconds' in r for r in succeeded)
-            assert all('iops' not in r for r in succeeded)
-            dim = 'seconds'
         result['dimension'] = dim
         result['average'] = statistics.mean(r[dim] for r in succeeded)
         result['stdev'] = statistics.stdev(r[dim] for r in succeeded)
 
-    if len(succeeded) < count:
-        result['n-failed'] = count - len(succeeded)
+    if len(succeeded) < len(runs):
+        result['n-failed'] = len(runs) - len(succeeded)
 
     return result
 
 
-def bench(test_func, test_envs, test_cases, *args, **vargs):
+def load_results_file(results_file):
+    """Load cell results checkpointed by bench() to results_file
+
+    Returns dict mapping case id to dict mapping env id to bench_one result.
+    A missing file is treated as an empty checkpoint.
+    """
+    try:
+        with open(results_file) as f:
+            return json.load(f)['tab']
+    except FileNotFoundError:
+        return {}
+
+
+def save_results_file(results_file, tab):
+    """Atomically replace results_file with the cells collected so far"""
+    tmp = results_file + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'tab': tab}, f, indent=4)
+    os.replace(tmp, results_file)
+
+
+def bench(test_func, test_envs, test_cases, *args, results_file=None, jobs=1,
+          cpus=None, shuffle=False, **vargs):
     """Fill benchmark table
 
     test_func -- benchmarking function, see bench_one for description
     test_envs -- list of test environments, see bench_one
     test_cases -- list of test cases, see bench_one
     args, vargs -- additional arguments for bench_one
+    results_file -- if set, every cell is saved to this JSON file as soon as
+                    it is finished, and cells already present in the file are
+                    not run again. So, an interrupted benchmark may be resumed
+                    by calling bench() again with the same results_file.
+    jobs -- number of cells to benchmark concurrently. Only use it with
+            cells that don't compete for the same resources.
+    cpus -- list of CPU sets (lists of host CPU numbers), one for each of the
+            jobs. Each job's thread (and so processes it starts) is pinned to
+            its CPU set.
+    shuffle -- run cells in random order instead of env by env, so that
+               slow drift of the host state doesn't bias one environment
 
     Returns dict with the following fields:
         'envs':  test_envs
@@ -94,23 +198,48 @@ def bench(test_func, test_envs, test_cases, *args, **vargs):
                  test_cases[i] for test_envs[j] (i.e., rows are test cases and
                  columns are test environments)
     """
-    tab = {}
+    if cpus is not None:
+        assert len(cpus) == jobs
+
+    tab = load_results_file(results_file) if results_file else {}
     results = {
         'envs': test_envs,
         'cases': test_cases,
         'tab': tab
     }
-    n = 1
-    n_tests = len(test_envs) * len(test_cases)
-    for env in test_envs:
-        for case in test_cases:
-            print('Testing {}/{}: {} :: {}'.format(n, n_tests,
-                                                   env['id'], case['id']))
-            if case['id'] not in tab:
-                tab[case['id']] = {}
-            tab[case['id']][env['id']] = bench_one(test_func, env, case,
-                                                   *args, **vargs)
-            n += 1
+
+    cells = [(env, case) for env in test_envs for case in test_cases]
+    n_tests = len(cells)
+    todo = [(n, env, case) for n, (env, case) in enumerate(cells, 1)
+            if env['id'] not in tab.get(case['id'], {})]
+    if len(todo) < n_tests:
+        print('Resuming: {} of {} cells already done'.format(
+            n_tests - len(todo), n_tests))
+    if shuffle:
+        random.shuffle(todo)
+
+    lock = threading.Lock()
+    slots = queue.Queue()
+    for i in range(jobs):
+        slots.put(i)
+
+    def pin_worker():
+        slot = slots.get()
+        if cpus is not None:
+            os.sched_setaffinity(0, cpus[slot])
+
+    def run_cell(n, env, case):
+        print('Testing {}/{}: {} :: {}'.format(n, n_tests,
+                                               env['id'], case['id']))
+        res = bench_one(test_func, env, case, *args, **vargs)
+        with lock:
+            tab.setdefault(case['id'], {})[env['id']] = res
+            if results_file:
+                save_results_file(results_file, tab)
+
+    with ThreadPoolExecutor(max_workers=jobs, initializer=pin_worker) as ex:
+        for f in [ex.submit(run_cell, *cell) for cell in todo]:
+            f.result()
 
     print('Done')
     return results
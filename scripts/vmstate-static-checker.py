@@ -20,7 +20,12 @@
 # with this program; if not, see <http://www.gnu.org/licenses/>.
 
 import argparse
+import contextlib
+import io
+import itertools
 import json
+import multiprocessing
+import os
 import sys
 
 # Count the number of errors found
@@ -370,31 +375,21 @@ def check_machine_type(s, d):
     return
 
 
-def main():
-    help_text = "Parse JSON-formatted vmstate dumps from QEMU in files SRC and DEST.  Checks whether migration from SRC to DEST QEMU versions would break based on the VMSTATE information contained within the JSON outputs.  The JSON output is created from a QEMU invocation with the -dump-vmstate parameter and a filename argument to it.  Other parameters to QEMU do not matter, except the -M (machine type) parameter."
+def check_section(sec, s, d):
+    check_version(s, d, sec)
 
-    parser = argparse.ArgumentParser(description=help_text)
-    parser.add_argument('-s', '--src', type=argparse.FileType('r'),
-                        required=True,
-                        help='json dump from src qemu')
-    parser.add_argument('-d', '--dest', type=argparse.FileType('r'),
-                        required=True,
-                        help='json dump from dest qemu')
-    parser.add_argument('--reverse', required=False, default=False,
-                        action='store_true',
-                        help='reverse the direction')
-    args = parser.parse_args()
+    for entry in s:
+        if not entry in d:
+            print("Section \"" + sec + "\": Entry \"" + entry + "\"", end=' ')
+            print("missing")
+            bump_taint()
+            continue
 
-    src_data = json.load(args.src)
-    dest_data = json.load(args.dest)
-    args.src.close()
-    args.dest.close()
+        if entry == "Description":
+            check_descriptions(s[entry], d[entry], sec)
 
-    if args.reverse:
-        temp = src_data
-        src_data = dest_data
-        dest_data = temp
 
+def check_dumps(src_data, dest_data, check=check_section):
     for sec in src_data:
         dest_sec = sec
         if not dest_sec in dest_data:
@@ -413,17 +408,124 @@ def main():
             check_machine_type(s, d)
             continue
 
-        check_version(s, d, sec)
+        check(sec, s, d)
+
+
+def load_dumps(files):
+    # Load every dump once.  Sections that are identical across dumps
+    # (which is most of them between neighbouring machine types) end up
+    # as one shared object, so that section checks can be memoized on
+    # object identity.
+    sections = {}
+    dumps = []
+    for f in files:
+        data = json.load(f)
+        f.close()
+        for sec in data:
+            key = json.dumps(data[sec], sort_keys=True)
+            data[sec] = sections.setdefault(key, data[sec])
+        dumps.append((f.name, data))
+    return dumps
+
+
+class SectionCache(object):
+    """Memoizes the output and taint of checking one section pair."""
+
+    def __init__(self):
+        self.results = {}
+
+    def check(self, sec, s, d):
+        global taint
+
+        key = (sec, id(s), id(d))
+        if key not in self.results:
+            saved_taint = taint
+            taint = 0
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                check_section(sec, s, d)
+            self.results[key] = (out.getvalue(), taint)
+            taint = saved_taint
+
+        text, count = self.results[key]
+        print(text, end='')
+        for i in range(count):
+            bump_taint()
+
 
-        for entry in s:
-            if not entry in d:
-                print("Section \"" + sec + "\": Entry \"" + entry + "\"", end=' ')
-                print("missing")
-                bump_taint()
-                continue
+matrix_dumps = []
+matrix_cache = SectionCache()
+
+def matrix_init(dumps):
+    global matrix_dumps
+
+    matrix_dumps = dumps
+
+
+def matrix_check(pair):
+    global taint
+
+    src_name, src_data = matrix_dumps[pair[0]]
+    dest_name, dest_data = matrix_dumps[pair[1]]
+    taint = 0
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        check_dumps(src_data, dest_data, matrix_cache.check)
+    return src_name, dest_name, out.getvalue(), taint
+
+
+def check_matrix(files, jobs):
+    dumps = load_dumps(files)
+    pairs = itertools.permutations(range(len(dumps)), 2)
+    failed = 0
+    with multiprocessing.Pool(jobs, matrix_init, (dumps,)) as pool:
+        for src_name, dest_name, text, count in \
+                pool.imap_unordered(matrix_check, pairs):
+            status = "ok" if count == 0 else "%d errors" % count
+            print("%s -> %s: %s" % (src_name, dest_name, status))
+            print(text, end='', flush=True)
+            if count:
+                failed += 1
+    return min(failed, 255)
+
+
+def main():
+    help_text = "Parse JSON-formatted vmstate dumps from QEMU in files SRC and DEST.  Checks whether migration from SRC to DEST QEMU versions would break based on the VMSTATE information contained within the JSON outputs.  The JSON output is created from a QEMU invocation with the -dump-vmstate parameter and a filename argument to it.  Other parameters to QEMU do not matter, except the -M (machine type) parameter.  With --matrix, every ordered pair of the given dumps is checked and the exit status is the number of incompatible pairs."
+
+    parser = argparse.ArgumentParser(description=help_text)
+    parser.add_argument('-s', '--src', type=argparse.FileType('r'),
+                        help='json dump from src qemu')
+    parser.add_argument('-d', '--dest', type=argparse.FileType('r'),
+                        help='json dump from dest qemu')
+    parser.add_argument('--reverse', required=False, default=False,
+                        action='store_true',
+                        help='reverse the direction')
+    parser.add_argument('-m', '--matrix', type=argparse.FileType('r'),
+                        nargs='+', metavar='DUMP',
+                        help='check migration between every pair of dumps')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='number of parallel checks in matrix mode')
+    args = parser.parse_args()
+
+    if args.matrix:
+        if args.src or args.dest:
+            parser.error("--matrix cannot be combined with --src/--dest")
+        return check_matrix(args.matrix, args.jobs)
+
+    if not args.src or not args.dest:
+        parser.error("--src and --dest are required")
+
+    src_data = json.load(args.src)
+    dest_data = json.load(args.dest)
+    args.src.close()
+    args.dest.close()
+
+    if args.reverse:
+        temp = src_data
+        src_data = dest_data
+        dest_data = temp
 
-            if entry == "Description":
-                check_descriptions(s[entry], d[entry], sec)
+    check_dumps(src_data, dest_data)
 
     return taint
 
@@ -64,11 +64,16 @@ typedef struct {
     } type;
 } DectreeEntry;
 
+/*
+ * A table is indexed by the bits at startbit, with those at startbit2
+ * (when width2 isn't zero) above them.
+ */
 typedef struct DectreeTable {
-    unsigned int (*lookup_function)(int startbit, int width, uint32_t opcode);
     unsigned int size;
     unsigned int startbit;
     unsigned int width;
+    unsigned int startbit2;
+    unsigned int width2;
     const DectreeEntry table[];
 } DectreeTable;
 
@@ -97,14 +102,18 @@ typedef struct DectreeTable {
 #undef TABLE_LINK
 #undef DECODE_NEW_TABLE
 #undef DECODE_SEPARATOR_BITS
+#undef DECODE_SEPARATOR_BITS2
 
-#define DECODE_SEPARATOR_BITS(START, WIDTH) NULL, START, WIDTH
-#define DECODE_NEW_TABLE_HELPER(TAG, SIZE, FN, START, WIDTH) \
+#define DECODE_SEPARATOR_BITS(START, WIDTH) START, WIDTH, 0, 0
+#define DECODE_SEPARATOR_BITS2(START, WIDTH, START2, WIDTH2) \
+    START, WIDTH, START2, WIDTH2
+#define DECODE_NEW_TABLE_HELPER(TAG, SIZE, START, WIDTH, START2, WIDTH2) \
     static const DectreeTable dectree_table_##TAG = { \
         .size = SIZE, \
-        .lookup_function = FN, \
         .startbit = START, \
         .width = WIDTH, \
+        .startbit2 = START2, \
+        .width2 = WIDTH2, \
         .table = {
 #define DECODE_NEW_TABLE(TAG, SIZE, WHATNOT) \
     DECODE_NEW_TABLE_HELPER(TAG, SIZE, WHATNOT)
@@ -142,9 +151,10 @@ typedef struct DectreeTable {
 #undef DECODE_NEW_TABLE
 #undef DECODE_NEW_TABLE_HELPER
 #undef DECODE_SEPARATOR_BITS
+#undef DECODE_SEPARATOR_BITS2
 
 static const DectreeTable dectree_table_DECODE_EXT_EXT_noext = {
-    .size = 1, .lookup_function = NULL, .startbit = 0, .width = 0,
+    .size = 1, .startbit = 0, .width = 0,
     .table = {
         { .type = DECTREE_ENTRY_INVALID, .opcode = XX_LAST_OPCODE },
     }
@@ -211,6 +221,7 @@ static const DecodeITableEntry decode_legacy_itable[XX_LAST_OPCODE] = {
 #undef TABLE_LINK
 #undef DECODE_NEW_TABLE
 #undef DECODE_SEPARATOR_BITS
+#undef DECODE_SEPARATOR_BITS2
 
 void decode_init(void)
 {
@@ -658,6 +669,18 @@ decode_op(Insn *insn, Opcode tag, uint32_t encoding)
 #undef TABLE_LINK
 #undef DECODE_NEW_TABLE
 #undef DECODE_SEPARATOR_BITS
+#undef DECODE_SEPARATOR_BITS2
+
+static unsigned int dectree_index(const DectreeTable *table,
+                                  uint32_t encoding)
+{
+    unsigned int i = extract32(encoding, table->startbit, table->width);
+    if (table->width2) {
+        i |= extract32(encoding, table->startbit2, table->width2) <<
+             table->width;
+    }
+    return i;
+}
 
 static unsigned int
 decode_subinsn_tablewalk(Insn *insn, const DectreeTable *table,
@@ -665,11 +688,7 @@ decode_subinsn_tablewalk(Insn *insn, const DectreeTable *table,
 {
     unsigned int i;
     Opcode opc;
-    if (table->lookup_function) {
-        i = table->lookup_function(table->startbit, table->width, encoding);
-    } else {
-        i = extract32(encoding, table->startbit, table->width);
-    }
+    i = dectree_index(table, encoding);
     if (table->table[i].type == DECTREE_TABLE_LINK) {
         return decode_subinsn_tablewalk(insn, table->table[i].table_link,
                                         encoding);
@@ -702,11 +721,7 @@ decode_insns_tablewalk(Insn *insn, const DectreeTable *table,
     unsigned int i;
     unsigned int a, b;
     Opcode opc;
-    if (table->lookup_function) {
-        i = table->lookup_function(table->startbit, table->width, encoding);
-    } else {
-        i = extract32(encoding, table->startbit, table->width);
-    }
+    i = dectree_index(table, encoding);
     if (table->table[i].type == DECTREE_TABLE_LINK) {
         return decode_insns_tablewalk(insn, table->table[i].table_link,
                                       encoding);
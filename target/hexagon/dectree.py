@@ -18,6 +18,7 @@
 ##
 
 import io
+import math
 import re
 
 import sys
@@ -80,79 +81,151 @@
 
 faketags |= set(subinsn_groupings.keys())
 
-def every_bit_counts(bitset):
-    for i in range(1, len(next(iter(bitset)))):
-        if len(set([bits[:i] + bits[i+1:] for bits in bitset])) == len(bitset):
-            return False
-    return True
+##
+##  Each node of the decode tree becomes a table, indexed by a separator of
+##  one field of the encoding, or of two fields with the first one in the
+##  low bits of the index.  The separator bits must have a fixed value in
+##  all encodings of the node, so that every encoding goes to one child.
+##
+##  We pick the separator that minimizes the total number of lookups to
+##  reach the encodings of the node.  That cost is only computed for the
+##  separators with the most entropy, that is the ones that split the
+##  encodings most evenly.  The separators tried are the single fields and
+##  the pairs of the best single fields, of at most max_separator_width
+##  bits and with at most half of the table left empty.
+##
+max_separator_width = 6
+max_separator_fields = 16
+max_separator_candidates = 2
 
-def auto_separate(node):
-    tags = node['leaves']
-    if len(tags) <= 1:
-        return
+def separator_key(tag, separator):
+    return ''.join([encs[tag][lsb:lsb+width] for (lsb, width) in separator])
+
+def separator_width(separator):
+    return sum([width for (lsb, width) in separator])
+
+def separator_entropy(tags, separator):
+    counts = {}
+    for tag in tags:
+        key = separator_key(tag, separator)
+        counts[key] = counts.get(key, 0) + 1
+    if len(counts) * 2 < 2 ** separator_width(separator):
+        return None
+    return sum([n * math.log2(len(tags) / n) for n in sorted(counts.values())])
+
+def separator_candidates(tags):
     enc_width = len(encs[next(iter(tags))])
-    opcode_bit_for_all = \
-        [all([encs[tag][i] in '01' \
-            for tag in tags]) for i in range(enc_width)]
-    opcode_bit_is_0_for_all = \
-        [opcode_bit_for_all[i] and all([encs[tag][i] == '0' \
-            for tag in tags]) for i in range(enc_width)]
-    opcode_bit_is_1_for_all = \
-        [opcode_bit_for_all[i] and all([encs[tag][i] == '1' \
-            for tag in tags]) for i in range(enc_width)]
     differentiator_opcode_bit = \
-        [opcode_bit_for_all[i] and \
-         not (opcode_bit_is_0_for_all[i] or \
-         opcode_bit_is_1_for_all[i]) \
+        [set([encs[tag][i] for tag in tags]) == set('01') \
             for i in range(enc_width)]
-    best_width = 0
-    for width in range(4, 0, -1):
+    fields = []
+    for width in range(1, max_separator_width + 1):
         for lsb in range(enc_width - width, -1, -1):
-            bitset = set([encs[tag][lsb:lsb+width] for tag in tags])
-            if all(differentiator_opcode_bit[lsb:lsb+width]) and \
-                (len(bitset) == len(tags) or every_bit_counts(bitset)):
-                best_width = width
-                best_lsb = lsb
-                caught_all_tags = len(bitset) == len(tags)
-                break
-        if best_width != 0:
-            break
-    if best_width == 0:
+            if all(differentiator_opcode_bit[lsb:lsb+width]):
+                entropy = separator_entropy(tags, [(lsb, width)])
+                if entropy is not None:
+                    fields.append((-entropy, width, -lsb))
+    fields = [(-lsb, width) for (entropy, width, lsb) in
+              sorted(fields)[:max_separator_fields]]
+    candidates = []
+    for separator in [[field] for field in fields] + \
+        [[f1, f2] for f1 in fields for f2 in fields \
+            if f1[0] + f1[1] < f2[0] and \
+               f1[1] + f2[1] <= max_separator_width]:
+        entropy = separator_entropy(tags, separator)
+        if entropy is not None:
+            candidates.append((-entropy, separator_width(separator),
+                               len(separator), separator))
+    if not candidates:
         raise Exception('Could not find a way to differentiate the encodings ' +
                          'of the following tags:\n{}'.format('\n'.join(tags)))
-    if caught_all_tags:
-        for width in range(1, best_width):
-            for lsb in range(enc_width - width, -1, -1):
-                bitset = set([encs[tag][lsb:lsb+width] for tag in tags])
-                if all(differentiator_opcode_bit[lsb:lsb+width]) and \
-                    len(bitset) == len(tags):
-                    best_width = width
-                    best_lsb = lsb
-                    break
-            else:
-                continue
-            break
-    node['separator_lsb'] = best_lsb
-    node['separator_width'] = best_width
+    return [separator for (entropy, width, n, separator) in
+            sorted(candidates)[:max_separator_candidates]]
+
+def separator_children(tags, separator):
+    children = {}
+    for tag in tags:
+        children.setdefault(separator_key(tag, separator), set()).add(tag)
+    return children
+
+separator_costs = {}
+
+def separator_cost(tags):
+    if len(tags) <= 1:
+        return (0, None)
+    tags = frozenset(tags)
+    if tags not in separator_costs:
+        for separator in separator_candidates(tags):
+            children = separator_children(tags, separator).values()
+            cost = len(tags) + sum([separator_cost(c)[0] for c in children])
+            if tags not in separator_costs or \
+                cost < separator_costs[tags][0]:
+                separator_costs[tags] = (cost, separator)
+    return separator_costs[tags]
+
+def auto_separate(node):
+    tags = node['leaves']
+    if len(tags) <= 1:
+        return
+    (cost, separator) = separator_cost(tags)
+    children = separator_children(tags, separator)
+    width = separator_width(separator)
+    node['separator'] = separator
     node['children'] = []
-    for value in range(2 ** best_width):
+    for value in range(2 ** width):
         child = {}
-        bits = ''.join(reversed('{:0{}b}'.format(value, best_width)))
-        child['leaves'] = \
-            set([tag for tag in tags \
-                if encs[tag][best_lsb:best_lsb+best_width] == bits])
+        bits = ''.join(reversed('{:0{}b}'.format(value, width)))
+        child['leaves'] = children.get(bits, set())
         node['children'].append(child)
     for child in node['children']:
         auto_separate(child)
 
-auto_separate(dectree_normal)
-auto_separate(dectree_16bit)
+##
+##  Check that every encoding of a tree reaches its tag, with its variable
+##  bits all clear and all set, and return the number of lookups for each
+##  of them.
+##
+def check_tree(tree):
+    lookups = []
+    for tag in tree['leaves']:
+        for fill in '01':
+            enc = re.sub(r'[^01]', fill, encs[tag])
+            node = tree
+            depth = 0
+            while len(node['leaves']) > 1:
+                key = ''.join([enc[lsb:lsb+width]
+                               for (lsb, width) in node['separator']])
+                node = node['children'][int(key[::-1], 2)]
+                depth += 1
+            if node['leaves'] != set([tag]):
+                raise Exception('Encoding {} of tag "{}" does not reach it!'.\
+                    format(enc[::-1], tag))
+            lookups.append(depth)
+    return lookups
+
+def count_tables(node):
+    if len(node['leaves']) <= 1:
+        return (0, 0)
+    tables = 1
+    entries = len(node['children'])
+    for child in node['children']:
+        (t, e) = count_tables(child)
+        tables += t
+        entries += e
+    return (tables, entries)
+
+dectrees = [('normal', dectree_normal), ('16bit', dectree_16bit)]
 if subinsn_groupings:
-    auto_separate(dectree_subinsn_groupings)
-for dectree_subinsn in dectree_subinsns.values():
-    auto_separate(dectree_subinsn)
-for dectree_ext in dectree_extensions.values():
-    auto_separate(dectree_ext)
+    dectrees.append(('subinsn_groupings', dectree_subinsn_groupings))
+for (name, dectree_subinsn) in sorted(dectree_subinsns.items()):
+    dectrees.append((name, dectree_subinsn))
+for (name, dectree_ext) in sorted(dectree_extensions.items()):
+    dectrees.append((name, dectree_ext))
+
+dectree_lookups = {}
+for (name, dectree) in dectrees:
+    auto_separate(dectree)
+    dectree_lookups[name] = check_tree(dectree)
 
 for tag in faketags:
     del encs[tag]
@@ -168,11 +241,11 @@ def table_name(parents, node):
         enc_width = len(encs[tag])
     determining_bits = ['_'] * enc_width
     for (parent, child) in zip(path[:-1], path[1:]):
-        lsb = parent['separator_lsb']
-        width = parent['separator_width']
         value = parent['children'].index(child)
-        determining_bits[lsb:lsb+width] = \
-            list(reversed('{:0{}b}'.format(value, width)))
+        for (lsb, width) in parent['separator']:
+            determining_bits[lsb:lsb+width] = \
+                list(reversed('{:0{}b}'.format(value % 2 ** width, width)))
+            value >>= width
     if tag in subinsn_groupings:
         name = 'DECODE_ROOT_EE'
     else:
@@ -191,10 +264,13 @@ def print_node(f, node, parents):
     if len(node['leaves']) <= 1:
         return
     name = table_name(parents, node)
-    lsb = node['separator_lsb']
-    width = node['separator_width']
-    print('DECODE_NEW_TABLE({},{},DECODE_SEPARATOR_BITS({},{}))'.\
-        format(name, 2 ** width, lsb, width), file=f)
+    size = 2 ** separator_width(node['separator'])
+    if len(node['separator']) == 1:
+        bits = 'DECODE_SEPARATOR_BITS({},{})'.format(*node['separator'][0])
+    else:
+        bits = 'DECODE_SEPARATOR_BITS2({},{},{},{})'.\
+            format(*(node['separator'][0] + node['separator'][1]))
+    print('DECODE_NEW_TABLE({},{},{})'.format(name, size, bits), file=f)
     for child in node['children']:
         if len(child['leaves']) == 0:
             print('INVALID()', file=f)
@@ -218,8 +294,7 @@ def print_node(f, node, parents):
         else:
             print('TABLE_LINK({})'.format(table_name(parents + [node], child)),
                   file=f)
-    print('DECODE_END_TABLE({},{},DECODE_SEPARATOR_BITS({},{}))'.\
-        format(name, 2 ** width, lsb, width), file=f)
+    print('DECODE_END_TABLE({},{},{})'.format(name, size, bits), file=f)
     print(file=f)
     parents.append(node)
     for child in node['children']:
@@ -337,7 +412,20 @@ def implicit_register_key(reg):
                     format(immno, imm_shift), file=f)
         print(')', file=f)
 
+def print_stats(f):
+    for (name, dectree) in dectrees:
+        lookups = dectree_lookups[name]
+        if not lookups:
+            continue
+        (tables, entries) = count_tables(dectree)
+        print('{}: {} tables, {} entries, lookups per encoding: '
+              'mean {:.2f}, max {}'.format(name, tables, entries,
+              sum(lookups) / len(lookups), max(lookups)), file=f)
+
 if __name__ == '__main__':
+    if sys.argv[1] == '--stats':
+        print_stats(sys.stderr)
+        del sys.argv[1]
     with open(sys.argv[1], 'w') as f:
         print_tree(f, dectree_normal)
         print_tree(f, dectree_16bit)
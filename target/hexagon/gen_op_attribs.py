@@ -23,14 +23,13 @@
 import hex_common
 
 def main():
-    hex_common.read_semantics_file(sys.argv[1])
-    hex_common.read_attribs_file(sys.argv[2])
+    hex_common.read_semantics_db(sys.argv[1])
     hex_common.calculate_attribs()
 
     ##
     ##     Generate all the attributes associated with each instruction
     ##
-    with open(sys.argv[3], 'w') as f:
+    with open(sys.argv[2], 'w') as f:
         for tag in hex_common.tags:
             f.write('OP_ATTRIB(%s,ATTRIBS(%s))\n' % \
                 (tag, ','.join(sorted(hex_common.attribdict[tag]))))
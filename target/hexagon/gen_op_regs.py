@@ -61,12 +61,11 @@ def strip_reg_prefix(x):
     return y.replace('GREG.','')
 
 def main():
-    hex_common.read_semantics_file(sys.argv[1])
-    hex_common.read_attribs_file(sys.argv[2])
+    hex_common.read_semantics_db(sys.argv[1])
     tagregs = hex_common.get_tagregs()
     tagimms = hex_common.get_tagimms()
 
-    with open(sys.argv[3], 'w') as f:
+    with open(sys.argv[2], 'w') as f:
         for tag in hex_common.tags:
             regs = tagregs[tag]
             rregs = []
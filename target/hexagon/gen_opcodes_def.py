@@ -23,12 +23,12 @@
 import hex_common
 
 def main():
-    hex_common.read_semantics_file(sys.argv[1])
+    hex_common.read_semantics_db(sys.argv[1])
 
     ##
     ##     Generate a list of all the opcodes
     ##
-    with open(sys.argv[3], 'w') as f:
+    with open(sys.argv[2], 'w') as f:
         for tag in hex_common.tags:
             f.write ( "OPCODE(%s),\n" % (tag) )
 
@@ -93,12 +93,11 @@ def spacify(s):
     return ''.join(out)
 
 def main():
-    hex_common.read_semantics_file(sys.argv[1])
-    hex_common.read_attribs_file(sys.argv[2])
+    hex_common.read_semantics_db(sys.argv[1])
 
     immext_casere = re.compile(r'IMMEXT\(([A-Za-z])')
 
-    with open(sys.argv[3], 'w') as f:
+    with open(sys.argv[2], 'w') as f:
         for tag in hex_common.tags:
             if not hex_common.behdict[tag]: continue
             extendable_upper_imm = False
@@ -26,13 +26,12 @@ def gen_shortcode(f, tag):
     f.write('DEF_SHORTCODE(%s, %s)\n' % (tag, hex_common.semdict[tag]))
 
 def main():
-    hex_common.read_semantics_file(sys.argv[1])
-    hex_common.read_attribs_file(sys.argv[2])
+    hex_common.read_semantics_db(sys.argv[1])
     hex_common.calculate_attribs()
     tagregs = hex_common.get_tagregs()
     tagimms = hex_common.get_tagimms()
 
-    with open(sys.argv[3], 'w') as f:
+    with open(sys.argv[2], 'w') as f:
         f.write("#ifndef DEF_SHORTCODE\n")
         f.write("#define DEF_SHORTCODE(TAG,SHORTCODE)    /* Nothing */\n")
         f.write("#endif\n")
@@ -20,6 +20,7 @@
 import sys
 import re
 import string
+import pickle
 
 behdict = {}          # tag ->behavior
 semdict = {}          # tag -> semantics
@@ -28,6 +29,7 @@
 attribinfo = {}       # Register information and misc
 tags = []             # list of all tags
 overrides = {}        # tags with helper overrides
+calculated = None     # tag -> attributes after calculate_attribs()
 
 # We should do this as a hash for performance,
 # but to keep order let's keep it as a list.
@@ -67,6 +69,12 @@ def add_qemu_macro_attrib(name, attrib):
 
 immextre = re.compile(r'f(MUST_)?IMMEXT[(]([UuSsRr])')
 def calculate_attribs():
+    # The semantics database already has the result
+    if calculated is not None:
+        for tag in tags:
+            attribdict[tag] = set(calculated[tag])
+        return
+
     add_qemu_macro_attrib('fREAD_PC', 'A_IMPLICIT_READS_PC')
     add_qemu_macro_attrib('fTRAP', 'A_IMPLICIT_READS_PC')
     add_qemu_macro_attrib('fWRITE_P0', 'A_WRITES_PRED_REG')
@@ -232,3 +240,37 @@ def read_overrides_file(name):
             continue
         tag = overridere.findall(line)[0]
         overrides[tag] = True
+
+##
+##  The semantics database holds the contents of the semantics, attribs
+##  and overrides files, so that the generators do not parse them again.
+##  It is written by gen_semantics_db.py with write_semantics_db and read
+##  with read_semantics_db, and has the attributes of every tag both as
+##  read and as computed by calculate_attribs.
+##
+def write_semantics_db(name):
+    raw = dict((tag, set(attribdict[tag])) for tag in tags)
+    calculate_attribs()
+    db = {
+        'behdict': behdict,
+        'semdict': semdict,
+        'attribdict': raw,
+        'calculated': attribdict,
+        'attribinfo': attribinfo,
+        'tags': tags,
+        'overrides': overrides,
+    }
+    with open(name, 'wb') as f:
+        pickle.dump(db, f, pickle.HIGHEST_PROTOCOL)
+
+def read_semantics_db(name):
+    global calculated
+    with open(name, 'rb') as f:
+        db = pickle.load(f)
+    behdict.update(db['behdict'])
+    semdict.update(db['semdict'])
+    attribdict.update(db['attribdict'])
+    attribinfo.update(db['attribinfo'])
+    tags.extend(db['tags'])
+    overrides.update(db['overrides'])
+    calculated = db['calculated']
@@ -18,6 +18,15 @@ done
 for i in succ_*.decode; do
     if ! $PYTHON $DECODETREE $i > /dev/null 2> /dev/null; then
         echo FAIL:$i 1>&2
+        E=1
+    fi
+done
+
+# These should produce tables too
+for i in succ_*.decode; do
+    if ! $PYTHON $DECODETREE --tables $i > /dev/null 2> /dev/null; then
+        echo FAIL: --tables $i 1>&2
+        E=1
     fi
 done
 
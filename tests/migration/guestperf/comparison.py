@@ -121,4 +121,45 @@ def __init__(self, name, scenarios):
         Scenario("compr-xbzrle-cache-50",
                  compression_xbzrle=True, compression_xbzrle_cache=50),
     ]),
+
+
+    # Looking at effect of the size of the guest's writable
+    # working set
+    Comparison("working-set", scenarios = [
+        Scenario("working-set-10",
+                 working_set=10),
+        Scenario("working-set-25",
+                 working_set=25),
+        Scenario("working-set-50",
+                 working_set=50),
+        Scenario("working-set-100",
+                 working_set=100),
+    ]),
+
+
+    # Looking at effect of skewed page writes on strategies
+    # for ensuring completion
+    Comparison("zipf", scenarios = [
+        Scenario("zipf-0.99",
+                 zipf=0.99),
+        Scenario("zipf-0.99-auto-converge",
+                 zipf=0.99, auto_converge=True),
+        Scenario("zipf-0.99-post-copy",
+                 zipf=0.99, post_copy=True),
+        Scenario("zipf-0.99-xbzrle",
+                 zipf=0.99, compression_xbzrle=True),
+    ]),
+
+
+    # Looking at effect of guest write rate
+    Comparison("write-rate", scenarios = [
+        Scenario("write-rate-100mbs",
+                 write_rate=100),
+        Scenario("write-rate-500mbs",
+                 write_rate=500),
+        Scenario("write-rate-1000mbs",
+                 write_rate=1000),
+        Scenario("write-rate-unlimited",
+                 write_rate=0),
+    ]),
 ]
@@ -0,0 +1,233 @@
+#
+# Migration test convergence prediction
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, see <http://www.gnu.org/licenses/>.
+#
+
+import statistics
+
+
+# Page size the dirty page rate is counted in
+PAGE_SIZE = 4096
+
+# A pass is taken to have hit the working set when it dirtied this much
+# less than the dirty rate alone would have
+WORKING_SET_SLACK = 0.8
+
+# Give up simulating passes when no iteration limit is given
+MAX_PASSES = 1000
+
+
+class Prediction(object):
+
+    def __init__(self, converges, iterations, time, downtime):
+
+        self._converges = converges
+        self._iterations = iterations
+        self._time = time # seconds, including downtime
+        self._downtime = downtime # seconds
+
+    def serialize(self):
+        return {
+            "converges": self._converges,
+            "iterations": self._iterations,
+            "time": self._time,
+            "downtime": self._downtime,
+        }
+
+
+class ConvergenceModel(object):
+    """
+    Model of pre-copy RAM migration: each pass sends what was dirtied
+    during the previous one, at the migration bandwidth. The guest dirties
+    memory at a constant rate, but can't dirty more than its writable
+    working set. Migration completes once what is left can be sent within
+    the downtime limit.
+    """
+
+    def __init__(self, total_bytes, dirty_rate, bandwidth, working_set):
+
+        self._total_bytes = total_bytes
+        self._dirty_rate = dirty_rate # bytes per second
+        self._bandwidth = bandwidth # bytes per second
+        self._working_set = working_set # bytes
+
+    @classmethod
+    def fit(cls, progress_history, passes=None):
+        """
+        Fit the model to the progress history of a migration, which has an
+        entry at the start of every pass over RAM. If passes is set, only
+        the first passes are used, as when predicting the outcome of a
+        migration that is still running.
+        """
+        history = [progress for progress in progress_history
+                   if progress._status == "active"]
+        if passes is not None:
+            history = history[:passes]
+        if len(history) == 0:
+            raise Exception("No migration passes to fit the model to")
+
+        rates = [progress._ram._transfer_rate_mbs for progress in history
+                 if progress._ram._transfer_rate_mbs > 0]
+        if len(rates) == 0:
+            raise Exception("No transfer rate in migration passes")
+        # QEMU reports the transfer rate in megabits per second
+        bandwidth = statistics.median(rates) * 1000 * 1000 / 8
+
+        dirty_rates = [progress._ram._dirty_rate_pps for progress in history
+                       if progress._ram._dirty_rate_pps > 0]
+        dirty_rate = (statistics.median(dirty_rates) * PAGE_SIZE
+                      if dirty_rates else 0)
+
+        total_bytes = history[0]._ram._total_bytes
+
+        # Passes that dirtied clearly less than the dirty rate allows ran
+        # into the working set, so their size is a sample of it
+        working_set = None
+        for previous, progress in zip(history, history[1:]):
+            expected = (dirty_rate * previous._ram._remaining_bytes /
+                        bandwidth)
+            dirtied = progress._ram._remaining_bytes
+            if dirtied < expected * WORKING_SET_SLACK:
+                working_set = max(working_set or 0, dirtied)
+        if working_set is None or working_set > total_bytes:
+            working_set = total_bytes
+
+        return cls(total_bytes, dirty_rate, bandwidth, working_set)
+
+    def steady_state(self, bandwidth=None):
+        """
+        Return the number of bytes left to send after an unlimited
+        number of passes.
+        """
+        bandwidth = bandwidth or self._bandwidth
+        if self._dirty_rate < bandwidth:
+            return 0
+        return self._working_set
+
+    def converges(self, bandwidth=None, downtime=0.3):
+        """
+        Return whether migration converges at all, given enough passes,
+        at bandwidth bytes per second with a downtime limit in seconds.
+        """
+        bandwidth = bandwidth or self._bandwidth
+        return self.steady_state(bandwidth) <= bandwidth * downtime
+
+    def predict(self, bandwidth=None, downtime=0.3,
+                max_iters=None, max_time=None):
+        """
+        Simulate migration passes at bandwidth bytes per second with a
+        downtime limit in seconds, until it completes or runs out of
+        iterations or time.
+        """
+        bandwidth = bandwidth or self._bandwidth
+        remaining = self._total_bytes
+        elapsed = 0.0
+        iteration = 1
+        while True:
+            pass_time = remaining / bandwidth
+            if pass_time <= downtime:
+                return Prediction(True, iteration, elapsed + pass_time,
+                                  pass_time)
+            if ((max_iters is not None and iteration >= max_iters) or
+                (max_time is not None and elapsed + pass_time > max_time) or
+                iteration >= MAX_PASSES):
+                return Prediction(False, iteration, elapsed + pass_time,
+                                  pass_time)
+
+            elapsed += pass_time
+            iteration += 1
+            dirtied = min(self._working_set, self._dirty_rate * pass_time)
+            if dirtied >= remaining and max_iters is None and max_time is None:
+                # Passes won't get any shorter
+                return Prediction(False, iteration, float("inf"),
+                                  dirtied / bandwidth)
+            remaining = dirtied
+
+    def serialize(self):
+        return {
+            "total_bytes": self._total_bytes,
+            "dirty_rate": self._dirty_rate,
+            "bandwidth": self._bandwidth,
+            "working_set": self._working_set,
+        }
+
+
+def predict_report(report, passes=2):
+    """
+    Predict the outcome of the migration of report from its first passes
+    and the scenario limits.
+
+    Returns None for scenarios the model doesn't cover: the ones forcing
+    completion by pausing the guest or switching to post-copy, and the
+    ones throttling the guest.
+    """
+    scenario = report._scenario
+    if scenario._pause or scenario._post_copy or scenario._auto_converge:
+        return None
+
+    model = ConvergenceModel.fit(report._progress_history, passes)
+    bandwidth = min(model._bandwidth, scenario._bandwidth * 1024 * 1024)
+    return model.predict(bandwidth,
+                         scenario._downtime / 1000.0,
+                         scenario._max_iters,
+                         scenario._max_time)
+
+
+def evaluate(reports, passes=2):
+    """
+    Compare the predictions made from the first passes of each report
+    with its actual outcome.
+
+    Returns:
+    (list): (report, prediction, converged, time) for each report the
+            model covers, time being the actual duration in seconds
+    """
+    results = []
+    for report in reports:
+        history = report._progress_history
+        if len(history) == 0:
+            continue
+        try:
+            prediction = predict_report(report, passes)
+        except Exception:
+            continue
+        if prediction is None:
+            continue
+        final = history[-1]
+        results.append((report, prediction,
+                        final._status == "completed",
+                        final._duration / 1000.0))
+    return results
+
+
+def accuracy(results):
+    """
+    Summarize evaluate() results.
+
+    Returns:
+    (float): Share of reports whose convergence was predicted correctly
+    (float): Median relative error of the predicted duration of the
+             reports that converged as predicted, or None
+    """
+    if len(results) == 0:
+        return None, None
+    correct = [(prediction, time)
+               for _, prediction, converged, time in results
+               if prediction._converges == converged]
+    errors = [abs(prediction._time - time) / time
+              for prediction, time in correct
+              if prediction._converges and time > 0]
+    return (len(correct) / len(results),
+            statistics.median(errors) if errors else None)
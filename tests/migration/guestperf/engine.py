@@ -25,6 +25,7 @@
 
 from guestperf.progress import Progress, ProgressStats
 from guestperf.report import Report
+from guestperf.sampler import CPUSampler
 from guestperf.timings import TimingRecord, Timings
 
 sys.path.append(os.path.join(os.path.dirname(__file__),
@@ -35,48 +36,23 @@
 class Engine(object):
 
     def __init__(self, binary, dst_host, kernel, initrd, transport="tcp",
-                 sleep=15, verbose=False, debug=False):
+                 sleep=15, verbose=False, debug=False, sample_interval=50,
+                 port=9000):
 
         self._binary = binary # Path to QEMU binary
         self._dst_host = dst_host # Hostname of target host
         self._kernel = kernel # Path to kernel image
         self._initrd = initrd # Path to stress initrd
         self._transport = transport # 'unix' or 'tcp' or 'rdma'
+        self._port = port # Migration port, the dst monitor uses port + 1
         self._sleep = sleep
+        self._sample_interval = sample_interval # milliseconds
         self._verbose = verbose
         self._debug = debug
 
         if debug:
             self._verbose = debug
 
-    def _vcpu_timing(self, pid, tid_list):
-        records = []
-        now = time.time()
-
-        jiffies_per_sec = os.sysconf(os.sysconf_names['SC_CLK_TCK'])
-        for tid in tid_list:
-            statfile = "/proc/%d/task/%d/stat" % (pid, tid)
-            with open(statfile, "r") as fh:
-                stat = fh.readline()
-                fields = stat.split(" ")
-                stime = int(fields[13])
-                utime = int(fields[14])
-                records.append(TimingRecord(tid, now, 1000 * (stime + utime) / jiffies_per_sec))
-        return records
-
-    def _cpu_timing(self, pid):
-        records = []
-        now = time.time()
-
-        jiffies_per_sec = os.sysconf(os.sysconf_names['SC_CLK_TCK'])
-        statfile = "/proc/%d/stat" % pid
-        with open(statfile, "r") as fh:
-            stat = fh.readline()
-            fields = stat.split(" ")
-            stime = int(fields[13])
-            utime = int(fields[14])
-            return TimingRecord(pid, now, 1000 * (stime + utime) / jiffies_per_sec)
-
     def _migrate_progress(self, vm):
         info = vm.command("query-migrate")
 
@@ -105,9 +81,30 @@ def _migrate_progress(self, vm):
             info.get("x-cpu-throttle-percentage", 0),
         )
 
+    def _sleep_until(self, secs, since):
+        # Sleep until secs after since, less whatever time was already
+        # spent since then.
+        remaining = since + secs - time.time()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def _wait_migration_pass(self, vm, since):
+        # Return early when a new pass over RAM starts, so that pass
+        # boundaries are seen without waiting for the next poll.  The
+        # events are polled without blocking: a read that times out
+        # would leave the QMP socket unusable.
+        interval = self._sample_interval / 1000.0
+        while True:
+            events = vm.get_qmp_events(wait=False)
+            if any(event["event"] == "MIGRATION_PASS" for event in events):
+                return
+            remaining = since + interval - time.time()
+            if remaining <= 0:
+                return
+            time.sleep(min(interval / 10, remaining))
+
     def _migrate(self, hardware, scenario, src, dst, connect_uri):
-        src_qemu_time = []
-        src_vcpu_time = []
+        started = time.time()
         src_pid = src.get_pid()
 
         vcpus = src.command("query-cpus-fast")
@@ -117,17 +114,31 @@ def _migrate(self, hardware, scenario, src, dst, connect_uri):
 
         # XXX how to get dst timings on remote host ?
 
+        sampler = CPUSampler(src_pid, src_threads,
+                             self._sample_interval / 1000.0)
+        sampler.start()
+        try:
+            progress_history = self._migrate_sampled(hardware, scenario,
+                                                     src, dst, connect_uri,
+                                                     started)
+        finally:
+            sampler.stop()
+
+        return [progress_history, sampler.qemu_timings, sampler.vcpu_timings]
+
+    def _migrate_sampled(self, hardware, scenario, src, dst, connect_uri,
+                         started):
         if self._verbose:
             print("Sleeping %d seconds for initial guest workload run" % self._sleep)
-        sleep_secs = self._sleep
-        while sleep_secs > 1:
-            src_qemu_time.append(self._cpu_timing(src_pid))
-            src_vcpu_time.extend(self._vcpu_timing(src_pid, src_threads))
-            time.sleep(1)
-            sleep_secs -= 1
+        self._sleep_until(self._sleep, started)
 
         if self._verbose:
             print("Starting migration")
+        resp = src.command("migrate-set-capabilities",
+                           capabilities = [
+                               { "capability": "events",
+                                 "state": True }
+                           ])
         if scenario._auto_converge:
             resp = src.command("migrate-set-capabilities",
                                capabilities = [
@@ -196,15 +207,13 @@ def _migrate(self, hardware, scenario, src, dst, connect_uri):
         progress_history = []
 
         start = time.time()
-        loop = 0
+        last_report = start
+        last_poll = start
         while True:
-            loop = loop + 1
-            time.sleep(0.05)
+            self._wait_migration_pass(src, last_poll)
+            last_poll = time.time()
 
             progress = self._migrate_progress(src)
-            if (loop % 20) == 0:
-                src_qemu_time.append(self._cpu_timing(src_pid))
-                src_vcpu_time.extend(self._vcpu_timing(src_pid, src_threads))
 
             if (len(progress_history) == 0 or
                 (progress_history[-1]._ram._iterations <
@@ -220,16 +229,12 @@ def _migrate(self, hardware, scenario, src, dst, connect_uri):
                 if progress._status == "completed":
                     if self._verbose:
                         print("Sleeping %d seconds for final guest workload run" % self._sleep)
-                    sleep_secs = self._sleep
-                    while sleep_secs > 1:
-                        time.sleep(1)
-                        src_qemu_time.append(self._cpu_timing(src_pid))
-                        src_vcpu_time.extend(self._vcpu_timing(src_pid, src_threads))
-                        sleep_secs -= 1
+                    self._sleep_until(self._sleep, progress._now)
 
-                return [progress_history, src_qemu_time, src_vcpu_time]
+                return progress_history
 
-            if self._verbose and (loop % 20) == 0:
+            if self._verbose and progress._now - last_report >= 1:
+                last_report = progress._now
                 print("Iter %d: remain %5dMB of %5dMB (total %5dMB @ %5dMb/sec)" % (
                     progress._ram._iterations,
                     progress._ram._remaining_bytes / (1024 * 1024),
@@ -266,7 +271,7 @@ def _migrate(self, hardware, scenario, src, dst, connect_uri):
                 resp = src.command("stop")
                 paused = True
 
-    def _get_common_args(self, hardware, tunnelled=False):
+    def _get_common_args(self, hardware, scenario, tunnelled=False):
         args = [
             "noapic",
             "edd=off",
@@ -282,6 +287,11 @@ def _get_common_args(self, hardware, tunnelled=False):
             args.append("quiet")
 
         args.append("ramsize=%s" % hardware._mem)
+        args.append("workingset=%d" % (hardware._mem * 1024 *
+                                       scenario._working_set / 100))
+        args.append("zipf=%g" % scenario._zipf)
+        args.append("writerate=%d" % scenario._write_rate)
+        args.append("threads=%d" % scenario._threads)
 
         cmdline = " ".join(args)
         if tunnelled:
@@ -312,14 +322,14 @@ def _get_common_args(self, hardware, tunnelled=False):
 
         return argv
 
-    def _get_src_args(self, hardware):
-        return self._get_common_args(hardware)
+    def _get_src_args(self, hardware, scenario):
+        return self._get_common_args(hardware, scenario)
 
-    def _get_dst_args(self, hardware, uri):
+    def _get_dst_args(self, hardware, scenario, uri):
         tunnelled = False
         if self._dst_host != "localhost":
             tunnelled = True
-        argv = self._get_common_args(hardware, tunnelled)
+        argv = self._get_common_args(hardware, scenario, tunnelled)
         return argv + ["-incoming", uri]
 
     @staticmethod
@@ -341,7 +351,7 @@ def _get_dst_wrapper(self, hardware):
         wrapper = self._get_common_wrapper(hardware._dst_cpu_bind, hardware._dst_mem_bind)
         if self._dst_host != "localhost":
             return ["ssh",
-                    "-R", "9001:localhost:9001",
+                    "-R", "%d:localhost:%d" % (self._port + 1, self._port + 1),
                     self._dst_host] + wrapper
         else:
             return wrapper
@@ -368,9 +378,9 @@ def run(self, hardware, scenario, result_dir=os.getcwd()):
         abs_result_dir = os.path.join(result_dir, scenario._name)
 
         if self._transport == "tcp":
-            uri = "tcp:%s:9000" % self._dst_host
+            uri = "tcp:%s:%d" % (self._dst_host, self._port)
         elif self._transport == "rdma":
-            uri = "rdma:%s:9000" % self._dst_host
+            uri = "rdma:%s:%d" % (self._dst_host, self._port)
         elif self._transport == "unix":
             if self._dst_host != "localhost":
                 raise Exception("Running use unix migration transport for non-local host")
@@ -382,19 +392,19 @@ def run(self, hardware, scenario, result_dir=os.getcwd()):
                 pass
 
         if self._dst_host != "localhost":
-            dstmonaddr = ("localhost", 9001)
+            dstmonaddr = ("localhost", self._port + 1)
         else:
             dstmonaddr = "/var/tmp/qemu-dst-%d-monitor.sock" % os.getpid()
         srcmonaddr = "/var/tmp/qemu-src-%d-monitor.sock" % os.getpid()
 
         src = QEMUMachine(self._binary,
-                          args=self._get_src_args(hardware),
+                          args=self._get_src_args(hardware, scenario),
                           wrapper=self._get_src_wrapper(hardware),
                           name="qemu-src-%d" % os.getpid(),
                           monitor_address=srcmonaddr)
 
         dst = QEMUMachine(self._binary,
-                          args=self._get_dst_args(hardware, uri),
+                          args=self._get_dst_args(hardware, scenario, uri),
                           wrapper=self._get_dst_wrapper(hardware),
                           name="qemu-dst-%d" % os.getpid(),
                           monitor_address=dstmonaddr)
@@ -424,10 +434,11 @@ def run(self, hardware, scenario, result_dir=os.getcwd()):
 
             return Report(hardware, scenario, progress_history,
                           Timings(self._get_timings(src) + self._get_timings(dst)),
-                          Timings(qemu_timings),
-                          Timings(vcpu_timings),
+                          qemu_timings,
+                          vcpu_timings,
                           self._binary, self._dst_host, self._kernel,
-                          self._initrd, self._transport, self._sleep)
+                          self._initrd, self._transport, self._sleep,
+                          self._sample_interval)
         except Exception as e:
             if self._debug:
                 print("Failed: %s" % str(e))
@@ -18,6 +18,59 @@
 #
 
 import sys
+from bisect import bisect_left
+
+
+def _split_threads(tids, timestamps, values):
+    threads = {}
+    for tid, timestamp, value in zip(tids, timestamps, values):
+        if tid not in threads:
+            threads[tid] = ([], [])
+        threads[tid][0].append(timestamp)
+        threads[tid][1].append(value)
+    return threads
+
+
+def _utilization(timestamps, values, limit=None):
+    # Turn cumulative CPU time samples (in milliseconds) into the CPU
+    # utilization over each sampling interval, skipping samples taken
+    # at the same time as the previous one.
+    xaxis = []
+    yaxis = []
+    if len(timestamps) == 0:
+        return xaxis, yaxis
+    oldtime = timestamps[0]
+    oldvalue = values[0]
+    for timestamp, value in zip(timestamps[1:], values[1:]):
+        timedelta = timestamp - oldtime
+        if timedelta == 0:
+            continue
+        util = (value - oldvalue) / 1000.0 / timedelta * 100.0
+        if limit is not None and util > limit:
+            util = limit
+        oldtime = timestamp
+        oldvalue = value
+        xaxis.append(timestamp)
+        yaxis.append(util)
+    return xaxis, yaxis
+
+
+def _downsample(values, max_points):
+    # Return the indexes of at most about max_points values to plot.
+    # Long series are cut into buckets and only the lowest and highest
+    # value of each bucket is kept, so that spikes remain visible.
+    if max_points <= 0 or len(values) <= max_points:
+        return range(len(values))
+    buckets = max(max_points // 2, 1)
+    keep = []
+    start = 0
+    for bucket in range(1, buckets + 1):
+        end = len(values) * bucket // buckets
+        low = min(range(start, end), key=values.__getitem__)
+        high = max(range(start, end), key=values.__getitem__)
+        keep.extend(sorted({low, high}))
+        start = end
+    return keep
 
 
 class Plot(object):
@@ -51,7 +104,8 @@ def __init__(self,
                  total_guest_cpu,
                  split_guest_cpu,
                  qemu_cpu,
-                 vcpu_cpu):
+                 vcpu_cpu,
+                 max_points=2000):
 
         self._reports = reports
         self._migration_iters = migration_iters
@@ -59,6 +113,7 @@ def __init__(self,
         self._split_guest_cpu = split_guest_cpu
         self._qemu_cpu = qemu_cpu
         self._vcpu_cpu = vcpu_cpu
+        self._max_points = max_points
         self._color_idx = 0
 
     def _next_color(self):
@@ -80,64 +135,38 @@ def _get_progress_label(self, progress):
                 ["Status: %s" % "none",
                  "Iteration: %d" % 0])
 
+    def _get_progress_labels(self, report, timestamps):
+        # Label each sample with the last progress seen before it
+        history = report._progress_history
+        nows = [progress._now for progress in history]
+        labels = [self._get_progress_label(None)]
+        labels.extend([self._get_progress_label(progress)
+                       for progress in history])
+        return [labels[bisect_left(nows, timestamp)]
+                for timestamp in timestamps]
+
     def _find_start_time(self, report):
-        startqemu = report._qemu_timings._records[0]._timestamp
-        startguest = report._guest_timings._records[0]._timestamp
-        if startqemu < startguest:
-            return startqemu
-        else:
-            return stasrtguest
+        startqemu = report._qemu_timings.columns()[1][0]
+        startguest = report._guest_timings.columns()[1][0]
+        return min(startqemu, startguest)
 
     def _get_guest_max_value(self, report):
-        maxvalue = 0
-        for record in report._guest_timings._records:
-            if record._value > maxvalue:
-                maxvalue = record._value
-        return maxvalue
+        return max(report._guest_timings.columns()[2], default=0)
 
     def _get_qemu_max_value(self, report):
-        maxvalue = 0
-        oldvalue = None
-        oldtime = None
-        for record in report._qemu_timings._records:
-            if oldvalue is not None:
-                cpudelta = (record._value - oldvalue) / 1000.0
-                timedelta = record._timestamp - oldtime
-                if timedelta == 0:
-                    continue
-                util = cpudelta / timedelta * 100.0
-            else:
-                util = 0
-            oldvalue = record._value
-            oldtime = record._timestamp
-
-            if util > maxvalue:
-                maxvalue = util
-        return maxvalue
+        _, timestamps, values = report._qemu_timings.columns()
+        return max(_utilization(timestamps, values)[1], default=0)
 
-    def _get_total_guest_cpu_graph(self, report, starttime):
-        xaxis = []
-        yaxis = []
-        labels = []
-        progress_idx = -1
-        for record in report._guest_timings._records:
-            while ((progress_idx + 1) < len(report._progress_history) and
-                   report._progress_history[progress_idx + 1]._now < record._timestamp):
-                progress_idx = progress_idx + 1
-
-            if progress_idx >= 0:
-                progress = report._progress_history[progress_idx]
-            else:
-                progress = None
-
-            xaxis.append(record._timestamp - starttime)
-            yaxis.append(record._value)
-            labels.append(self._get_progress_label(progress))
+    def _get_graph(self, report, starttime, timestamps, values, name,
+                   yaxis="y"):
+        keep = _downsample(values, self._max_points)
+        timestamps = [timestamps[i] for i in keep]
 
         from plotly import graph_objs as go
-        return go.Scatter(x=xaxis,
-                          y=yaxis,
-                          name="Guest PIDs: %s" % report._scenario._name,
+        return go.Scatter(x=[timestamp - starttime for timestamp in timestamps],
+                          y=[values[i] for i in keep],
+                          yaxis=yaxis,
+                          name=name,
                           mode='lines',
                           line={
                               "dash": "solid",
@@ -145,50 +174,20 @@ def _get_total_guest_cpu_graph(self, report, starttime):
                               "shape": "linear",
                               "width": 1
                           },
-                          text=labels)
-
-    def _get_split_guest_cpu_graphs(self, report, starttime):
-        threads = {}
-        for record in report._guest_timings._records:
-            if record._tid in threads:
-                continue
-            threads[record._tid] = {
-                "xaxis": [],
-                "yaxis": [],
-                "labels": [],
-            }
-
-        progress_idx = -1
-        for record in report._guest_timings._records:
-            while ((progress_idx + 1) < len(report._progress_history) and
-                   report._progress_history[progress_idx + 1]._now < record._timestamp):
-                progress_idx = progress_idx + 1
-
-            if progress_idx >= 0:
-                progress = report._progress_history[progress_idx]
-            else:
-                progress = None
-
-            threads[record._tid]["xaxis"].append(record._timestamp - starttime)
-            threads[record._tid]["yaxis"].append(record._value)
-            threads[record._tid]["labels"].append(self._get_progress_label(progress))
+                          text=self._get_progress_labels(report, timestamps))
 
+    def _get_total_guest_cpu_graph(self, report, starttime):
+        _, timestamps, values = report._guest_timings.columns()
+        return self._get_graph(report, starttime, timestamps, values,
+                               "Guest PIDs: %s" % report._scenario._name)
 
+    def _get_split_guest_cpu_graphs(self, report, starttime):
         graphs = []
-        from plotly import graph_objs as go
-        for tid in threads.keys():
-            graphs.append(
-                go.Scatter(x=threads[tid]["xaxis"],
-                           y=threads[tid]["yaxis"],
-                           name="PID %s: %s" % (tid, report._scenario._name),
-                           mode="lines",
-                           line={
-                               "dash": "solid",
-                               "color": self._next_color(),
-                               "shape": "linear",
-                               "width": 1
-                           },
-                           text=threads[tid]["labels"]))
+        for tid, (timestamps, values) in _split_threads(
+                *report._guest_timings.columns()).items():
+            graphs.append(self._get_graph(
+                report, starttime, timestamps, values,
+                "PID %s: %s" % (tid, report._scenario._name)))
         return graphs
 
     def _get_migration_iters_graph(self, report, starttime):
@@ -213,114 +212,21 @@ def _get_migration_iters_graph(self, report, starttime):
                           })
 
     def _get_qemu_cpu_graph(self, report, starttime):
-        xaxis = []
-        yaxis = []
-        labels = []
-        progress_idx = -1
-
-        first = report._qemu_timings._records[0]
-        abstimestamps = [first._timestamp]
-        absvalues = [first._value]
-
-        for record in report._qemu_timings._records[1:]:
-            while ((progress_idx + 1) < len(report._progress_history) and
-                   report._progress_history[progress_idx + 1]._now < record._timestamp):
-                progress_idx = progress_idx + 1
-
-            if progress_idx >= 0:
-                progress = report._progress_history[progress_idx]
-            else:
-                progress = None
-
-            oldvalue = absvalues[-1]
-            oldtime = abstimestamps[-1]
-
-            cpudelta = (record._value - oldvalue) / 1000.0
-            timedelta = record._timestamp - oldtime
-            if timedelta == 0:
-                continue
-            util = cpudelta / timedelta * 100.0
-
-            abstimestamps.append(record._timestamp)
-            absvalues.append(record._value)
-
-            xaxis.append(record._timestamp - starttime)
-            yaxis.append(util)
-            labels.append(self._get_progress_label(progress))
-
-        from plotly import graph_objs as go
-        return go.Scatter(x=xaxis,
-                          y=yaxis,
-                          yaxis="y2",
-                          name="QEMU: %s" % report._scenario._name,
-                          mode='lines',
-                          line={
-                              "dash": "solid",
-                              "color": self._next_color(),
-                              "shape": "linear",
-                              "width": 1
-                          },
-                          text=labels)
+        _, timestamps, values = report._qemu_timings.columns()
+        timestamps, utils = _utilization(timestamps, values)
+        return self._get_graph(report, starttime, timestamps, utils,
+                               "QEMU: %s" % report._scenario._name,
+                               yaxis="y2")
 
     def _get_vcpu_cpu_graphs(self, report, starttime):
-        threads = {}
-        for record in report._vcpu_timings._records:
-            if record._tid in threads:
-                continue
-            threads[record._tid] = {
-                "xaxis": [],
-                "yaxis": [],
-                "labels": [],
-                "absvalue": [record._value],
-                "abstime": [record._timestamp],
-            }
-
-        progress_idx = -1
-        for record in report._vcpu_timings._records:
-            while ((progress_idx + 1) < len(report._progress_history) and
-                   report._progress_history[progress_idx + 1]._now < record._timestamp):
-                progress_idx = progress_idx + 1
-
-            if progress_idx >= 0:
-                progress = report._progress_history[progress_idx]
-            else:
-                progress = None
-
-            oldvalue = threads[record._tid]["absvalue"][-1]
-            oldtime = threads[record._tid]["abstime"][-1]
-
-            cpudelta = (record._value - oldvalue) / 1000.0
-            timedelta = record._timestamp - oldtime
-            if timedelta == 0:
-                continue
-            util = cpudelta / timedelta * 100.0
-            if util > 100:
-                util = 100
-
-            threads[record._tid]["absvalue"].append(record._value)
-            threads[record._tid]["abstime"].append(record._timestamp)
-
-            threads[record._tid]["xaxis"].append(record._timestamp - starttime)
-            threads[record._tid]["yaxis"].append(util)
-            threads[record._tid]["labels"].append(self._get_progress_label(progress))
-
-
         graphs = []
-        from plotly import graph_objs as go
-        for tid in threads.keys():
-            graphs.append(
-                go.Scatter(x=threads[tid]["xaxis"],
-                           y=threads[tid]["yaxis"],
-                           yaxis="y2",
-                           name="VCPU %s: %s" % (tid, report._scenario._name),
-                           mode="lines",
-                           line={
-                               "dash": "solid",
-                               "color": self._next_color(),
-                               "shape": "linear",
-                               "width": 1
-                           },
-                           text=threads[tid]["labels"]))
+        for tid, (timestamps, values) in _split_threads(
+                *report._vcpu_timings.columns()).items():
+            timestamps, utils = _utilization(timestamps, values, limit=100)
+            graphs.append(self._get_graph(
+                report, starttime, timestamps, utils,
+                "VCPU %s: %s" % (tid, report._scenario._name),
+                yaxis="y2"))
         return graphs
 
     def _generate_chart_report(self, report):
@@ -558,13 +464,32 @@ def _generate_report(self):
     <th>XBZRLE compression cache:</th>
     <td>%d%% of RAM</td>
   </tr>
+  <tr>
+    <th>Working set:</th>
+    <td>%d%% of RAM</td>
+  </tr>
+  <tr>
+    <th>Zipf exponent:</th>
+    <td>%g</td>
+  </tr>
+  <tr>
+    <th>Write rate:</th>
+    <td>%s</td>
+  </tr>
+  <tr>
+    <th>Threads:</th>
+    <td>%s</td>
+  </tr>
 """ % (scenario._downtime, scenario._bandwidth,
        scenario._max_iters, scenario._max_time,
        "yes" if scenario._pause else "no", scenario._pause_iters,
        "yes" if scenario._post_copy else "no", scenario._post_copy_iters,
        "yes" if scenario._auto_converge else "no", scenario._auto_converge_step,
        "yes" if scenario._compression_mt else "no", scenario._compression_mt_threads,
-       "yes" if scenario._compression_xbzrle else "no", scenario._compression_xbzrle_cache))
+       "yes" if scenario._compression_xbzrle else "no", scenario._compression_xbzrle_cache,
+       scenario._working_set, scenario._zipf,
+       "%d MB/sec" % scenario._write_rate if scenario._write_rate else "unlimited",
+       scenario._threads if scenario._threads else "one per vCPU"))
 
             pieces.append("""
 </table>
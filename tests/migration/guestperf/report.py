@@ -18,12 +18,39 @@
 #
 
 import json
+import struct
+import sys
+from array import array
 
 from guestperf.hardware import Hardware
 from guestperf.scenario import Scenario
-from guestperf.progress import Progress
+from guestperf.progress import Progress, ProgressStats
 from guestperf.timings import Timings
 
+
+# Binary reports start with the magic and the length of a JSON header
+# holding everything but the progress history and timings. These are
+# stored after it as little endian arrays, one per field, and only read
+# and decoded when first used, so that tools looking at the scenario or
+# a single kind of timings do not pay for the rest.
+BINARY_MAGIC = b"QEMUGPR1"
+BINARY_HEADER = struct.Struct("<8sI")
+
+PROGRESS_FIELDS = ("now", "duration", "downtime", "downtime_expected",
+                   "setup_time", "throttle_pcent")
+PROGRESS_RAM_FIELDS = ("transferred_bytes", "remaining_bytes", "total_bytes",
+                       "duplicate_pages", "skipped_pages", "normal_pages",
+                       "normal_bytes", "dirty_rate_pps", "transfer_rate_mbs",
+                       "iterations")
+TIMINGS_FIELDS = ("guest_timings", "qemu_timings", "vcpu_timings")
+
+
+def _column(values):
+    if all(isinstance(value, int) for value in values):
+        return array("q", values)
+    return array("d", values)
+
+
 class Report(object):
 
     def __init__(self,
@@ -38,7 +65,8 @@ def __init__(self,
                  kernel,
                  initrd,
                  transport,
-                 sleep):
+                 sleep,
+                 sample_interval=1000):
 
         self._hardware = hardware
         self._scenario = scenario
@@ -52,6 +80,7 @@ def __init__(self,
         self._initrd = initrd
         self._transport = transport
         self._sleep = sleep
+        self._sample_interval = sample_interval # milliseconds
 
     def serialize(self):
         return {
@@ -67,6 +96,7 @@ def serialize(self):
             "initrd": self._initrd,
             "transport": self._transport,
             "sleep": self._sleep,
+            "sample_interval": self._sample_interval,
         }
 
     @classmethod
@@ -83,7 +113,8 @@ def deserialize(cls, data):
             data["kernel"],
             data["initrd"],
             data["transport"],
-            data["sleep"])
+            data["sleep"],
+            data.get("sample_interval", 1000))
 
     def to_json(self):
         return json.dumps(self.serialize(), indent=4)
@@ -96,3 +127,141 @@ def from_json(cls, data):
     def from_json_file(cls, filename):
         with open(filename, "r") as fh:
             return cls.deserialize(json.load(fh))
+
+    def __getattr__(self, name):
+        # Decode the fields of binary reports on first access
+        loaders = self.__dict__.get("_loaders", {})
+        if name not in loaders:
+            raise AttributeError(name)
+        value = loaders.pop(name)()
+        setattr(self, name, value)
+        return value
+
+    def _columns(self):
+        columns = {}
+        progress = self._progress_history
+        columns["progress.status"] = array("H")
+        statuses = []
+        for record in progress:
+            if record._status not in statuses:
+                statuses.append(record._status)
+            columns["progress.status"].append(statuses.index(record._status))
+        for field in PROGRESS_FIELDS:
+            columns["progress." + field] = _column(
+                [getattr(record, "_" + field) for record in progress])
+        for field in PROGRESS_RAM_FIELDS:
+            columns["progress.ram." + field] = _column(
+                [getattr(record._ram, "_" + field) for record in progress])
+
+        for name in TIMINGS_FIELDS:
+            tids, timestamps, values = getattr(self, "_" + name).columns()
+            # array("l") differs in size between hosts
+            columns[name + ".tid"] = array("q", tids)
+            columns[name + ".timestamp"] = timestamps
+            columns[name + ".value"] = values
+        return statuses, columns
+
+    def to_binary(self):
+        header = {
+            "hardware": self._hardware.serialize(),
+            "scenario": self._scenario.serialize(),
+            "binary": self._binary,
+            "dst_host": self._dst_host,
+            "kernel": self._kernel,
+            "initrd": self._initrd,
+            "transport": self._transport,
+            "sleep": self._sleep,
+            "sample_interval": self._sample_interval,
+        }
+
+        statuses, columns = self._columns()
+        header["progress_statuses"] = statuses
+        header["columns"] = {}
+        offset = 0
+        for name, column in columns.items():
+            header["columns"][name] = [column.typecode, offset, len(column)]
+            # Keep every column aligned to its item size
+            offset += (len(column) * column.itemsize + 7) & ~7
+
+        data = json.dumps(header).encode("utf-8")
+        data += b" " * (-(BINARY_HEADER.size + len(data)) % 8)
+        pieces = [BINARY_HEADER.pack(BINARY_MAGIC, len(data)), data]
+        for column in columns.values():
+            if sys.byteorder != "little":
+                column = array(column.typecode, column)
+                column.byteswap()
+            raw = column.tobytes()
+            pieces.append(raw + b"\0" * (-len(raw) % 8))
+        return b"".join(pieces)
+
+    @classmethod
+    def from_binary_file(cls, filename):
+        with open(filename, "rb") as fh:
+            magic, length = BINARY_HEADER.unpack(fh.read(BINARY_HEADER.size))
+            if magic != BINARY_MAGIC:
+                raise Exception("%s is not a binary report" % filename)
+            header = json.loads(fh.read(length).decode("utf-8"))
+        base = BINARY_HEADER.size + length
+
+        def read_column(name):
+            typecode, offset, count = header["columns"][name]
+            column = array(typecode)
+            with open(filename, "rb") as fh:
+                fh.seek(base + offset)
+                column.frombytes(fh.read(count * column.itemsize))
+            if sys.byteorder != "little":
+                column.byteswap()
+            return column
+
+        def load_progress():
+            statuses = header["progress_statuses"]
+            fields = [read_column("progress." + field)
+                      for field in PROGRESS_FIELDS]
+            ram = [read_column("progress.ram." + field)
+                   for field in PROGRESS_RAM_FIELDS]
+            return [Progress(statuses[status],
+                             ProgressStats(*ram_values),
+                             *values)
+                    for status, ram_values, values in
+                    zip(read_column("progress.status"),
+                        zip(*ram), zip(*fields))]
+
+        def timings_loader(name):
+            return lambda: Timings.from_columns(
+                read_column(name + ".tid"),
+                read_column(name + ".timestamp"),
+                read_column(name + ".value"))
+
+        report = cls(Hardware.deserialize(header["hardware"]),
+                     Scenario.deserialize(header["scenario"]),
+                     None, None, None, None,
+                     header["binary"],
+                     header["dst_host"],
+                     header["kernel"],
+                     header["initrd"],
+                     header["transport"],
+                     header["sleep"],
+                     header["sample_interval"])
+        loaders = {"_progress_history": load_progress}
+        for name in TIMINGS_FIELDS:
+            loaders["_" + name] = timings_loader(name)
+        for name in loaders:
+            delattr(report, name)
+        report._loaders = loaders
+        return report
+
+    def to_file(self, filename, binary=False):
+        if binary:
+            with open(filename, "wb") as fh:
+                fh.write(self.to_binary())
+        else:
+            with open(filename, "w") as fh:
+                print(self.to_json(), file=fh)
+
+    @classmethod
+    def from_file(cls, filename):
+        with open(filename, "rb") as fh:
+            magic = fh.read(len(BINARY_MAGIC))
+        if magic == BINARY_MAGIC:
+            return cls.from_binary_file(filename)
+        return cls.from_json_file(filename)
@@ -0,0 +1,79 @@
+#
+# Migration test CPU time sampling
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import os
+import threading
+import time
+
+from guestperf.timings import Timings
+
+
+class CPUSampler(threading.Thread):
+
+    def __init__(self, pid, tids, interval):
+        super(CPUSampler, self).__init__(daemon=True)
+
+        self._interval = interval # seconds
+        self._jiffies_per_sec = os.sysconf(os.sysconf_names['SC_CLK_TCK'])
+        self._done = threading.Event()
+
+        # The stat files are opened once and re-read with pread() on
+        # each sample, which is far cheaper than reopening them.
+        self._qemu_stat = (pid, os.open("/proc/%d/stat" % pid, os.O_RDONLY))
+        self._vcpu_stats = [
+            (tid, os.open("/proc/%d/task/%d/stat" % (pid, tid), os.O_RDONLY))
+            for tid in tids]
+
+        self.qemu_timings = Timings()
+        self.vcpu_timings = Timings()
+
+    def _cpu_time(self, fd):
+        stat = os.pread(fd, 4096, 0).decode()
+        # The process name may contain spaces, so only split the
+        # fields after it. utime and stime are fields 14 and 15.
+        fields = stat[stat.rindex(")") + 2:].split(" ")
+        utime = int(fields[11])
+        stime = int(fields[12])
+        return 1000 * (stime + utime) / self._jiffies_per_sec
+
+    def _sample(self):
+        now = time.time()
+
+        pid, fd = self._qemu_stat
+        self.qemu_timings.add(pid, now, self._cpu_time(fd))
+        for tid, fd in self._vcpu_stats:
+            self.vcpu_timings.add(tid, now, self._cpu_time(fd))
+
+    def run(self):
+        # Wait for the rest of the interval after each sample, so that
+        # the time spent sampling doesn't add up over the run.
+        deadline = time.time()
+        self._sample()
+        while True:
+            deadline += self._interval
+            if self._done.wait(max(deadline - time.time(), 0)):
+                break
+            self._sample()
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+        os.close(self._qemu_stat[1])
+        for tid, fd in self._vcpu_stats:
+            os.close(fd)
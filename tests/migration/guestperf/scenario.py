@@ -29,7 +29,8 @@ def __init__(self, name,
                  post_copy=False, post_copy_iters=5,
                  auto_converge=False, auto_converge_step=10,
                  compression_mt=False, compression_mt_threads=1,
-                 compression_xbzrle=False, compression_xbzrle_cache=10):
+                 compression_xbzrle=False, compression_xbzrle_cache=10,
+                 working_set=100, zipf=0.0, write_rate=0, threads=0):
 
         self._name = name
 
@@ -56,6 +57,12 @@ def __init__(self, name,
         self._compression_xbzrle = compression_xbzrle
         self._compression_xbzrle_cache = compression_xbzrle_cache # percentage of guest RAM
 
+        # Guest workload
+        self._working_set = working_set # percentage of guest RAM
+        self._zipf = zipf # skew of page writes, 0 for sequential
+        self._write_rate = write_rate # MB per second, 0 for no limit
+        self._threads = threads # 0 for one per vCPU
+
     def serialize(self):
         return {
             "name": self._name,
@@ -73,6 +80,10 @@ def serialize(self):
             "compression_mt_threads": self._compression_mt_threads,
             "compression_xbzrle": self._compression_xbzrle,
             "compression_xbzrle_cache": self._compression_xbzrle_cache,
+            "working_set": self._working_set,
+            "zipf": self._zipf,
+            "write_rate": self._write_rate,
+            "threads": self._threads,
         }
 
     @classmethod
@@ -92,4 +103,8 @@ def deserialize(cls, data):
             data["compression_mt"],
             data["compression_mt_threads"],
             data["compression_xbzrle"],
-            data["compression_xbzrle_cache"])
+            data["compression_xbzrle_cache"],
+            data.get("working_set", 100),
+            data.get("zipf", 0.0),
+            data.get("write_rate", 0),
+            data.get("threads", 0))
@@ -19,17 +19,22 @@
 
 
 import argparse
+import copy
 import fnmatch
+import multiprocessing
 import os
 import os.path
 import platform
 import sys
 import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from guestperf.hardware import Hardware
 from guestperf.engine import Engine
 from guestperf.scenario import Scenario
 from guestperf.comparison import COMPARISONS
+from guestperf.convergence import ConvergenceModel, evaluate, accuracy
 from guestperf.plot import Plot
 from guestperf.report import Report
 
@@ -48,6 +53,8 @@ def __init__(self):
         parser.add_argument("--kernel", dest="kernel", default="/boot/vmlinuz-%s" % platform.release())
         parser.add_argument("--initrd", dest="initrd", default="tests/migration/initrd-stress.img")
         parser.add_argument("--transport", dest="transport", default="unix")
+        parser.add_argument("--sample-interval", dest="sample_interval", default=50, type=int,
+                            help="milliseconds between CPU time and progress samples")
 
 
         # Hardware args
@@ -71,7 +78,8 @@ def get_engine(self, args):
                       transport=args.transport,
                       sleep=args.sleep,
                       debug=args.debug,
-                      verbose=args.verbose)
+                      verbose=args.verbose,
+                      sample_interval=args.sample_interval)
 
     def get_hardware(self, args):
         def split_map(value):
@@ -100,6 +108,8 @@ def __init__(self):
         parser = self._parser
 
         parser.add_argument("--output", dest="output", default=None)
+        parser.add_argument("--binary-report", dest="binary_report", default=False, action="store_true",
+                            help="save the report in the compact binary format")
 
         # Scenario args
         parser.add_argument("--max-iters", dest="max_iters", default=30, type=int)
@@ -122,6 +132,15 @@ def __init__(self):
         parser.add_argument("--compression-xbzrle", dest="compression_xbzrle", default=False, action="store_true")
         parser.add_argument("--compression-xbzrle-cache", dest="compression_xbzrle_cache", default=10, type=int)
 
+        parser.add_argument("--working-set", dest="working_set", default=100, type=int,
+                            help="percentage of guest RAM the workload writes to")
+        parser.add_argument("--zipf", dest="zipf", default=0.0, type=float,
+                            help="skew of workload page writes, 0 for sequential")
+        parser.add_argument("--write-rate", dest="write_rate", default=0, type=int,
+                            help="workload write rate limit in MB/sec, 0 for no limit")
+        parser.add_argument("--threads", dest="threads", default=0, type=int,
+                            help="workload threads, 0 for one per vCPU")
+
     def get_scenario(self, args):
         return Scenario(name="perfreport",
                         downtime=args.downtime,
@@ -142,7 +161,12 @@ def get_scenario(self, args):
                         compression_mt_threads=args.compression_mt_threads,
 
                         compression_xbzrle=args.compression_xbzrle,
-                        compression_xbzrle_cache=args.compression_xbzrle_cache)
+                        compression_xbzrle_cache=args.compression_xbzrle_cache,
+
+                        working_set=args.working_set,
+                        zipf=args.zipf,
+                        write_rate=args.write_rate,
+                        threads=args.threads)
 
     def run(self, argv):
         args = self._parser.parse_args(argv)
@@ -158,10 +182,12 @@ def run(self, argv):
         try:
             report = engine.run(hardware, scenario)
             if args.output is None:
-                print(report.to_json())
+                if args.binary_report:
+                    sys.stdout.buffer.write(report.to_binary())
+                else:
+                    print(report.to_json())
             else:
-                with open(args.output, "w") as fh:
-                    print(report.to_json(), file=fh)
+                report.to_file(args.output, binary=args.binary_report)
             return 0
         except Exception as e:
             print("Error: %s" % str(e), file=sys.stderr)
@@ -170,6 +196,23 @@ def run(self, argv):
             return 1
 
 
+# Engine and hardware of the batch slot owned by a worker process
+_batch_slot = None
+
+def _batch_init(slots, queue):
+    global _batch_slot
+
+    _batch_slot = slots[queue.get()]
+
+
+def _batch_run(scenario, filename, binary):
+    engine, hardware = _batch_slot
+    start = time.time()
+    report = engine.run(hardware, scenario)
+    report.to_file(filename, binary=binary)
+    return time.time() - start
+
+
 class BatchShell(BaseShell):
 
     def __init__(self):
@@ -179,6 +222,73 @@ def __init__(self):
 
         parser.add_argument("--filter", dest="filter", default="*")
         parser.add_argument("--output", dest="output", default=os.getcwd())
+        parser.add_argument("--jobs", dest="jobs", default=1, type=int,
+                            help="number of scenarios to run at once, each "
+                            "on its own share of the CPU/NUMA bindings, "
+                            "which are required with more than one job")
+        parser.add_argument("--rerun", dest="rerun", default=False, action="store_true",
+                            help="run scenarios that already have a report")
+        parser.add_argument("--binary-report", dest="binary_report", default=False, action="store_true",
+                            help="save reports in the compact binary format")
+
+    @staticmethod
+    def _split_bind(bind, jobs, what):
+        if not bind:
+            return [[] for i in range(jobs)]
+        if len(bind) < jobs:
+            raise Exception("Cannot split %d %s between %d jobs" %
+                            (len(bind), what, jobs))
+        share = len(bind) // jobs
+        return [bind[i * share:(i + 1) * share] for i in range(jobs)]
+
+    @staticmethod
+    def _split_mem_bind(bind, jobs):
+        # There are usually fewer NUMA nodes than jobs, so nodes are
+        # shared by neighbouring jobs rather than split between them.
+        if not bind or len(bind) >= jobs:
+            return BatchShell._split_bind(bind, jobs, "NUMA nodes")
+        return [[bind[i * len(bind) // jobs]] for i in range(jobs)]
+
+    def get_slots(self, args):
+        engine = self.get_engine(args)
+        hardware = self.get_hardware(args)
+        jobs = args.jobs
+
+        if jobs < 1:
+            raise Exception("--jobs must be at least 1, not %d" % jobs)
+
+        # Unpinned runs would compete for the same CPUs and skew each
+        # other's results.
+        if jobs > 1 and not (hardware._src_cpu_bind and
+                             hardware._dst_cpu_bind):
+            raise Exception("Running %d jobs at once requires --src-cpu-bind "
+                            "and --dst-cpu-bind to keep them apart" % jobs)
+
+        src_cpus = self._split_bind(hardware._src_cpu_bind, jobs, "source CPUs")
+        dst_cpus = self._split_bind(hardware._dst_cpu_bind, jobs, "target CPUs")
+        src_mems = self._split_mem_bind(hardware._src_mem_bind, jobs)
+        dst_mems = self._split_mem_bind(hardware._dst_mem_bind, jobs)
+
+        slots = []
+        for i in range(jobs):
+            slot_engine = copy.copy(engine)
+            slot_engine._port = engine._port + (i * 2)
+            slot_hardware = copy.copy(hardware)
+            slot_hardware._src_cpu_bind = src_cpus[i]
+            slot_hardware._dst_cpu_bind = dst_cpus[i]
+            slot_hardware._src_mem_bind = src_mems[i]
+            slot_hardware._dst_mem_bind = dst_mems[i]
+            slots.append((slot_engine, slot_hardware))
+        return slots
+
+    @staticmethod
+    def _report_duration(report):
+        # Wall clock time of a past run: the migration itself plus the
+        # guest workload runs before and after it.
+        history = report._progress_history
+        if len(history) == 0:
+            return 2 * report._sleep
+        return (history[-1]._now - history[0]._now) + 2 * report._sleep
 
     def run(self, argv):
         args = self._parser.parse_args(argv)
@@ -187,33 +297,79 @@ def run(self, argv):
                                    logging.WARN))
 
 
-        engine = self.get_engine(args)
-        hardware = self.get_hardware(args)
-
-        try:
-            for comparison in COMPARISONS:
-                compdir = os.path.join(args.output, comparison._name)
-                for scenario in comparison._scenarios:
-                    name = os.path.join(comparison._name, scenario._name)
-                    if not fnmatch.fnmatch(name, args.filter):
-                        if args.verbose:
-                            print("Skipping %s" % name)
-                        continue
+        pending = []
+        durations = []
+        for comparison in COMPARISONS:
+            for scenario in comparison._scenarios:
+                name = os.path.join(comparison._name, scenario._name)
+                if not fnmatch.fnmatch(name, args.filter):
+                    if args.verbose:
+                        print("Skipping %s" % name)
+                    continue
 
+                dirname = os.path.join(args.output, comparison._name)
+                filename = os.path.join(dirname, scenario._name +
+                                        (".bin" if args.binary_report else ".json"))
+                if os.path.exists(filename) and not args.rerun:
                     if args.verbose:
-                        print("Running %s" % name)
-
-                    dirname = os.path.join(args.output, comparison._name)
-                    filename = os.path.join(dirname, scenario._name + ".json")
-                    if not os.path.exists(dirname):
-                        os.makedirs(dirname)
-                    report = engine.run(hardware, scenario)
-                    with open(filename, "w") as fh:
-                        print(report.to_json(), file=fh)
+                        print("Skipping %s, report exists" % name)
+                    try:
+                        report = Report.from_file(filename)
+                        durations.append(self._report_duration(report))
+                    except Exception:
+                        pass
+                    continue
+
+                if not os.path.exists(dirname):
+                    os.makedirs(dirname)
+                pending.append((name, scenario, filename))
+
+        try:
+            slots = self.get_slots(args)
         except Exception as e:
             print("Error: %s" % str(e), file=sys.stderr)
-            if args.debug:
-                raise
+            return 1
+
+        if pending and durations:
+            estimate = sum(durations) / len(durations) * len(pending) / len(slots)
+            print("Running %d scenarios, about %d minutes based on %d past reports" %
+                  (len(pending), estimate / 60, len(durations)))
+
+        queue = multiprocessing.Queue()
+        for i in range(len(slots)):
+            queue.put(i)
+
+        failed = 0
+        with ProcessPoolExecutor(max_workers=len(slots),
+                                 initializer=_batch_init,
+                                 initargs=(slots, queue)) as executor:
+            futures = {}
+            for name, scenario, filename in pending:
+                if args.verbose:
+                    print("Queueing %s" % name)
+                futures[executor.submit(_batch_run, scenario, filename,
+                                       args.binary_report)] = name
+
+            left = len(futures)
+            for future in as_completed(futures):
+                left -= 1
+                try:
+                    durations.append(future.result())
+                except Exception as e:
+                    print("Error: %s: %s" % (futures[future], str(e)),
+                          file=sys.stderr)
+                    failed += 1
+                    if args.debug:
+                        raise
+                    continue
+
+                if args.verbose:
+                    estimate = (sum(durations) / len(durations) *
+                                left / len(slots))
+                    print("Finished %s, %d left, about %d minutes to go" %
+                          (futures[future], left, estimate / 60))
+
+        return 1 if failed else 0
 
 
 class PlotShell(object):
@@ -233,6 +389,8 @@ def __init__(self):
         self._parser.add_argument("--split-guest-cpu", dest="split_guest_cpu", default=False, action="store_true")
         self._parser.add_argument("--qemu-cpu", dest="qemu_cpu", default=False, action="store_true")
         self._parser.add_argument("--vcpu-cpu", dest="vcpu_cpu", default=False, action="store_true")
+        self._parser.add_argument("--max-points", dest="max_points", default=2000, type=int,
+                                  help="maximum number of points per line, 0 for no limit")
 
         self._parser.add_argument("reports", nargs='*')
 
@@ -256,13 +414,104 @@ def run(self, argv):
 
         reports = []
         for report in args.reports:
-            reports.append(Report.from_json_file(report))
+            reports.append(Report.from_file(report))
 
         plot = Plot(reports,
                     args.migration_iters,
                     args.total_guest_cpu,
                     args.split_guest_cpu,
                     args.qemu_cpu,
-                    args.vcpu_cpu)
+                    args.vcpu_cpu,
+                    args.max_points)
 
         plot.generate(args.output)
+
+
+class PredictShell(object):
+
+    def __init__(self):
+        super(PredictShell, self).__init__()
+
+        self._parser = argparse.ArgumentParser(description="Migration Test Tool")
+
+        self._parser.add_argument("--debug", dest="debug", default=False, action="store_true")
+        self._parser.add_argument("--verbose", dest="verbose", default=False, action="store_true")
+
+        self._parser.add_argument("--passes", dest="passes", default=2, type=int,
+                                  help="number of passes over RAM to fit the model to")
+        self._parser.add_argument("--bandwidth", dest="bandwidth", default=None, type=int,
+                                  help="predict migration at this bandwidth (MiB/sec) "
+                                  "instead of checking predictions against the reports")
+        self._parser.add_argument("--downtime", dest="downtime", default=500, type=int,
+                                  help="downtime limit (milli-sec) to predict migration with")
+        self._parser.add_argument("--max-iters", dest="max_iters", default=None, type=int)
+        self._parser.add_argument("--max-time", dest="max_time", default=None, type=int)
+
+        self._parser.add_argument("reports", nargs='*')
+
+    def _predict(self, args, reports):
+        for filename, report in reports:
+            model = ConvergenceModel.fit(report._progress_history, args.passes)
+            bandwidth = args.bandwidth * 1024 * 1024
+            prediction = model.predict(bandwidth, args.downtime / 1000.0,
+                                       args.max_iters, args.max_time)
+            print("%s: dirty rate %dMB/s, working set %dMB" % (
+                filename,
+                model._dirty_rate / (1024 * 1024),
+                model._working_set / (1024 * 1024)))
+            if prediction._converges:
+                print("  converges after %d iterations, %.1f secs, downtime %d milli-sec" % (
+                    prediction._iterations, prediction._time,
+                    prediction._downtime * 1000))
+            elif model.converges(bandwidth, args.downtime / 1000.0):
+                print("  converges, but not within the iteration or time limit")
+            else:
+                print("  never converges, %dMB left to send in steady state" % (
+                    model.steady_state(bandwidth) / (1024 * 1024)))
+
+    def _evaluate(self, args, reports):
+        results = evaluate([report for _, report in reports], args.passes)
+        names = {id(report): filename for filename, report in reports}
+
+        print("%-40s %-20s %-20s" % ("Report", "Actual", "Predicted"))
+        for report, prediction, converged, duration in results:
+            print("%-40s %-20s %-20s" % (
+                names[id(report)],
+                "%.1f secs" % duration if converged else "no convergence",
+                "%.1f secs" % prediction._time if prediction._converges
+                else "no convergence"))
+
+        correct, error = accuracy(results)
+        if correct is None:
+            print("No reports the model applies to", file=sys.stderr)
+            return 1
+        print("\nConvergence predicted correctly for %d%% of %d reports" % (
+            correct * 100, len(results)))
+        if error is not None:
+            print("Median error of predicted duration: %d%%" % (error * 100))
+        return 0
+
+    def run(self, argv):
+        args = self._parser.parse_args(argv)
+        logging.basicConfig(level=(logging.DEBUG if args.debug else
+                                   logging.INFO if args.verbose else
+                                   logging.WARN))
+
+        if len(args.reports) == 0:
+            print("At least one report required", file=sys.stderr)
+            return 1
+
+        reports = []
+        for filename in args.reports:
+            reports.append((filename, Report.from_file(filename)))
+
+        try:
+            if args.bandwidth is not None:
+                self._predict(args, reports)
+                return 0
+            return self._evaluate(args, reports)
+        except Exception as e:
+            print("Error: %s" % str(e), file=sys.stderr)
+            if args.debug:
+                raise
+            return 1
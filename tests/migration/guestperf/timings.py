@@ -17,6 +17,8 @@
 # License along with this library; if not, see <http://www.gnu.org/licenses/>.
 #
 
+from array import array
+
 
 class TimingRecord(object):
 
@@ -43,9 +45,44 @@ def deserialize(cls, data):
 
 class Timings(object):
 
-    def __init__(self, records):
+    def __init__(self, records=None):
+
+        # Samples are stored column-wise in flat arrays rather than
+        # as a list of objects, since high resolution sampling can
+        # produce a lot of them.
+        self._tids = array("l")
+        self._timestamps = array("d")
+        self._values = array("d")
+
+        if records is not None:
+            for record in records:
+                self.add(record._tid, record._timestamp, record._value)
+
+    def add(self, tid, timestamp, value):
+        self._tids.append(tid)
+        self._timestamps.append(timestamp)
+        self._values.append(value)
+
+    def __len__(self):
+        return len(self._tids)
+
+    def columns(self):
+        return self._tids, self._timestamps, self._values
+
+    @classmethod
+    def from_columns(cls, tids, timestamps, values):
+        timings = cls()
+        timings._tids = tids
+        timings._timestamps = timestamps
+        timings._values = values
+        return timings
 
-        self._records = records
+    @property
+    def _records(self):
+        return [TimingRecord(tid, timestamp, value)
+                for tid, timestamp, value in zip(self._tids,
+                                                 self._timestamps,
+                                                 self._values)]
 
     def serialize(self):
         return [record.serialize() for record in self._records]
@@ -24,11 +24,21 @@
 #include <linux/random.h>
 #include <pthread.h>
 #include <sys/mount.h>
+#include <math.h>
 
 const char *argv0;
 
 #define RAM_PAGE_SIZE 4096
 
+struct stress_params {
+    /* Per thread */
+    unsigned long long ramsizeMB;
+    unsigned long long workingsetMB;
+    unsigned long long writerateMB; /* MB/sec, 0 for no limit */
+    /* Skew of page writes, 0 to sweep the working set sequentially */
+    double zipf;
+};
+
 #ifndef CONFIG_GETTID
 static int gettid(void)
 {
@@ -147,6 +157,46 @@ static int random_bytes(char *buf, size_t len)
 }
 
 
+static int get_command_arg_double(const char *name,
+                                  double *val)
+{
+    char *valstr;
+    char *end;
+
+    int ret = get_command_arg_str(name, &valstr);
+    if (ret <= 0)
+        return ret;
+
+    errno = 0;
+    *val = strtod(valstr, &end);
+    if (errno || *end) {
+        fprintf(stderr, "%s (%05d): ERROR: cannot parse %s value %s\n",
+                argv0, gettid(), name, valstr);
+        g_free(valstr);
+        return -1;
+    }
+    g_free(valstr);
+    return 0;
+}
+
+
+static uint64_t xorshift64(uint64_t *state)
+{
+    uint64_t x = *state;
+
+    x ^= x << 13;
+    x ^= x >> 7;
+    x ^= x << 17;
+    *state = x;
+    return x;
+}
+
+static double random_double(uint64_t *state)
+{
+    return (xorshift64(state) >> 11) * (1.0 / (1ull << 53));
+}
+
+
 static unsigned long long now(void)
 {
     struct timeval tv;
@@ -156,77 +206,165 @@ static unsigned long long now(void)
     return (tv.tv_sec * 1000ull) + (tv.tv_usec / 1000ull);
 }
 
-static void stressone(unsigned long long ramsizeMB)
+/*
+ * Build the table of cumulative probabilities of writing to each of
+ * npages pages, the page of rank k being written to with a probability
+ * proportional to 1 / k^zipf, and a random order of the pages so that
+ * the hot ones are spread over the working set.
+ */
+static void zipf_init(size_t npages, double zipf, uint64_t *state,
+                      double **cdf, size_t **pages)
+{
+    double sum = 0;
+    size_t i;
+
+    *cdf = g_new(double, npages);
+    *pages = g_new(size_t, npages);
+
+    for (i = 0; i < npages; i++) {
+        sum += 1.0 / pow(i + 1, zipf);
+        (*cdf)[i] = sum;
+        (*pages)[i] = i;
+    }
+    for (i = 0; i < npages; i++) {
+        (*cdf)[i] /= sum;
+    }
+    for (i = npages - 1; i > 0; i--) {
+        size_t j = xorshift64(state) % (i + 1);
+        size_t tmp = (*pages)[i];
+        (*pages)[i] = (*pages)[j];
+        (*pages)[j] = tmp;
+    }
+}
+
+static size_t zipf_page(const double *cdf, const size_t *pages,
+                        size_t npages, uint64_t *state)
+{
+    double u = random_double(state);
+    size_t low = 0, high = npages - 1;
+
+    while (low < high) {
+        size_t mid = low + (high - low) / 2;
+        if (cdf[mid] < u) {
+            low = mid + 1;
+        } else {
+            high = mid;
+        }
+    }
+    return pages[low];
+}
+
+static void stressone(const struct stress_params *params)
 {
     size_t pagesPerMB = 1024 * 1024 / RAM_PAGE_SIZE;
-    g_autofree char *ram = g_malloc(ramsizeMB * 1024 * 1024);
-    char *ramptr;
-    size_t i, j, k;
+    g_autofree char *ram = g_malloc(params->ramsizeMB * 1024 * 1024);
     g_autofree char *data = g_malloc(RAM_PAGE_SIZE);
-    char *dataptr;
+    g_autofree double *cdf = NULL;
+    g_autofree size_t *pages = NULL;
+    size_t npages = params->workingsetMB * pagesPerMB;
+    size_t i, j, k;
+    size_t page = 0;
     size_t nMB = 0;
-    unsigned long long before, after;
+    unsigned long long totalMB = 0;
+    unsigned long long before, after, start;
+    uint64_t state;
 
     /* We don't care about initial state, but we do want
      * to fault it all into RAM, otherwise the first iter
      * of the loop below will be quite slow. We can't use
      * 0x0 as the byte as gcc optimizes that away into a
      * calloc instead :-) */
-    memset(ram, 0xfe, ramsizeMB * 1024 * 1024);
+    memset(ram, 0xfe, params->ramsizeMB * 1024 * 1024);
 
-    if (random_bytes(data, RAM_PAGE_SIZE) < 0) {
+    if (random_bytes(data, RAM_PAGE_SIZE) < 0 ||
+        random_bytes((char *)&state, sizeof(state)) < 0) {
         return;
     }
+    state |= 1;
 
-    before = now();
+    if (params->zipf > 0) {
+        zipf_init(npages, params->zipf, &state, &cdf, &pages);
+    }
 
-    while (1) {
+    before = start = now();
 
-        ramptr = ram;
-        for (i = 0; i < ramsizeMB; i++, nMB++) {
-            for (j = 0; j < pagesPerMB; j++) {
-                dataptr = data;
-                for (k = 0; k < RAM_PAGE_SIZE; k += sizeof(long long)) {
-                    ramptr += sizeof(long long);
-                    dataptr += sizeof(long long);
-                    *(unsigned long long *)ramptr ^= *(unsigned long long *)dataptr;
-                }
+    while (1) {
+        for (i = 0; i < pagesPerMB; i++) {
+            char *ramptr;
+
+            if (params->zipf > 0) {
+                j = zipf_page(cdf, pages, npages, &state);
+            } else {
+                j = page;
+                page = (page + 1) % npages;
             }
 
-            if (nMB == 1024) {
-                after = now();
-                fprintf(stderr, "%s (%05d): INFO: %06llums copied 1 GB in %05llums\n",
-                        argv0, gettid(), after, after - before);
-                before = now();
-                nMB = 0;
+            ramptr = ram + j * RAM_PAGE_SIZE;
+            for (k = 0; k < RAM_PAGE_SIZE; k += sizeof(long long)) {
+                *(unsigned long long *)(ramptr + k) ^=
+                    *(unsigned long long *)(data + k);
             }
         }
+        nMB++;
+        totalMB++;
+
+        if (params->writerateMB) {
+            /* Sleep until the time this much should have taken */
+            unsigned long long due = start +
+                totalMB * 1000 / params->writerateMB;
+            unsigned long long current = now();
+            if (current < due) {
+                g_usleep((due - current) * 1000);
+            }
+        }
+
+        if (nMB == 1024) {
+            after = now();
+            fprintf(stderr, "%s (%05d): INFO: %06llums copied 1 GB in %05llums\n",
+                    argv0, gettid(), after, after - before);
+            before = now();
+            nMB = 0;
+        }
     }
 }
 
 
 static void *stressthread(void *arg)
 {
-    unsigned long long ramsizeMB = *(unsigned long long *)arg;
+    const struct stress_params *params = arg;
 
-    stressone(ramsizeMB);
+    stressone(params);
 
     return NULL;
 }
 
-static void stress(unsigned long long ramsizeGB, int ncpus)
+static void stress(unsigned long long ramsizeGB, int ncpus,
+                   unsigned long long workingsetMB,
+                   unsigned long long writerateMB, double zipf)
 {
     size_t i;
-    unsigned long long ramsizeMB = ramsizeGB * 1024 / ncpus;
+    struct stress_params params = {
+        .ramsizeMB = ramsizeGB * 1024 / ncpus,
+        .zipf = zipf,
+    };
+
+    /* Each thread gets its share of RAM, working set and write rate */
+    if (workingsetMB == 0 || workingsetMB > ramsizeGB * 1024) {
+        workingsetMB = ramsizeGB * 1024;
+    }
+    params.workingsetMB = MAX(workingsetMB / ncpus, 1);
+    if (writerateMB) {
+        params.writerateMB = MAX(writerateMB / ncpus, 1);
+    }
     ncpus--;
 
     for (i = 0; i < ncpus; i++) {
         pthread_t thr;
         pthread_create(&thr, NULL,
-                       stressthread,   &ramsizeMB);
+                       stressthread, &params);
     }
 
-    stressone(ramsizeMB);
+    stressone(&params);
 }
 
 
@@ -263,14 +401,21 @@ static int mount_all(void)
 int main(int argc, char **argv)
 {
     unsigned long long ramsizeGB = 1;
+    unsigned long long workingsetMB = 0;
+    unsigned long long writerateMB = 0;
+    unsigned long long threads = 0;
+    double zipf = 0;
     char *end;
     int ch;
     int opt_ind = 0;
-    const char *sopt = "hr:c:";
+    const char *sopt = "hr:c:w:l:z:";
     struct option lopt[] = {
         { "help", no_argument, NULL, 'h' },
         { "ramsize", required_argument, NULL, 'r' },
         { "cpus", required_argument, NULL, 'c' },
+        { "working-set", required_argument, NULL, 'w' },
+        { "write-rate", required_argument, NULL, 'l' },
+        { "zipf", required_argument, NULL, 'z' },
         { NULL, 0, NULL, 0 }
     };
     int ret;
@@ -300,9 +445,41 @@ int main(int argc, char **argv)
             }
             break;
 
+        case 'w':
+            errno = 0;
+            workingsetMB = strtoll(optarg, &end, 10);
+            if (errno != 0 || *end) {
+                fprintf(stderr, "%s (%05d): ERROR: Cannot parse working set size %s\n",
+                        argv0, gettid(), optarg);
+                exit_failure();
+            }
+            break;
+
+        case 'l':
+            errno = 0;
+            writerateMB = strtoll(optarg, &end, 10);
+            if (errno != 0 || *end) {
+                fprintf(stderr, "%s (%05d): ERROR: Cannot parse write rate %s\n",
+                        argv0, gettid(), optarg);
+                exit_failure();
+            }
+            break;
+
+        case 'z':
+            errno = 0;
+            zipf = strtod(optarg, &end);
+            if (errno != 0 || *end || zipf < 0) {
+                fprintf(stderr, "%s (%05d): ERROR: Cannot parse Zipf exponent %s\n",
+                        argv0, gettid(), optarg);
+                exit_failure();
+            }
+            break;
+
         case '?':
         case 'h':
-            fprintf(stderr, "%s: [--help][--ramsize GB][--cpus N]\n", argv0);
+            fprintf(stderr, "%s: [--help][--ramsize GB][--cpus N]"
+                    "[--working-set MB][--write-rate MB/sec][--zipf S]\n",
+                    argv0);
             exit_failure();
         }
     }
@@ -314,6 +491,14 @@ int main(int argc, char **argv)
         ret = get_command_arg_ull("ramsize", &ramsizeGB);
         if (ret < 0)
             exit_failure();
+
+        if (get_command_arg_ull("workingset", &workingsetMB) < 0 ||
+            get_command_arg_ull("writerate", &writerateMB) < 0 ||
+            get_command_arg_ull("threads", &threads) < 0 ||
+            get_command_arg_double("zipf", &zipf) < 0)
+            exit_failure();
+        if (threads)
+            ncpus = threads;
     }
 
     if (ncpus == 0)
@@ -321,8 +506,12 @@ int main(int argc, char **argv)
 
     fprintf(stdout, "%s (%05d): INFO: RAM %llu GiB across %d CPUs\n",
             argv0, gettid(), ramsizeGB, ncpus);
+    if (workingsetMB || writerateMB || zipf > 0)
+        fprintf(stdout, "%s (%05d): INFO: working set %llu MiB, "
+                "write rate %llu MB/sec, Zipf exponent %.2f\n",
+                argv0, gettid(), workingsetMB, writerateMB, zipf);
 
-    stress(ramsizeGB, ncpus);
+    stress(ramsizeGB, ncpus, workingsetMB, writerateMB, zipf);
 
     exit_failure();
 }
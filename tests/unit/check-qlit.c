@@ -34,6 +34,17 @@ static QLitObject qlit_foo = QLIT_QDICT(((QLitDictEntry[]) {
     { },
 }));
 
+static QLitObject qlit_bee[] = {
+    QLIT_QNUM(43),
+    { },
+};
+
+static QLitObject qlit_shared = QLIT_QLIST(((QLitObject[]) {
+    QLIT_QLIST(qlit_bee),
+    QLIT_QLIST(qlit_bee),
+    { },
+}));
+
 static QObject *make_qobject(void)
 {
     QDict *qdict = qdict_new();
@@ -90,12 +101,37 @@ static void qobject_from_qlit_test(void)
     qobject_unref(qobj);
 }
 
+static void qobject_from_qlit_shared_test(void)
+{
+    QObject *qobj = qobject_from_qlit_shared(&qlit_shared);
+    const QListEntry *entry;
+
+    g_assert(qlit_equal_qobject(&qlit_shared, qobj));
+
+    /* Both elements are the same QList */
+    entry = qlist_first(qobject_to(QList, qobj));
+    g_assert(qlist_entry_obj(entry) == qlist_entry_obj(qlist_next(entry)));
+    g_assert_cmpint(qlist_entry_obj(entry)->base.refcnt, ==, 2);
+
+    qobject_unref(qobj);
+
+    /* qobject_from_qlit() converts them separately */
+    qobj = qobject_from_qlit(&qlit_shared);
+    entry = qlist_first(qobject_to(QList, qobj));
+    g_assert(qlit_equal_qobject(&qlit_shared, qobj));
+    g_assert(qlist_entry_obj(entry) != qlist_entry_obj(qlist_next(entry)));
+
+    qobject_unref(qobj);
+}
+
 int main(int argc, char **argv)
 {
     g_test_init(&argc, &argv, NULL);
 
     g_test_add_func("/qlit/equal_qobject", qlit_equal_qobject_test);
     g_test_add_func("/qlit/qobject_from_qlit", qobject_from_qlit_test);
+    g_test_add_func("/qlit/qobject_from_qlit_shared",
+                    qobject_from_qlit_shared_test);
 
     return g_test_run();
 }
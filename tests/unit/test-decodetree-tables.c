@@ -0,0 +1,14 @@
+/*
+ * The decoder of test-decodetree, emitted as tables for util/decodetree.c
+ *
+ * This work is licensed under the terms of the GNU LGPL, version 2 or later.
+ * See the COPYING.LIB file in the top-level directory.
+ */
+
+#include "qemu/osdep.h"
+#include "qemu/bitops.h"
+#include "test-decodetree.h"
+
+#include "test-decodetree-tables.c.inc"
+
+TRANS_ALL
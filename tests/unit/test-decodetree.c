@@ -0,0 +1,52 @@
+/*
+ * Compare the decoders emitted by scripts/decodetree.py as C code and
+ * as tables
+ *
+ * This work is licensed under the terms of the GNU LGPL, version 2 or later.
+ * See the COPYING.LIB file in the top-level directory.
+ */
+
+#include "qemu/osdep.h"
+#include "qemu/bitops.h"
+#include "test-decodetree.h"
+
+#include "test-decodetree-code.c.inc"
+
+TRANS_ALL
+
+static const char *check_decode(uint32_t insn, const char *reject)
+{
+    DisasContext code = { .reject = reject };
+    DisasContext tables = { .reject = reject };
+    bool code_ok = decode_code(&code, insn);
+    bool tables_ok = decode_tables(&tables, insn);
+
+    g_assert_cmpint(code_ok, ==, tables_ok);
+    g_assert_cmpstr(code.pattern, ==, tables.pattern);
+    g_assert_cmpmem(code.args, sizeof(code.args),
+                    tables.args, sizeof(tables.args));
+    return code.pattern;
+}
+
+static void test_decode(void)
+{
+    uint32_t hi;
+
+    /* Every opcode, with random fields in the lower halfword */
+    for (hi = 0; hi <= 0xffff; hi++) {
+        uint32_t insn = hi << 16 | (g_test_rand_int() & 0xffff);
+        const char *pattern = check_decode(insn, NULL);
+
+        if (pattern) {
+            /* Rejecting it tries the overlapping patterns after it */
+            check_decode(insn, pattern);
+        }
+    }
+}
+
+int main(int argc, char **argv)
+{
+    g_test_init(&argc, &argv, NULL);
+    g_test_add_func("/decodetree/decode", test_decode);
+    return g_test_run();
+}
@@ -0,0 +1,49 @@
+/*
+ * Decoder shared by the two halves of test-decodetree
+ *
+ * This work is licensed under the terms of the GNU LGPL, version 2 or later.
+ * See the COPYING.LIB file in the top-level directory.
+ */
+
+#ifndef TEST_DECODETREE_H
+#define TEST_DECODETREE_H
+
+typedef struct DisasContext {
+    const char *pattern;        /* translate function called last */
+    const char *reject;         /* translate function returning false */
+    int args[4];                /* argument set passed to it */
+} DisasContext;
+
+/* test-decodetree.decode emitted as C code, and as tables */
+bool decode_code(DisasContext *ctx, uint32_t insn);
+bool decode_tables(DisasContext *ctx, uint32_t insn);
+
+static inline int times_2(DisasContext *ctx, int x)
+{
+    return x * 2;
+}
+
+static inline int param(DisasContext *ctx)
+{
+    return 42;
+}
+
+/* Remember the pattern and its arguments, and accept it unless rejected */
+#define TRANS(NAME)                                                 \
+    static bool trans_##NAME(DisasContext *ctx, arg_##NAME *a)      \
+    {                                                               \
+        QEMU_BUILD_BUG_ON(sizeof(*a) > sizeof(ctx->args));          \
+        ctx->pattern = #NAME;                                       \
+        memset(ctx->args, 0, sizeof(ctx->args));                    \
+        memcpy(ctx->args, a, sizeof(*a));                           \
+        return !ctx->reject || strcmp(ctx->reject, #NAME);          \
+    }
+
+#define TRANS_ALL                                                   \
+    TRANS(add) TRANS(sub) TRANS(addi) TRANS(subi)                   \
+    TRANS(nop) TRANS(movi)                                          \
+    TRANS(shl) TRANS(shr) TRANS(rot)                                \
+    TRANS(dbl)                                                      \
+    TRANS(sys) TRANS(ldr) TRANS(ldr_any)
+
+#endif
@@ -1246,7 +1246,7 @@ static void do_test_visitor_in_qmp_introspect(TestInputVisitorData *data,
                                               const QLitObject *qlit)
 {
     g_autoptr(SchemaInfoList) schema = NULL;
-    QObject *obj = qobject_from_qlit(qlit);
+    QObject *obj = qobject_from_qlit_shared(qlit);
     Visitor *v;
 
     v = qobject_input_visitor_new(obj);
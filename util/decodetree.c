@@ -0,0 +1,101 @@
+/*
+ * Interpreter for table-driven instruction decoders
+ *
+ * This work is licensed under the terms of the GNU GPL, version 2 or later.
+ * See the COPYING file in the top-level directory.
+ */
+
+#include "qemu/osdep.h"
+#include "qemu/bitops.h"
+#include "qemu/decodetree.h"
+
+static int decodetree_extract(const DecodeTree *dt,
+                              const DecodeTreeField *f, uint32_t insn)
+{
+    const DecodeTreePart *p = &dt->parts[f->first + f->count - 1];
+    uint32_t ret = p->sign ? sextract32(insn, p->pos, p->len)
+                           : extract32(insn, p->pos, p->len);
+    int pos = p->len;
+
+    while (p-- > &dt->parts[f->first]) {
+        uint32_t x = p->sign ? sextract32(insn, p->pos, p->len)
+                             : extract32(insn, p->pos, p->len);
+
+        ret = deposit32(ret, pos, 32 - pos, x);
+        pos += p->len;
+    }
+    return ret;
+}
+
+static bool decodetree_node(const DecodeTree *dt, void *ctx, uint32_t insn,
+                            void *args, uint32_t n)
+{
+    const DecodeTreeNode *node = &dt->nodes[n];
+    const DecodeTreeEdge *e;
+    const DecodeTreeField *f;
+    uint32_t bits;
+    int i, count;
+
+    /*
+     * Follow the switches down to a group or pattern.  The number of
+     * steps of the search only depends on the number of edges, which
+     * keeps its branches predictable.
+     */
+    while (node->kind == DECODETREE_SWITCH ||
+           node->kind == DECODETREE_INDEX) {
+        bits = insn & dt->masks[node->value];
+        e = &dt->edges[node->first];
+        if (node->kind == DECODETREE_INDEX) {
+            e += bits >> node->shift;
+        } else {
+            for (count = node->count; count > 1; count -= count / 2) {
+                e = e[count / 2].bits <= bits ? &e[count / 2] : e;
+            }
+        }
+        if (e->bits != bits) {
+            return false;
+        }
+        node = &dt->nodes[e->node];
+    }
+
+    if (node->kind == DECODETREE_GROUP) {
+        e = &dt->edges[node->first];
+        for (i = 0; i < node->count; i++) {
+            if ((insn & dt->masks[e[i].mask]) == e[i].bits &&
+                decodetree_node(dt, ctx, insn, args, e[i].node)) {
+                return true;
+            }
+        }
+        return false;
+    }
+
+    f = &dt->fields[node->first];
+    for (i = 0; i < node->count; i++) {
+        int *arg = (int *)((char *)args + f[i].offset);
+
+        switch (f[i].kind) {
+        case DECODETREE_FIELD_EXTRACT:
+            *arg = decodetree_extract(dt, &f[i], insn);
+            break;
+        case DECODETREE_FIELD_FUNCTION:
+            *arg = dt->call(ctx, f[i].value,
+                            decodetree_extract(dt, &f[i], insn));
+            break;
+        case DECODETREE_FIELD_CONST:
+            *arg = f[i].value;
+            break;
+        case DECODETREE_FIELD_PARAMETER:
+            *arg = dt->call(ctx, f[i].value, 0);
+            break;
+        default:
+            g_assert_not_reached();
+        }
+    }
+    return dt->trans(ctx, node->value, args);
+}
+
+bool decodetree_decode(const DecodeTree *dt, void *ctx, uint32_t insn,
+                       void *args)
+{
+    return decodetree_node(dt, ctx, insn, args, 0);
+}